@@ -3,7 +3,8 @@ from fastapi import FastAPI
 from contextlib import asynccontextmanager
 from logging_config import setup_logging
 from database import connect_to_database, close_database_connection
-from routes import health, conversation
+from routes import health, conversation, metrics
+from services.message_archiver import get_message_archiver
 
 # Setup logging
 setup_logging()
@@ -14,7 +15,14 @@ logger = logging.getLogger(__name__)
 async def lifespan(app: FastAPI):
     logger.info("Starting DB Service")
     await connect_to_database()
+    archiver = get_message_archiver()
+    if archiver is not None:
+        await archiver.start()
     yield
+    if archiver is not None:
+        await archiver.stop()
+    # Write messages still waiting for a group commit before disconnecting
+    await conversation.get_message_batcher().close()
     await close_database_connection()
     logger.info("Shutting down DB Service")
 
@@ -28,4 +36,5 @@ app = FastAPI(
 
 # Include routers
 app.include_router(health.router, tags=["Health"])
+app.include_router(metrics.router, tags=["Metrics"])
 app.include_router(conversation.router, prefix="/api/v1", tags=["conversations"])
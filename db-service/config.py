@@ -15,6 +15,34 @@ class Settings(BaseSettings):
     port: int = Field(default=8000, alias="PORT")
     log_level: str = Field(default="INFO", alias="LOG_LEVEL")
     mongodb_log_level: str = Field(default="WARN", alias="MONGODB_LOG_LEVEL")
+    mongodb_max_pool_size: int = Field(default=100, alias="MONGODB_MAX_POOL_SIZE")
+    mongodb_min_pool_size: int = Field(default=10, alias="MONGODB_MIN_POOL_SIZE")
+    mongodb_max_idle_time_ms: int = Field(
+        default=300000, alias="MONGODB_MAX_IDLE_TIME_MS"
+    )
+    mongodb_wait_queue_timeout_ms: int = Field(
+        default=10000, alias="MONGODB_WAIT_QUEUE_TIMEOUT_MS"
+    )
+    mongodb_compressors: str = Field(default="zstd,zlib", alias="MONGODB_COMPRESSORS")
+    mongodb_warmup_connections: int = Field(
+        default=10, alias="MONGODB_WARMUP_CONNECTIONS"
+    )
+    write_batch_max_size: int = Field(default=100, alias="WRITE_BATCH_MAX_SIZE")
+    write_batch_max_delay_ms: float = Field(
+        default=2.0, alias="WRITE_BATCH_MAX_DELAY_MS"
+    )
+    history_cache_enabled: bool = Field(default=True, alias="HISTORY_CACHE_ENABLED")
+    history_cache_max_users: int = Field(default=10000, alias="HISTORY_CACHE_MAX_USERS")
+    history_cache_window: int = Field(default=100, alias="HISTORY_CACHE_WINDOW")
+    history_cache_ttl_seconds: float = Field(
+        default=300.0, alias="HISTORY_CACHE_TTL_SECONDS"
+    )
+    archive_enabled: bool = Field(default=True, alias="ARCHIVE_ENABLED")
+    archive_keep_messages: int = Field(default=1000, alias="ARCHIVE_KEEP_MESSAGES")
+    archive_max_age_days: float = Field(default=90.0, alias="ARCHIVE_MAX_AGE_DAYS")
+    archive_interval_seconds: float = Field(
+        default=3600.0, alias="ARCHIVE_INTERVAL_SECONDS"
+    )
 
     class Config:
         env_file = ".env"
@@ -1,8 +1,9 @@
 from motor.motor_asyncio import AsyncIOMotorClient
 from loguru import logger
 from config import get_settings
+from metrics import MongoCommandMetrics, MongoPoolMetrics
 import certifi
-from typing import Any
+from typing import Any, Dict
 import asyncio
 
 
@@ -10,6 +11,35 @@ class Database:
     client: Any = None
     settings = get_settings()
     db_name: str = settings.database_name
+    # Single-flight guard so concurrent requests share one reconnect
+    connect_lock = asyncio.Lock()
+
+
+def get_client_options() -> Dict[str, Any]:
+    """Pool sizing and wire compression for the Mongo client"""
+    settings = Database.settings
+    options = {
+        "maxPoolSize": settings.mongodb_max_pool_size,
+        "minPoolSize": settings.mongodb_min_pool_size,
+        "maxIdleTimeMS": settings.mongodb_max_idle_time_ms,
+        "waitQueueTimeoutMS": settings.mongodb_wait_queue_timeout_ms,
+    }
+    if settings.mongodb_compressors:
+        # The driver skips compressors whose library isn't installed
+        options["compressors"] = settings.mongodb_compressors
+    return options
+
+
+async def warm_up_connections(count: int):
+    """Open pooled connections before traffic arrives.
+
+    Concurrent pings each need their own connection, so the pool reaches
+    `count` connections instead of growing on the first requests.
+    """
+    if count <= 0:
+        return
+    await asyncio.gather(*[Database.client.admin.command("ping") for _ in range(count)])
+    logger.info(f"Warmed up {count} MongoDB connections")
 
 
 async def connect_to_database():
@@ -27,11 +57,14 @@ async def connect_to_database():
                 Database.settings.get_mongodb_url(),
                 serverSelectionTimeoutMS=5000,
                 tlsCAFile=certifi.where(),
+                event_listeners=[MongoCommandMetrics(), MongoPoolMetrics()],
+                **get_client_options(),
             )
 
             # Verify connection
             await Database.client.admin.command("ping")
             logger.success("Successfully connected to MongoDB")
+            await warm_up_connections(Database.settings.mongodb_warmup_connections)
             return
 
         except Exception as e:
@@ -63,5 +96,8 @@ async def close_database_connection():
 async def get_database():
     """Get database instance."""
     if Database.client is None:
-        await connect_to_database()
+        async with Database.connect_lock:
+            # Another request may have reconnected while we waited
+            if Database.client is None:
+                await connect_to_database()
     return Database.client[Database.db_name]
@@ -0,0 +1,142 @@
+import threading
+import time
+from typing import Dict, Tuple
+from prometheus_client import (
+    CONTENT_TYPE_LATEST,
+    REGISTRY,
+    Counter,
+    Gauge,
+    Histogram,
+    generate_latest,
+)
+from prometheus_client.core import GaugeMetricFamily
+from pymongo import monitoring
+from services.history_cache import get_history_cache
+
+MONGO_COMMAND_SECONDS = Histogram(
+    "db_mongo_command_duration_seconds",
+    "Time MongoDB took to answer each command, as seen by the driver",
+    ["command", "collection"],
+    buckets=(0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5),
+)
+MONGO_COMMAND_FAILURES = Counter(
+    "db_mongo_command_failures_total",
+    "MongoDB commands that returned an error",
+    ["command", "collection"],
+)
+MONGO_CONNECTIONS_IN_USE = Gauge(
+    "db_mongo_connections_in_use",
+    "Pooled MongoDB connections currently checked out",
+)
+MONGO_CONNECTIONS_OPEN = Gauge(
+    "db_mongo_connections_open",
+    "MongoDB connections currently open in the pool",
+)
+MONGO_CHECKOUT_WAIT_SECONDS = Histogram(
+    "db_mongo_pool_checkout_wait_seconds",
+    "Time spent waiting for a pooled MongoDB connection",
+    buckets=(0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 5),
+)
+MONGO_CHECKOUT_FAILURES = Counter(
+    "db_mongo_pool_checkout_failures_total",
+    "Connection checkouts that failed, e.g. timing out on an exhausted pool",
+    ["reason"],
+)
+
+
+class MongoCommandMetrics(monitoring.CommandListener):
+    """Record the duration of every command the driver sends to MongoDB"""
+
+    def __init__(self):
+        # Completion events don't carry the collection, so remember it per request
+        self._collections: Dict[Tuple, str] = {}
+
+    def started(self, event):
+        command = event.command.get(event.command_name)
+        if isinstance(command, str):
+            self._collections[(event.connection_id, event.request_id)] = command
+
+    def succeeded(self, event):
+        collection = self._collections.pop((event.connection_id, event.request_id), "")
+        MONGO_COMMAND_SECONDS.labels(event.command_name, collection).observe(
+            event.duration_micros / 1_000_000
+        )
+
+    def failed(self, event):
+        collection = self._collections.pop((event.connection_id, event.request_id), "")
+        MONGO_COMMAND_SECONDS.labels(event.command_name, collection).observe(
+            event.duration_micros / 1_000_000
+        )
+        MONGO_COMMAND_FAILURES.labels(event.command_name, collection).inc()
+
+
+class MongoPoolMetrics(monitoring.ConnectionPoolListener):
+    """Track pool usage and how long operations wait for a connection"""
+
+    def __init__(self):
+        # A checkout starts and ends on the same driver thread
+        self._checkout = threading.local()
+
+    def connection_check_out_started(self, event):
+        self._checkout.started = time.perf_counter()
+
+    def connection_checked_out(self, event):
+        MONGO_CONNECTIONS_IN_USE.inc()
+        self._observe_wait()
+
+    def connection_check_out_failed(self, event):
+        MONGO_CHECKOUT_FAILURES.labels(event.reason).inc()
+        self._observe_wait()
+
+    def _observe_wait(self):
+        started = getattr(self._checkout, "started", None)
+        if started is not None:
+            MONGO_CHECKOUT_WAIT_SECONDS.observe(time.perf_counter() - started)
+            self._checkout.started = None
+
+    def connection_checked_in(self, event):
+        MONGO_CONNECTIONS_IN_USE.dec()
+
+    def connection_created(self, event):
+        MONGO_CONNECTIONS_OPEN.inc()
+
+    def connection_closed(self, event):
+        MONGO_CONNECTIONS_OPEN.dec()
+
+    # Remaining pool events are not needed for these metrics
+    def pool_created(self, event):
+        pass
+
+    def pool_ready(self, event):
+        pass
+
+    def pool_cleared(self, event):
+        pass
+
+    def pool_closed(self, event):
+        pass
+
+    def connection_ready(self, event):
+        pass
+
+
+class HistoryCacheMetrics:
+    """Expose the history cache's stats() as gauges at scrape time"""
+
+    def collect(self):
+        cache = get_history_cache()
+        if cache is None:
+            return
+        for key, value in cache.stats().items():
+            yield GaugeMetricFamily(
+                f"db_history_cache_{key}",
+                f"History cache {key.replace('_', ' ')}",
+                value=value,
+            )
+
+
+REGISTRY.register(HistoryCacheMetrics())
+
+
+def render() -> bytes:
+    return generate_latest(REGISTRY)
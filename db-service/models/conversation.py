@@ -17,6 +17,11 @@ class PyObjectId(str):
         return str(v)
 
 
+# Messages stored per bucket document. A message's bucket is derived from its
+# position in the conversation, so this must not change once data is stored.
+MESSAGE_BUCKET_SIZE = 100
+
+
 class Message(BaseModel):
     content: str
     sender: str  # user_id or "assistant"
@@ -32,6 +37,22 @@ class ConversationMessage(BaseModel):
     message_type: str = "text"
 
 
+class BulkMessages(BaseModel):
+    messages: List[ConversationMessage]
+
+
+class TurnMessages(BaseModel):
+    messages: List[Message]
+    limit: int = 50
+
+
+class ConversationSummary(BaseModel):
+    """Rolling summary of every message before `position`"""
+
+    summary: str
+    position: int = Field(ge=0)
+
+
 class ConversationBase(BaseModel):
     title: Optional[str] = None
     participants: List[str] = Field(default_factory=list)
@@ -54,7 +75,9 @@ class ConversationBase(BaseModel):
 
 class Conversation(ConversationBase):
     id: PyObjectId = Field(default_factory=ObjectId, alias="_id")
-    messages: List[Message] = Field(default_factory=list)
+    message_count: int = 0  # Messages live in message_buckets
+    summary: Optional[str] = None  # Covers messages before summary_position
+    summary_position: int = 0
     created_at: datetime = Field(default_factory=datetime.utcnow)
     updated_at: datetime = Field(default_factory=datetime.utcnow)
 
@@ -64,6 +87,17 @@ class Conversation(ConversationBase):
         arbitrary_types_allowed = True
 
 
+class MessageBucket(BaseModel):
+    """A fixed-size slice of a user's messages, numbered by seq from 0"""
+
+    user_id: str
+    seq: int
+    count: int = 0
+    messages: List[Message] = Field(default_factory=list)
+    created_at: datetime = Field(default_factory=datetime.utcnow)
+    updated_at: datetime = Field(default_factory=datetime.utcnow)
+
+
 class MessageCreate(BaseModel):
     content: str
     sender: str
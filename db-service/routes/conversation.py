@@ -1,10 +1,25 @@
-from fastapi import APIRouter, HTTPException
-from models.conversation import ConversationMessage, Conversation, Message
+from fastapi import APIRouter, HTTPException, Query
+from fastapi.responses import ORJSONResponse
+from models.conversation import (
+    MESSAGE_BUCKET_SIZE,
+    BulkMessages,
+    ConversationMessage,
+    ConversationSummary,
+    Message,
+    TurnMessages,
+)
+from config import get_settings
 from database import get_database
+from services.history_cache import get_history_cache
+from services.message_batcher import MessageBatcher
 from datetime import datetime
-from bson import ObjectId
+from functools import lru_cache
+from itertools import groupby
+from pymongo import ReturnDocument, UpdateOne
+from pymongo.errors import BulkWriteError, DuplicateKeyError
 from loguru import logger
-from typing import List, Dict
+from typing import List, Dict, Optional, Set, Tuple
+import asyncio
 
 
 router = APIRouter()
@@ -13,15 +28,9 @@ router = APIRouter()
 @router.post("/conversations/messages")
 async def add_message(message: ConversationMessage):
     try:
-        # Get database connection
-        db = await get_database()
-
         # Log incoming message details
         logger.info(f"Processing message for user: {message.user_id}")
 
-        # Find existing conversation or create new one
-        conversation = await db.conversations.find_one({"user_id": message.user_id})
-
         # Create new message object
         new_message = Message(
             content=message.content,
@@ -30,124 +39,497 @@ async def add_message(message: ConversationMessage):
             message_type=message.message_type,
         )
 
-        if not conversation:
-            logger.info(f"Creating new conversation for user: {message.user_id}")
-            # Create new conversation with default title and participants
-            new_conversation = Conversation(
-                user_id=message.user_id,
-                title=f"Chat with {message.user_id}",
-                participants=[message.user_id],
-                messages=[new_message],  # Include the first message
-                created_at=datetime.utcnow(),
-                updated_at=datetime.utcnow(),
+        # Concurrent messages are group-committed in a single bulk write
+        await get_message_batcher().add((message.user_id, new_message.model_dump()))
+
+        logger.info(f"Successfully stored message for user: {message.user_id}")
+        return {"status": "success", "message": "Message stored successfully"}
+
+    except Exception as e:
+        logger.error(f"Error processing message: {str(e)}")
+        raise HTTPException(status_code=500, detail=str(e))
+
+
+async def _reserve_positions(db, user_id: str, count: int) -> int:
+    """Count new messages on the conversation, creating it if needed.
+
+    Returns the conversation's message count including the new ones, which
+    fixes the position (and so the bucket) of each new message.
+    """
+    now = datetime.utcnow()
+    update = {
+        "$inc": {"message_count": count},
+        "$set": {"updated_at": now},
+        "$setOnInsert": {
+            "title": f"Chat with {user_id}",
+            "participants": [user_id],
+            "created_at": now,
+        },
+    }
+    try:
+        conversation = await db.conversations.find_one_and_update(
+            {"user_id": user_id},
+            update,
+            projection={"message_count": 1},
+            upsert=True,
+            return_document=ReturnDocument.AFTER,
+        )
+    except DuplicateKeyError:
+        # Race condition: another request created the conversation first
+        logger.warning("Conversation already exists, retrying as update")
+        conversation = await db.conversations.find_one_and_update(
+            {"user_id": user_id},
+            update,
+            projection={"message_count": 1},
+            return_document=ReturnDocument.AFTER,
+        )
+    return conversation["message_count"]
+
+
+def _positioned(messages: List[Dict], first_position: int) -> List[Dict]:
+    """Stamp messages with their reserved position in the conversation"""
+    return [
+        {**msg, "position": position}
+        for position, msg in enumerate(messages, first_position)
+    ]
+
+
+def _bucket_updates(user_id: str, messages: List[Dict]) -> List[UpdateOne]:
+    """Build one upsert per bucket the positioned messages fall into"""
+    now = datetime.utcnow()
+    operations = []
+    for seq, group in groupby(
+        messages, key=lambda msg: msg["position"] // MESSAGE_BUCKET_SIZE
+    ):
+        batch = list(group)
+        operations.append(
+            UpdateOne(
+                {"user_id": user_id, "seq": seq},
+                {
+                    "$push": {"messages": {"$each": batch}},
+                    "$inc": {"count": len(batch)},
+                    "$set": {"updated_at": now},
+                    "$setOnInsert": {"created_at": now},
+                },
+                upsert=True,
             )
+        )
+    return operations
+
+
+async def _write_buckets(db, operations: List[UpdateOne]) -> Set[int]:
+    """Apply bucket upserts in one unordered bulk write.
 
-            try:
-                # Insert the new conversation with the message
-                result = await db.conversations.insert_one(
-                    new_conversation.model_dump(by_alias=True)
-                )
-                if not result.inserted_id:
-                    logger.error("Failed to create new conversation")
-                    raise HTTPException(
-                        status_code=500, detail="Failed to create conversation"
-                    )
-                logger.info(f"Created new conversation with ID: {result.inserted_id}")
-                return {"status": "success", "message": "Message stored successfully"}
-            except Exception as e:
-                if "duplicate key error" in str(e):
-                    # Race condition: conversation was created between our check and insert
-                    # Retry the operation by getting the conversation again
-                    logger.warning("Conversation already exists, retrying as update")
-                    conversation = await db.conversations.find_one(
-                        {"user_id": message.user_id}
-                    )
-                    if not conversation:
-                        logger.error(
-                            "Failed to find conversation after duplicate key error"
-                        )
-                        raise HTTPException(
-                            status_code=500, detail="Failed to handle message"
-                        )
-                else:
-                    logger.error(f"Error creating conversation: {str(e)}")
-                    raise HTTPException(
-                        status_code=500,
-                        detail=f"Failed to create conversation: {str(e)}",
-                    )
-
-        # At this point we either have an existing conversation or need to update after a race condition
+    Returns the indexes of the operations that failed, so one bad write
+    doesn't fail the rest of the batch.
+    """
+    try:
+        await db.message_buckets.bulk_write(operations, ordered=False)
+        return set()
+    except BulkWriteError as e:
+        errors = e.details.get("writeErrors", [])
+        if not errors:
+            raise
+
+    failed = {error["index"] for error in errors if error.get("code") != 11000}
+    # Race condition: a concurrent upsert created the bucket first
+    retry = [error["index"] for error in errors if error.get("code") == 11000]
+    if retry:
+        logger.warning(
+            f"Retrying {len(retry)} bucket updates after duplicate key errors"
+        )
         try:
-            conversation_id = conversation["_id"]
-            logger.info(f"Updating existing conversation: {conversation_id}")
+            await db.message_buckets.bulk_write(
+                [operations[i] for i in retry], ordered=False
+            )
+        except BulkWriteError as e:
+            failed.update(
+                retry[error["index"]] for error in e.details.get("writeErrors", [])
+            )
+    return failed
 
-            # Update conversation with new message
-            update_result = await db.conversations.update_one(
-                {"_id": conversation_id},
-                {
-                    "$push": {"messages": new_message.model_dump()},
-                    "$set": {"updated_at": datetime.utcnow()},
+
+async def _store_messages(
+    db, by_user: Dict[str, List[Dict]]
+) -> Dict[str, Optional[int]]:
+    """Store each user's messages, writing every bucket in one bulk write.
+
+    Returns each user's new message count, or None if their messages could
+    not be stored.
+    """
+    # Positions are reserved with one update per user, concurrently
+    users = list(by_user.items())
+    totals = await asyncio.gather(
+        *[_reserve_positions(db, user_id, len(messages)) for user_id, messages in users]
+    )
+    positioned = [
+        (user_id, _positioned(messages, total - len(messages)))
+        for (user_id, messages), total in zip(users, totals)
+    ]
+
+    operations = []
+    owners = []
+    for user_id, messages in positioned:
+        for operation in _bucket_updates(user_id, messages):
+            operations.append(operation)
+            owners.append(user_id)
+    failed = {owners[i] for i in await _write_buckets(db, operations)}
+    if failed:
+        logger.error(f"Failed to store messages for users: {sorted(failed)}")
+
+    cache = get_history_cache()
+    results = {}
+    for (user_id, messages), total in zip(positioned, totals):
+        if user_id in failed:
+            if cache is not None:
+                cache.invalidate(user_id)
+            results[user_id] = None
+            continue
+        if cache is not None:
+            cache.append(user_id, messages)
+        results[user_id] = total
+    return results
+
+
+async def _flush_messages(items: List[Tuple[str, Dict]]) -> List[Optional[Exception]]:
+    """Group-commit messages queued by concurrent add_message calls"""
+    db = await get_database()
+    by_user: Dict[str, List[Dict]] = {}
+    for user_id, message in items:
+        by_user.setdefault(user_id, []).append(message)
+
+    totals = await _store_messages(db, by_user)
+    if len(items) > 1:
+        logger.info(f"Group-committed {len(items)} messages for {len(by_user)} users")
+    return [
+        None
+        if totals[user_id] is not None
+        else HTTPException(status_code=500, detail="Failed to store message")
+        for user_id, _ in items
+    ]
+
+
+@lru_cache()
+def get_message_batcher() -> MessageBatcher:
+    """Return the process-wide batcher behind add_message"""
+    settings = get_settings()
+    return MessageBatcher(
+        _flush_messages,
+        max_batch_size=settings.write_batch_max_size,
+        max_delay=settings.write_batch_max_delay_ms / 1000,
+    )
+
+
+async def _read_window(
+    db,
+    user_id: str,
+    limit: int,
+    before: Optional[int] = None,
+    after: Optional[int] = None,
+) -> List[Dict]:
+    """Read up to `limit` messages between the cursors, oldest first.
+
+    Messages are addressed by their position in the conversation, stored
+    with them on write (seq * MESSAGE_BUCKET_SIZE + index for migrated
+    messages). Without `after` the newest messages before `before` are returned;
+    with only `after`, the oldest ones following it. Mongo does the bucket
+    selection, unwinding and windowing, so the cost depends on `limit` only.
+
+    Old buckets are moved to message_buckets_archive by the archiver. The
+    archive is only read when the hot buckets can't fill the window, which
+    for recent history is never.
+    """
+    newest_first = after is None or before is not None
+    pipeline = _window_pipeline(user_id, limit, before, after, newest_first)
+    messages = await db.message_buckets.aggregate(pipeline).to_list(length=None)
+
+    # The window must reach its lower bound unless it is already full; paging
+    # forward it must start right after the cursor
+    first = after + 1 if after is not None else 0
+    if newest_first:
+        covered = len(messages) == limit or (
+            messages and messages[-1]["position"] == first
+        )
+    else:
+        covered = messages and messages[0]["position"] == first
+    if not covered:
+        archived = await db.message_buckets_archive.aggregate(pipeline).to_list(
+            length=None
+        )
+        # A bucket being archived can briefly be in both tiers
+        by_position = {msg["position"]: msg for msg in archived + messages}
+        positions = sorted(by_position, reverse=newest_first)[:limit]
+        messages = [by_position[position] for position in positions]
+
+    if newest_first:
+        messages.reverse()
+    return messages
+
+
+def _window_pipeline(
+    user_id: str,
+    limit: int,
+    before: Optional[int],
+    after: Optional[int],
+    newest_first: bool,
+) -> List[Dict]:
+    """Aggregation selecting the window from one tier of message buckets"""
+    seq_range: Dict[str, int] = {}
+    position_range: Dict[str, int] = {}
+    if before is not None:
+        seq_range["$lte"] = max(0, before - 1) // MESSAGE_BUCKET_SIZE
+        position_range["$lt"] = before
+    if after is not None:
+        seq_range["$gte"] = (after + 1) // MESSAGE_BUCKET_SIZE
+        position_range["$gt"] = after
+
+    match: Dict = {"user_id": user_id}
+    if seq_range:
+        match["seq"] = seq_range
+    direction = -1 if newest_first else 1
+
+    pipeline = [
+        {"$match": match},
+        {"$sort": {"seq": direction}},
+        # Buckets at both ends of the window may be partly used
+        {"$limit": limit // MESSAGE_BUCKET_SIZE + 2},
+        {"$unwind": {"path": "$messages", "includeArrayIndex": "index"}},
+        {
+            "$project": {
+                "_id": 0,
+                # Messages written before positions were stored use their slot
+                "position": {
+                    "$ifNull": [
+                        "$messages.position",
+                        {
+                            "$add": [
+                                {"$multiply": ["$seq", MESSAGE_BUCKET_SIZE]},
+                                "$index",
+                            ]
+                        },
+                    ]
                 },
+                "content": "$messages.content",
+                "sender": "$messages.sender",
+                "timestamp": "$messages.timestamp",
+                "message_type": "$messages.message_type",
+            }
+        },
+    ]
+    if position_range:
+        pipeline.append({"$match": {"position": position_range}})
+    pipeline += [{"$sort": {"position": direction}}, {"$limit": limit}]
+    return pipeline
+
+
+async def _latest_window(
+    db, user_id: str, limit: int, before: Optional[int] = None
+) -> List[Dict]:
+    """Read the newest messages through the history cache.
+
+    `before` may only trim the newest window (e.g. to the caller's own
+    write), not page back through older history.
+    """
+    cache = get_history_cache()
+    if cache is None:
+        return await _read_window(db, user_id, limit, before)
+
+    messages = cache.get(user_id, limit, before)
+    if messages is not None:
+        return messages
+
+    token = cache.read_token()
+    messages = await _read_window(db, user_id, limit)
+    cache.put(user_id, messages, len(messages) < limit, token)
+    if before is not None:
+        messages = [msg for msg in messages if msg["position"] < before]
+    return messages
+
+
+def _format_messages(raw_messages: List[Dict]) -> List[Dict]:
+    """Shape stored messages for a response, keeping the order they were read in.
+
+    Messages went through the Message model when they were written, so they
+    are copied field by field rather than validated again on every read.
+    """
+    formatted_messages = []
+
+    for msg in raw_messages:
+        try:
+            formatted_messages.append(
+                {
+                    "content": msg["content"],
+                    "sender": msg["sender"],
+                    "timestamp": msg["timestamp"],
+                    "message_type": msg.get("message_type", "text"),
+                    "position": msg["position"],
+                }
             )
+        except KeyError as e:
+            logger.warning(f"Skipping invalid message without {str(e)}")
+            continue
 
-            if update_result.modified_count == 0:
-                logger.error(f"Failed to update conversation: {conversation_id}")
-                raise HTTPException(status_code=500, detail="Failed to store message")
+    return formatted_messages
 
-            logger.info(f"Successfully stored message for user: {message.user_id}")
-            return {"status": "success", "message": "Message stored successfully"}
 
-        except Exception as e:
-            logger.error(f"Error updating conversation: {str(e)}")
-            raise HTTPException(
-                status_code=500, detail=f"Failed to update conversation: {str(e)}"
+@router.post("/conversations/messages/bulk")
+async def add_messages_bulk(bulk: BulkMessages):
+    """Store many messages with one update per user in a single bulk write"""
+    try:
+        db = await get_database()
+
+        # Group by user keeping arrival order, so each user gets one $push
+        by_user: Dict[str, List[Dict]] = {}
+        for msg in bulk.messages:
+            by_user.setdefault(msg.user_id, []).append(
+                Message(
+                    content=msg.content,
+                    sender=msg.sender,
+                    timestamp=msg.timestamp,
+                    message_type=msg.message_type,
+                ).model_dump()
             )
+        logger.info(
+            f"Storing {len(bulk.messages)} messages for {len(by_user)} users in bulk"
+        )
+        if not by_user:
+            return {"status": "success", "stored": 0, "users": 0}
+
+        totals = await _store_messages(db, by_user)
+        if any(total is None for total in totals.values()):
+            raise HTTPException(status_code=500, detail="Failed to store messages")
+
+        logger.info(f"Successfully stored {len(bulk.messages)} messages in bulk")
+        return {
+            "status": "success",
+            "stored": len(bulk.messages),
+            "users": len(by_user),
+        }
 
     except Exception as e:
-        logger.error(f"Error processing message: {str(e)}")
+        logger.error(f"Error storing messages in bulk: {str(e)}")
+        raise HTTPException(status_code=500, detail=str(e))
+
+
+@router.post("/conversations/{user_id}/turn")
+async def add_turn_messages(user_id: str, turn: TurnMessages):
+    """Store new messages and return the updated history in a single round trip"""
+    try:
+        db = await get_database()
+        logger.info(f"Storing {len(turn.messages)} turn messages for user: {user_id}")
+
+        totals = await _store_messages(
+            db, {user_id: [msg.model_dump() for msg in turn.messages]}
+        )
+        total = totals[user_id]
+        if total is None:
+            raise HTTPException(status_code=500, detail="Failed to store messages")
+        # History up to and including this turn, usually straight from the cache
+        raw_messages = await _latest_window(db, user_id, turn.limit, before=total)
+
+        formatted_messages = _format_messages(raw_messages)
+        logger.info(
+            f"Stored turn and returned {len(formatted_messages)} messages for user: {user_id}"
+        )
+        return ORJSONResponse({"messages": formatted_messages})
+
+    except Exception as e:
+        logger.error(f"Error storing turn messages: {str(e)}")
         raise HTTPException(status_code=500, detail=str(e))
 
 
 @router.get("/conversations/{user_id}")
-async def get_conversation_history(user_id: str, limit: int = 50):
-    """Get conversation history for a user with proper message formatting"""
+async def get_conversation_history(
+    user_id: str,
+    limit: int = Query(50, ge=1, le=500),
+    before: Optional[int] = Query(None, ge=0),
+    after: Optional[int] = Query(None, ge=-1),
+):
+    """Get a page of conversation history for a user.
+
+    Without cursors the latest `limit` messages are returned. Pass the
+    response's `before` to page back through older history, or `after` to
+    fetch messages newer than the ones already seen.
+    """
     try:
         logger.info(f"Fetching conversation history for user: {user_id}")
         db = await get_database()
 
-        # Find conversation
-        conversation = await db.conversations.find_one({"user_id": user_id})
-        if not conversation:
+        if before is None and after is None:
+            raw_messages = await _latest_window(db, user_id, limit)
+        else:
+            raw_messages = await _read_window(db, user_id, limit, before, after)
+        if not raw_messages:
             logger.info(f"No conversation found for user: {user_id}")
-            return {"messages": []}
-
-        # Get messages and validate/format them
-        raw_messages = conversation.get("messages", [])
-        # Sort messages by timestamp to ensure chronological order
-        raw_messages.sort(key=lambda x: x.get("timestamp", datetime.min))
-        # Take the most recent messages up to the limit
-        raw_messages = raw_messages[-limit:]
-        formatted_messages = []
-
-        for msg in raw_messages:
-            try:
-                # Ensure message has all required fields
-                message = Message(
-                    content=msg["content"],
-                    sender=msg["sender"],
-                    timestamp=msg["timestamp"],
-                    message_type=msg.get("message_type", "text"),
-                )
-                formatted_messages.append(message.model_dump())
-            except Exception as e:
-                logger.warning(f"Skipping invalid message: {str(e)}")
-                continue
+            return ORJSONResponse({"messages": [], "before": None, "after": after})
 
+        formatted_messages = _format_messages(raw_messages)
+        oldest = raw_messages[0]["position"]
         logger.info(
             f"Retrieved and formatted {len(formatted_messages)} messages for user: {user_id}"
         )
-        return {"messages": formatted_messages}
+        # Serialized straight to JSON by orjson, skipping FastAPI's encoder pass
+        return ORJSONResponse(
+            {
+                "messages": formatted_messages,
+                "before": oldest if oldest > 0 else None,
+                "after": raw_messages[-1]["position"],
+            }
+        )
 
     except Exception as e:
         logger.error(f"Error fetching conversation history: {str(e)}")
         raise HTTPException(status_code=500, detail=str(e))
+
+
+@router.get("/conversations/{user_id}/summary")
+async def get_conversation_summary(user_id: str):
+    """Get the rolling summary and the position of the first message it doesn't cover"""
+    try:
+        db = await get_database()
+        conversation = await db.conversations.find_one(
+            {"user_id": user_id}, {"summary": 1, "summary_position": 1}
+        )
+        if conversation is None:
+            return {"summary": None, "position": 0}
+        return {
+            "summary": conversation.get("summary"),
+            "position": conversation.get("summary_position", 0),
+        }
+
+    except Exception as e:
+        logger.error(f"Error fetching conversation summary: {str(e)}")
+        raise HTTPException(status_code=500, detail=str(e))
+
+
+@router.put("/conversations/{user_id}/summary")
+async def update_conversation_summary(user_id: str, summary: ConversationSummary):
+    """Replace the summary unless one covering as much or more is already stored"""
+    try:
+        db = await get_database()
+        # Summaries written concurrently (e.g. by several replicas) never go back
+        result = await db.conversations.update_one(
+            {
+                "user_id": user_id,
+                "$or": [
+                    {"summary_position": {"$lt": summary.position}},
+                    {"summary_position": {"$exists": False}},
+                ],
+            },
+            {
+                "$set": {
+                    "summary": summary.summary,
+                    "summary_position": summary.position,
+                    "updated_at": datetime.utcnow(),
+                }
+            },
+        )
+        logger.info(
+            f"Summary for user {user_id} up to {summary.position}: "
+            f"{'updated' if result.modified_count else 'kept newer'}"
+        )
+        return {"updated": bool(result.modified_count)}
+
+    except Exception as e:
+        logger.error(f"Error updating conversation summary: {str(e)}")
+        raise HTTPException(status_code=500, detail=str(e))
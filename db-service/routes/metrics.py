@@ -0,0 +1,13 @@
+from fastapi import APIRouter, Response
+from metrics import CONTENT_TYPE_LATEST, render
+
+router = APIRouter()
+
+
+@router.get(
+    "/metrics",
+    summary="Prometheus Metrics",
+    description="MongoDB command latency histograms and connection pool usage",
+)
+async def metrics():
+    return Response(content=render(), media_type=CONTENT_TYPE_LATEST)
@@ -0,0 +1,79 @@
+import os
+import sys
+import timeit
+from datetime import datetime, timedelta
+from fastapi.encoders import jsonable_encoder
+from fastapi.responses import JSONResponse, ORJSONResponse
+
+# Add parent directory to Python path
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+# Importing the routes loads settings; no database connection is made
+os.environ.setdefault("MONGODB_USER", "benchmark")
+os.environ.setdefault("MONGODB_PASSWORD", "benchmark")
+os.environ.setdefault("MONGODB_HOST", "localhost")
+
+from models.conversation import Message
+from routes.conversation import _format_messages
+
+SIZES = (50, 500, 5000)
+
+
+def make_history(size: int):
+    """Messages shaped like the history aggregation returns them"""
+    start = datetime(2024, 1, 1)
+    return [
+        {
+            "position": i,
+            "content": f"Mensaje {i}: ¿podrías preparar una sesión de matemática?",
+            "sender": "user" if i % 2 == 0 else "assistant",
+            "timestamp": start + timedelta(seconds=i),
+            "message_type": "text",
+        }
+        for i in range(size)
+    ]
+
+
+def validated_response(raw_messages):
+    """Previous path: validate every message, then FastAPI's encoder and json"""
+    messages = [
+        {
+            **Message(
+                content=msg["content"],
+                sender=msg["sender"],
+                timestamp=msg["timestamp"],
+                message_type=msg.get("message_type", "text"),
+            ).model_dump(),
+            "position": msg["position"],
+        }
+        for msg in raw_messages
+    ]
+    return JSONResponse(jsonable_encoder({"messages": messages})).body
+
+
+def fast_response(raw_messages):
+    """Current path: copy trusted fields and serialize with orjson"""
+    return ORJSONResponse({"messages": _format_messages(raw_messages)}).body
+
+
+def benchmark():
+    print(f"{'messages':>8} {'validated (ms)':>15} {'fast (ms)':>10} {'speedup':>8}")
+    for size in SIZES:
+        raw_messages = make_history(size)
+        assert validated_response(raw_messages) == fast_response(raw_messages)
+
+        number = max(1, 5000 // size)
+        timings = []
+        for path in (validated_response, fast_response):
+            best = min(
+                timeit.repeat(lambda: path(raw_messages), number=number, repeat=5)
+            )
+            timings.append(best / number * 1000)
+        print(
+            f"{size:>8} {timings[0]:>15.3f} {timings[1]:>10.3f} "
+            f"{timings[0] / timings[1]:>7.1f}x"
+        )
+
+
+if __name__ == "__main__":
+    benchmark()
@@ -2,11 +2,37 @@ import asyncio
 from motor.motor_asyncio import AsyncIOMotorClient
 from loguru import logger
 import os
+import sys
 from dotenv import load_dotenv
 import certifi
 from datetime import datetime
 from pymongo.errors import CollectionInvalid
 
+# Add parent directory to Python path
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from models.conversation import MESSAGE_BUCKET_SIZE
+
+
+async def create_indexes(db):
+    """Create the indexes the DB service's queries rely on.
+
+    scripts/index_advisor.py checks every query shape against these.
+    """
+    await db.conversations.create_index([("user_id", 1)], unique=True)
+    await db.conversations.create_index([("updated_at", -1)])
+    # Lets the archiver find conversations with more than one bucket
+    await db.conversations.create_index(
+        [("message_count", 1)],
+        partialFilterExpression={"message_count": {"$gt": MESSAGE_BUCKET_SIZE}},
+    )
+    # Messages are stored in fixed-size buckets numbered per user
+    await db.message_buckets.create_index([("user_id", 1), ("seq", 1)], unique=True)
+    # Old buckets are moved here by the DB service's archiver
+    await db.message_buckets_archive.create_index(
+        [("user_id", 1), ("seq", 1)], unique=True
+    )
+
 
 async def init_db():
     """Initialize database with conversations collection and schema validation."""
@@ -57,14 +83,21 @@ async def init_db():
 
         # Create or update indexes
         logger.info("Creating/updating indexes...")
-        await db.conversations.create_index([("user_id", 1)], unique=True)
-        await db.conversations.create_index([("updated_at", -1)])
+        await create_indexes(db)
 
         # Create test conversation if in development
         if os.getenv("ENVIRONMENT") == "development" and not collection_exists:
             logger.info("Creating test conversation...")
             test_conversation = {
                 "user_id": "test_user",
+                "message_count": 1,
+                "created_at": datetime.utcnow(),
+                "updated_at": datetime.utcnow(),
+            }
+            test_bucket = {
+                "user_id": "test_user",
+                "seq": 0,
+                "count": 1,
                 "messages": [
                     {
                         "content": "Hello",
@@ -78,6 +111,7 @@ async def init_db():
             }
             try:
                 await db.conversations.insert_one(test_conversation)
+                await db.message_buckets.insert_one(test_bucket)
             except Exception as e:
                 logger.warning(f"Could not create test conversation: {str(e)}")
 
@@ -0,0 +1,481 @@
+import argparse
+import asyncio
+import os
+import sys
+from dataclasses import dataclass, field
+from datetime import datetime, timedelta
+from typing import Any, Dict, Iterator, List, Optional, Set, Tuple
+from motor.motor_asyncio import AsyncIOMotorClient
+from pymongo.errors import OperationFailure
+
+# Add parent directory to Python path
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+# Importing the routes loads settings; only the advisor's database is used
+os.environ.setdefault("MONGODB_USER", "advisor")
+os.environ.setdefault("MONGODB_PASSWORD", "advisor")
+os.environ.setdefault("MONGODB_HOST", "localhost")
+
+from db_init import create_indexes
+from models.conversation import MESSAGE_BUCKET_SIZE
+from routes.conversation import _window_pipeline
+
+USERS = 200
+HEAVY_USER_EVERY = 10  # Every 10th user has several buckets, some archived
+HEAVY_USER_MESSAGES = 5 * MESSAGE_BUCKET_SIZE + 20
+LIGHT_USER_MESSAGES = 30
+# Flag plans that examine this many documents per document they return
+MAX_EXAMINED_RATIO = 2
+
+
+@dataclass
+class QueryShape:
+    """One query or update the DB service issues, as an explainable command"""
+
+    name: str
+    source: str
+    command: Dict[str, Any]
+    # Index to propose when the plan scans: (keys, create_index options)
+    suggested_index: Optional[Tuple[List[Tuple[str, int]], Dict[str, Any]]] = None
+
+    @property
+    def collection(self) -> str:
+        # Commands name their collection in their first field
+        return next(iter(self.command.values()))
+
+
+@dataclass
+class PlanReport:
+    shape: QueryShape
+    docs_examined: int
+    keys_examined: int
+    returned: int
+    millis: int
+    indexes: Set[str] = field(default_factory=set)
+    collection_scan: bool = False
+
+    @property
+    def ok(self) -> bool:
+        return (
+            not self.collection_scan
+            and self.docs_examined <= max(self.returned, 1) * MAX_EXAMINED_RATIO
+        )
+
+
+def query_shapes(heavy_user: str, light_user: str) -> List[QueryShape]:
+    """Every query and update shape db-service issues, with sample values"""
+    now = datetime.utcnow()
+    heavy_count = HEAVY_USER_MESSAGES
+    current_seq = (heavy_count - 1) // MESSAGE_BUCKET_SIZE
+    bucket_key = {"user_id": heavy_user, "seq": current_seq}
+
+    def aggregate(collection: str, pipeline: List[Dict]) -> Dict[str, Any]:
+        return {"aggregate": collection, "pipeline": pipeline, "cursor": {}}
+
+    def reserve(user_id: str, count: int) -> Dict[str, Any]:
+        # The same update _reserve_positions sends for /messages and /turn
+        return {
+            "findAndModify": "conversations",
+            "query": {"user_id": user_id},
+            "update": {
+                "$inc": {"message_count": count},
+                "$set": {"updated_at": now},
+                "$setOnInsert": {
+                    "title": f"Chat with {user_id}",
+                    "participants": [user_id],
+                    "created_at": now,
+                },
+            },
+            "fields": {"message_count": 1},
+            "upsert": True,
+            "new": True,
+        }
+
+    return [
+        QueryShape(
+            "reserve_positions",
+            "routes/conversation.py:_reserve_positions",
+            reserve(light_user, 1),
+            ([("user_id", 1)], {"unique": True}),
+        ),
+        QueryShape(
+            "turn_reserve_positions",
+            "routes/conversation.py:add_turn_messages",
+            reserve(heavy_user, 2),
+            ([("user_id", 1)], {"unique": True}),
+        ),
+        QueryShape(
+            "bucket_upsert",
+            "routes/conversation.py:_bucket_updates",
+            {
+                "update": "message_buckets",
+                "updates": [
+                    {
+                        "q": bucket_key,
+                        "u": {"$inc": {"count": 1}, "$set": {"updated_at": now}},
+                        "upsert": True,
+                    }
+                ],
+            },
+            ([("user_id", 1), ("seq", 1)], {"unique": True}),
+        ),
+        QueryShape(
+            "history_latest",
+            "routes/conversation.py:_read_window",
+            aggregate(
+                "message_buckets", _window_pipeline(heavy_user, 50, None, None, True)
+            ),
+            ([("user_id", 1), ("seq", 1)], {"unique": True}),
+        ),
+        QueryShape(
+            "history_before",
+            "routes/conversation.py:_read_window",
+            aggregate(
+                "message_buckets",
+                _window_pipeline(heavy_user, 50, heavy_count - 150, None, True),
+            ),
+            ([("user_id", 1), ("seq", 1)], {"unique": True}),
+        ),
+        QueryShape(
+            "history_after",
+            "routes/conversation.py:_read_window",
+            aggregate(
+                "message_buckets",
+                _window_pipeline(heavy_user, 50, None, heavy_count - 150, False),
+            ),
+            ([("user_id", 1), ("seq", 1)], {"unique": True}),
+        ),
+        QueryShape(
+            "history_archive",
+            "routes/conversation.py:_read_window",
+            aggregate(
+                "message_buckets_archive",
+                _window_pipeline(heavy_user, 50, 60, None, True),
+            ),
+            ([("user_id", 1), ("seq", 1)], {"unique": True}),
+        ),
+        QueryShape(
+            "turn_history",
+            "routes/conversation.py:add_turn_messages",
+            aggregate(
+                "message_buckets",
+                _window_pipeline(heavy_user, 50, heavy_count, None, True),
+            ),
+            ([("user_id", 1), ("seq", 1)], {"unique": True}),
+        ),
+        QueryShape(
+            "summary_get",
+            "routes/conversation.py:get_conversation_summary",
+            {
+                "find": "conversations",
+                "filter": {"user_id": heavy_user},
+                "projection": {"summary": 1, "summary_position": 1},
+                "limit": 1,
+            },
+            ([("user_id", 1)], {"unique": True}),
+        ),
+        QueryShape(
+            "summary_put",
+            "routes/conversation.py:update_conversation_summary",
+            {
+                "update": "conversations",
+                "updates": [
+                    {
+                        "q": {
+                            "user_id": heavy_user,
+                            "$or": [
+                                {"summary_position": {"$lt": heavy_count - 20}},
+                                {"summary_position": {"$exists": False}},
+                            ],
+                        },
+                        "u": {
+                            "$set": {
+                                "summary": "Resumen",
+                                "summary_position": heavy_count - 20,
+                                "updated_at": now,
+                            }
+                        },
+                    }
+                ],
+            },
+            ([("user_id", 1)], {"unique": True}),
+        ),
+        QueryShape(
+            "archive_scan_conversations",
+            "services/message_archiver.py:run_once",
+            {
+                "find": "conversations",
+                "filter": {"message_count": {"$gt": MESSAGE_BUCKET_SIZE}},
+                "projection": {"user_id": 1, "message_count": 1},
+            },
+            (
+                [("message_count", 1)],
+                {
+                    "partialFilterExpression": {
+                        "message_count": {"$gt": MESSAGE_BUCKET_SIZE}
+                    }
+                },
+            ),
+        ),
+        QueryShape(
+            "archive_user_buckets",
+            "services/message_archiver.py:archive_user",
+            {
+                "find": "message_buckets",
+                "filter": {
+                    "user_id": heavy_user,
+                    "seq": {"$lt": current_seq},
+                    "$or": [
+                        {"seq": {"$lt": 1}},
+                        {"updated_at": {"$lt": now - timedelta(days=90)}},
+                    ],
+                },
+            },
+            ([("user_id", 1), ("seq", 1)], {"unique": True}),
+        ),
+        QueryShape(
+            "archive_copy",
+            "services/message_archiver.py:archive_bucket",
+            {
+                "update": "message_buckets_archive",
+                "updates": [
+                    {
+                        "q": {"user_id": heavy_user, "seq": 1},
+                        "u": {"$max": {"updated_at": now}},
+                        "upsert": True,
+                    }
+                ],
+            },
+            ([("user_id", 1), ("seq", 1)], {"unique": True}),
+        ),
+    ]
+
+
+def seed_documents() -> Iterator[Tuple[str, Dict[str, Any]]]:
+    """Conversations and buckets shaped like production data"""
+    now = datetime.utcnow()
+    for i in range(USERS):
+        user_id = f"advisor_user_{i}"
+        heavy = i % HEAVY_USER_EVERY == 0
+        count = HEAVY_USER_MESSAGES if heavy else LIGHT_USER_MESSAGES
+        conversation = {
+            "user_id": user_id,
+            "message_count": count,
+            "created_at": now,
+            "updated_at": now,
+        }
+        if heavy:
+            # Long conversations carry a rolling summary of their older messages
+            conversation["summary"] = "Resumen de la conversación"
+            conversation["summary_position"] = count - 40
+        yield "conversations", conversation
+        for seq in range((count - 1) // MESSAGE_BUCKET_SIZE + 1):
+            first = seq * MESSAGE_BUCKET_SIZE
+            size = min(MESSAGE_BUCKET_SIZE, count - first)
+            # The oldest bucket of heavy users has been archived
+            collection = (
+                "message_buckets_archive" if heavy and seq == 0 else "message_buckets"
+            )
+            yield collection, {
+                "user_id": user_id,
+                "seq": seq,
+                "count": size,
+                "messages": [
+                    {
+                        "content": f"Mensaje {first + j}",
+                        "sender": "user" if j % 2 == 0 else "assistant",
+                        "timestamp": now,
+                        "message_type": "text",
+                        "position": first + j,
+                    }
+                    for j in range(size)
+                ],
+                "created_at": now,
+                "updated_at": now,
+            }
+
+
+async def seed(db):
+    documents: Dict[str, List[Dict]] = {}
+    for collection, document in seed_documents():
+        documents.setdefault(collection, []).append(document)
+    for collection, batch in documents.items():
+        await db[collection].insert_many(batch)
+
+
+def walk_stages(plan: Any) -> Iterator[Dict[str, Any]]:
+    """Yield every stage dict nested anywhere in an explain document"""
+    if isinstance(plan, dict):
+        if "stage" in plan:
+            yield plan
+        for value in plan.values():
+            yield from walk_stages(value)
+    elif isinstance(plan, list):
+        for value in plan:
+            yield from walk_stages(value)
+
+
+def find_key(document: Any, key: str) -> Optional[Any]:
+    """First value stored under `key` anywhere in an explain document"""
+    if isinstance(document, dict):
+        if key in document:
+            return document[key]
+        values = document.values()
+    elif isinstance(document, list):
+        values = document
+    else:
+        return None
+    for value in values:
+        found = find_key(value, key)
+        if found is not None:
+            return found
+    return None
+
+
+async def explain(db, shape: QueryShape) -> PlanReport:
+    result = await db.command({"explain": shape.command, "verbosity": "executionStats"})
+    # Aggregations nest the query's plan under their $cursor stage
+    stats = find_key(result, "executionStats") or {}
+    winning = find_key(result, "winningPlan") or {}
+    stages = list(walk_stages(winning)) + list(
+        walk_stages(stats.get("executionStages", {}))
+    )
+    return PlanReport(
+        shape=shape,
+        docs_examined=stats.get("totalDocsExamined", 0),
+        keys_examined=stats.get("totalKeysExamined", 0),
+        # Writes return nothing themselves; their input stage returns the matches
+        returned=max([stage.get("nReturned", 0) for stage in stages] or [0]),
+        millis=stats.get("executionTimeMillis", 0),
+        indexes={stage["indexName"] for stage in stages if "indexName" in stage},
+        collection_scan=any(stage["stage"] == "COLLSCAN" for stage in stages),
+    )
+
+
+def print_report(reports: List[PlanReport]):
+    print(
+        f"{'shape':<28} {'plan':<34} {'examined':>8} {'keys':>6} "
+        f"{'returned':>8} {'ms':>4}  status"
+    )
+    for report in reports:
+        plan = (
+            "COLLSCAN" if report.collection_scan else ",".join(sorted(report.indexes))
+        )
+        print(
+            f"{report.shape.name:<28} {plan or '-':<34} {report.docs_examined:>8} "
+            f"{report.keys_examined:>6} {report.returned:>8} {report.millis:>4}  "
+            f"{'ok' if report.ok else 'NEEDS INDEX'}"
+        )
+
+
+async def unused_indexes(db, reports: List[PlanReport]) -> List[Tuple[str, str]]:
+    used = set().union(*(report.indexes for report in reports))
+    unused = []
+    for collection in sorted({r.shape.collection for r in reports}):
+        async for index in db[collection].list_indexes():
+            if index["name"] != "_id_" and index["name"] not in used:
+                unused.append((collection, index["name"]))
+    return unused
+
+
+async def advise(uri: str, db_name: str, create: bool, keep: bool):
+    client = AsyncIOMotorClient(uri, serverSelectionTimeoutMS=5000)
+    await client.admin.command("ping")
+    db = client[db_name]
+    if await db.list_collection_names():
+        raise SystemExit(f"Database {db_name} is not empty; pass a scratch --db")
+
+    try:
+        await seed(db)
+        await create_indexes(db)
+
+        shapes = query_shapes(
+            heavy_user="advisor_user_0", light_user=f"advisor_user_{USERS - 1}"
+        )
+        reports = [await explain(db, shape) for shape in shapes]
+        print_report(reports)
+
+        missing = [report for report in reports if not report.ok]
+        for report in missing:
+            shape = report.shape
+            if shape.suggested_index is None:
+                print(f"\n{shape.name} ({shape.source}): no index suggestion")
+                continue
+            keys, options = shape.suggested_index
+            print(
+                f"\n{shape.name} ({shape.source}) examines "
+                f"{report.docs_examined} documents for {report.returned}; proposed:"
+                f"\n  db.{shape.collection}.create_index({keys}, **{options})"
+            )
+            if create:
+                await db[shape.collection].create_index(keys, **options)
+
+        if create and missing:
+            print("\nAfter creating the proposed indexes:")
+            reports = [await explain(db, shape) for shape in shapes]
+            print_report(reports)
+
+        for collection, name in await unused_indexes(db, reports):
+            print(f"\nIndex {collection}.{name} is not used by any query shape")
+
+        if any(not report.ok for report in reports):
+            print(
+                "\nAdd the proposed indexes to create_indexes() in scripts/db_init.py"
+            )
+            return False
+        return True
+    except OperationFailure as e:
+        raise SystemExit(f"Explain failed: {str(e)}")
+    finally:
+        if not keep:
+            await client.drop_database(db_name)
+        client.close()
+
+
+def start_in_memory_mongod():
+    """Start a throwaway mongod, downloading it on first use"""
+    try:
+        from pymongo_inmemory import Mongod
+    except ImportError:
+        raise SystemExit("--in-memory needs: pip install pymongo_inmemory")
+    mongod = Mongod()
+    mongod.start()
+    return mongod
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        description=(
+            "Explain every query shape db-service runs against seeded data and "
+            "propose indexes for the ones that scan"
+        )
+    )
+    parser.add_argument(
+        "--uri",
+        default=os.getenv("MONGODB_URI", "mongodb://localhost:27017"),
+        help="A local or disposable mongod (never production)",
+    )
+    parser.add_argument("--db", default="index_advisor", help="Scratch database")
+    parser.add_argument(
+        "--in-memory", action="store_true", help="Start a throwaway mongod"
+    )
+    parser.add_argument(
+        "--create", action="store_true", help="Create proposed indexes and re-check"
+    )
+    parser.add_argument(
+        "--keep", action="store_true", help="Keep the scratch database afterwards"
+    )
+    args = parser.parse_args()
+
+    mongod = start_in_memory_mongod() if args.in_memory else None
+    try:
+        uri = mongod.connection_string if mongod is not None else args.uri
+        ok = asyncio.run(advise(uri, args.db, args.create, args.keep))
+    finally:
+        if mongod is not None:
+            mongod.stop()
+    sys.exit(0 if ok else 1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,114 @@
+import asyncio
+from motor.motor_asyncio import AsyncIOMotorClient
+from loguru import logger
+import os
+import sys
+from dotenv import load_dotenv
+import certifi
+from datetime import datetime
+from pymongo import ReplaceOne
+
+# Add parent directory to Python path
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from models.conversation import MESSAGE_BUCKET_SIZE
+
+
+async def migrate_conversation(db, conversation: dict) -> int:
+    """Move one conversation's messages array into numbered buckets"""
+    messages = sorted(
+        conversation.get("messages") or [],
+        key=lambda x: x.get("timestamp", datetime.min),
+    )
+    now = datetime.utcnow()
+    operations = [
+        ReplaceOne(
+            {"user_id": conversation["user_id"], "seq": seq},
+            {
+                "user_id": conversation["user_id"],
+                "seq": seq,
+                "count": len(bucket),
+                "messages": bucket,
+                "created_at": conversation.get("created_at", now),
+                "updated_at": now,
+            },
+            upsert=True,
+        )
+        for seq, bucket in enumerate(
+            messages[i : i + MESSAGE_BUCKET_SIZE]
+            for i in range(0, len(messages), MESSAGE_BUCKET_SIZE)
+        )
+    ]
+    if operations:
+        await db.message_buckets.bulk_write(operations, ordered=False)
+
+    # Only drop the array once its buckets are written, so a rerun resumes safely
+    await db.conversations.update_one(
+        {"_id": conversation["_id"]},
+        {"$set": {"message_count": len(messages)}, "$unset": {"messages": ""}},
+    )
+    return len(messages)
+
+
+async def migrate():
+    """Migrate conversations from one messages array per user to message buckets.
+
+    Run this before deploying the bucketed DB service: conversations that
+    still hold a messages array are not visible to it. The script only
+    touches conversations that have not been migrated yet, so it can be
+    rerun after an interruption.
+    """
+    try:
+        # Load environment variables
+        load_dotenv()
+
+        # Get MongoDB credentials
+        mongodb_user = os.getenv("MONGODB_USER")
+        mongodb_password = os.getenv("MONGODB_PASSWORD")
+        mongodb_host = os.getenv("MONGODB_HOST", "tuthoria.qbiwj.mongodb.net")
+        db_name = os.getenv("MONGODB_DB_NAME", "chat_db")
+
+        if not all([mongodb_user, mongodb_password, mongodb_host]):
+            raise ValueError("Missing MongoDB credentials in environment variables")
+
+        # Construct MongoDB URI
+        mongo_uri = (
+            f"mongodb+srv://{mongodb_user}:{mongodb_password}@{mongodb_host}"
+            "/?retryWrites=true&w=majority"
+        )
+
+        # Connect to MongoDB
+        logger.info("Connecting to MongoDB...")
+        client = AsyncIOMotorClient(
+            mongo_uri, serverSelectionTimeoutMS=5000, tlsCAFile=certifi.where()
+        )
+        await client.admin.command("ping")
+        db = client[db_name]
+        logger.info(f"Using database: {db_name}")
+
+        await db.message_buckets.create_index([("user_id", 1), ("seq", 1)], unique=True)
+
+        migrated = 0
+        total_messages = 0
+        cursor = db.conversations.find({"messages": {"$exists": True}})
+        async for conversation in cursor:
+            count = await migrate_conversation(db, conversation)
+            migrated += 1
+            total_messages += count
+            logger.info(
+                f"Migrated {count} messages for user: {conversation['user_id']}"
+            )
+
+        client.close()
+        logger.success(
+            f"Migrated {total_messages} messages from {migrated} conversations "
+            f"into buckets of {MESSAGE_BUCKET_SIZE}"
+        )
+
+    except Exception as e:
+        logger.error(f"Error migrating conversations: {str(e)}")
+        raise
+
+
+if __name__ == "__main__":
+    asyncio.run(migrate())
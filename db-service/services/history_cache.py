@@ -0,0 +1,160 @@
+from collections import OrderedDict
+from dataclasses import dataclass
+from functools import lru_cache
+from time import monotonic
+from typing import Callable, Dict, List, Optional
+from config import get_settings
+
+
+@dataclass
+class HistoryEntry:
+    # Newest window of messages, oldest first, each carrying its "position".
+    # None marks a user written to while uncached, so in-flight reads can't
+    # seed the cache with history that misses that write.
+    messages: Optional[List[Dict]]
+    complete: bool  # The window starts at the conversation's first message
+    expires_at: float
+    write_seq: int
+
+
+class HistoryCache:
+    """Per-user LRU of the most recent messages, kept current by writes.
+
+    Reads seed the cache and writes append to it, so a history read that
+    follows a write for the same user is answered from memory. Appends that
+    don't continue the cached window (e.g. concurrent writes finishing out
+    of order) drop the entry instead, and every entry expires after
+    ttl_seconds as a backstop.
+    """
+
+    def __init__(
+        self,
+        max_users: int = 10000,
+        window: int = 100,
+        ttl_seconds: float = 300.0,
+        clock: Callable[[], float] = monotonic,
+    ):
+        self.max_users = max_users
+        self.window = window
+        self.ttl_seconds = ttl_seconds
+        self._clock = clock
+        self._entries: "OrderedDict[str, HistoryEntry]" = OrderedDict()
+        self._write_seq = 0
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.invalidations = 0
+
+    def read_token(self) -> int:
+        """Take before reading from Mongo and pass to put() with the result"""
+        return self._write_seq
+
+    def get(
+        self, user_id: str, limit: int, before: Optional[int] = None
+    ) -> Optional[List[Dict]]:
+        """Return the last `limit` messages before the cursor if the window holds them"""
+        entry = self._entries.get(user_id)
+        if entry is None or entry.messages is None:
+            self.misses += 1
+            return None
+        if entry.expires_at <= self._clock():
+            del self._entries[user_id]
+            self.misses += 1
+            return None
+
+        messages = entry.messages
+        if before is not None:
+            messages = [msg for msg in messages if msg["position"] < before]
+        if len(messages) < limit and not entry.complete:
+            # Older messages the request needs aren't cached
+            self.misses += 1
+            return None
+
+        self._entries.move_to_end(user_id)
+        self.hits += 1
+        return messages[-limit:]
+
+    def put(self, user_id: str, messages: List[Dict], complete: bool, token: int):
+        """Cache the newest window read from Mongo, unless it was written since"""
+        entry = self._entries.get(user_id)
+        write_seq = entry.write_seq if entry is not None else 0
+        if write_seq > token:
+            return
+        self._store(user_id, messages[-self.window :], complete, write_seq)
+
+    def append(self, user_id: str, messages: List[Dict]):
+        """Add newly stored messages (with positions) to the user's window"""
+        if not messages:
+            return
+        self._write_seq += 1
+        entry = self._entries.get(user_id)
+        if entry is None or entry.messages is None:
+            self._store(user_id, None, False, self._write_seq)
+            return
+
+        if entry.expires_at <= self._clock() or not self._continues(entry, messages):
+            self.invalidations += 1
+            self._store(user_id, None, False, self._write_seq)
+            return
+
+        combined = entry.messages + messages
+        complete = entry.complete and len(combined) <= self.window
+        self._store(user_id, combined[-self.window :], complete, self._write_seq)
+
+    def invalidate(self, user_id: str):
+        """Drop the user's window after a write whose outcome is unknown"""
+        self._write_seq += 1
+        entry = self._entries.get(user_id)
+        if entry is not None and entry.messages is not None:
+            self.invalidations += 1
+        self._store(user_id, None, False, self._write_seq)
+
+    @staticmethod
+    def _continues(entry: HistoryEntry, messages: List[Dict]) -> bool:
+        expected = entry.messages[-1]["position"] + 1 if entry.messages else 0
+        return messages[0]["position"] == expected
+
+    def _store(
+        self,
+        user_id: str,
+        messages: Optional[List[Dict]],
+        complete: bool,
+        write_seq: int,
+    ):
+        self._entries[user_id] = HistoryEntry(
+            messages=messages,
+            complete=complete,
+            expires_at=self._clock() + self.ttl_seconds,
+            write_seq=write_seq,
+        )
+        self._entries.move_to_end(user_id)
+        while len(self._entries) > self.max_users:
+            self._entries.popitem(last=False)
+            self.evictions += 1
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+    def stats(self) -> Dict[str, float]:
+        """Return size and hit/miss counters"""
+        return {
+            "users": len(self._entries),
+            "max_users": self.max_users,
+            "hits": self.hits,
+            "misses": self.misses,
+            "evictions": self.evictions,
+            "invalidations": self.invalidations,
+        }
+
+
+@lru_cache()
+def get_history_cache() -> Optional[HistoryCache]:
+    """Return the process-wide history cache, or None when it is disabled"""
+    settings = get_settings()
+    if not settings.history_cache_enabled:
+        return None
+    return HistoryCache(
+        max_users=settings.history_cache_max_users,
+        window=settings.history_cache_window,
+        ttl_seconds=settings.history_cache_ttl_seconds,
+    )
@@ -0,0 +1,159 @@
+import asyncio
+from datetime import datetime, timedelta
+from functools import lru_cache
+from typing import Awaitable, Callable, Dict, Optional
+from loguru import logger
+from config import get_settings
+from database import get_database
+from models.conversation import MESSAGE_BUCKET_SIZE
+
+
+class MessageArchiver:
+    """Move old message buckets from message_buckets to message_buckets_archive.
+
+    A bucket is archived once it is not the user's current bucket and it
+    either falls outside the newest keep_messages messages or was last
+    written more than max_age_days ago. This keeps the hot collection, and
+    its index, sized by recent activity rather than total history. Each
+    bucket is copied before it is deleted and the delete only matches the
+    copied count, so a run that is interrupted, races another replica or
+    races a late write leaves messages in both tiers rather than losing them.
+    """
+
+    def __init__(
+        self,
+        get_db: Callable[[], Awaitable],
+        keep_messages: int = 1000,
+        max_age_days: float = 90.0,
+        interval_seconds: float = 3600.0,
+    ):
+        self.get_db = get_db
+        self.keep_messages = keep_messages
+        self.max_age_days = max_age_days
+        self.interval_seconds = interval_seconds
+        self._task: Optional[asyncio.Task] = None
+        self.runs = 0
+        self.buckets_archived = 0
+        self.messages_archived = 0
+
+    async def start(self):
+        """Run the archival job in the background every interval_seconds"""
+        if self._task is None or self._task.done():
+            self._task = asyncio.create_task(self._run())
+
+    async def stop(self):
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+
+    async def _run(self):
+        while True:
+            try:
+                archived = await self.run_once()
+                if archived:
+                    logger.info(f"Archived {archived} message buckets")
+            except Exception as e:
+                logger.error(f"Error archiving messages: {str(e)}")
+            await asyncio.sleep(self.interval_seconds)
+
+    async def run_once(self) -> int:
+        """Archive every eligible bucket and return how many were moved"""
+        db = await self.get_db()
+        cutoff = datetime.utcnow() - timedelta(days=self.max_age_days)
+        self.runs += 1
+        archived = 0
+
+        # Users whose history fits in one bucket have nothing to archive
+        cursor = db.conversations.find(
+            {"message_count": {"$gt": MESSAGE_BUCKET_SIZE}},
+            {"user_id": 1, "message_count": 1},
+        )
+        async for conversation in cursor:
+            archived += await self.archive_user(
+                db, conversation["user_id"], conversation["message_count"], cutoff
+            )
+        return archived
+
+    async def archive_user(
+        self, db, user_id: str, message_count: int, cutoff: datetime
+    ) -> int:
+        """Archive one user's eligible buckets"""
+        current_seq = (message_count - 1) // MESSAGE_BUCKET_SIZE
+        keep_from = max(0, message_count - self.keep_messages) // MESSAGE_BUCKET_SIZE
+        buckets = db.message_buckets.find(
+            {
+                "user_id": user_id,
+                "seq": {"$lt": current_seq},
+                "$or": [
+                    {"seq": {"$lt": keep_from}},
+                    {"updated_at": {"$lt": cutoff}},
+                ],
+            }
+        )
+        archived = 0
+        async for bucket in buckets:
+            if await self.archive_bucket(db, bucket):
+                archived += 1
+        return archived
+
+    async def archive_bucket(self, db, bucket: Dict) -> bool:
+        """Copy a bucket to the archive, then remove it if it hasn't changed"""
+        key = {"user_id": bucket["user_id"], "seq": bucket["seq"]}
+        # Migrated messages take their position from their slot in the
+        # array, which merging into an archived bucket can shift, so their
+        # position is stored explicitly before they move
+        first = bucket["seq"] * MESSAGE_BUCKET_SIZE
+        messages = [
+            msg if "position" in msg else {**msg, "position": first + index}
+            for index, msg in enumerate(bucket["messages"])
+        ]
+        # Merged rather than replaced: a write landing after a bucket was
+        # archived recreates it in the hot tier, and moving that one later
+        # must keep what is already archived. Re-copying is a no-op.
+        await db.message_buckets_archive.update_one(
+            key,
+            {
+                "$addToSet": {"messages": {"$each": messages}},
+                "$max": {"updated_at": bucket["updated_at"]},
+                "$setOnInsert": {"created_at": bucket["created_at"]},
+            },
+            upsert=True,
+        )
+
+        result = await db.message_buckets.delete_one(
+            {"_id": bucket["_id"], "count": bucket["count"]}
+        )
+        if result.deleted_count:
+            self.buckets_archived += 1
+            self.messages_archived += bucket["count"]
+            return True
+
+        # A late write landed after the copy (or another run moved it first).
+        # Reads skip messages present in both tiers; the next run finishes it.
+        return False
+
+    def stats(self) -> Dict[str, int]:
+        """Return run and archived counters"""
+        return {
+            "runs": self.runs,
+            "buckets_archived": self.buckets_archived,
+            "messages_archived": self.messages_archived,
+        }
+
+
+@lru_cache()
+def get_message_archiver() -> Optional[MessageArchiver]:
+    """Return the process-wide archiver, or None when archival is disabled"""
+    settings = get_settings()
+    if not settings.archive_enabled:
+        return None
+    return MessageArchiver(
+        get_database,
+        keep_messages=settings.archive_keep_messages,
+        max_age_days=settings.archive_max_age_days,
+        interval_seconds=settings.archive_interval_seconds,
+    )
@@ -35,10 +35,14 @@ async def clean_db():
     
     # Clean up before test
     await db.conversations.delete_many({})
+    await db.message_buckets.delete_many({})
+    await db.message_buckets_archive.delete_many({})
     await db.user_states.delete_many({})
     
     yield
     
     # Clean up after test
     await db.conversations.delete_many({})
+    await db.message_buckets.delete_many({})
+    await db.message_buckets_archive.delete_many({})
     await db.user_states.delete_many({}) 
\ No newline at end of file
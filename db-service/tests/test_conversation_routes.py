@@ -1,6 +1,9 @@
 import pytest
 from httpx import AsyncClient
 from datetime import datetime
+from database import get_database
+from models.conversation import MESSAGE_BUCKET_SIZE
+from routes.conversation import _read_window, _window_pipeline
 
 @pytest.mark.asyncio
 async def test_message_flow():
@@ -19,4 +22,197 @@ async def test_message_flow():
         response = await client.get("/api/v1/conversations/test_user")
         assert response.status_code == 200
         messages = response.json()["messages"]
-        assert len(messages) > 0 
\ No newline at end of file
+        assert len(messages) > 0
+
+
+def pipeline_stage(pipeline, name):
+    return [stage[name] for stage in pipeline if name in stage]
+
+
+def test_window_pipeline_latest_reads_newest_buckets():
+    """Test that the latest window scans only the newest buckets, newest first"""
+    pipeline = _window_pipeline("u1", 50, None, None, True)
+
+    assert pipeline_stage(pipeline, "$match")[0] == {"user_id": "u1"}
+    assert pipeline_stage(pipeline, "$sort")[0] == {"seq": -1}
+    # A window can start and end partway through a bucket
+    assert pipeline_stage(pipeline, "$limit") == [50 // MESSAGE_BUCKET_SIZE + 2, 50]
+    assert len(pipeline_stage(pipeline, "$match")) == 1
+
+
+def test_window_pipeline_cursor_bucket_ranges():
+    """Test that cursors select buckets by seq, including at bucket edges"""
+    size = MESSAGE_BUCKET_SIZE
+
+    # Everything before the edge lives in the previous bucket
+    pipeline = _window_pipeline("u1", 10, 2 * size, None, True)
+    assert pipeline_stage(pipeline, "$match") == [
+        {"user_id": "u1", "seq": {"$lte": 1}},
+        {"position": {"$lt": 2 * size}},
+    ]
+    pipeline = _window_pipeline("u1", 10, 2 * size + 1, None, True)
+    assert pipeline_stage(pipeline, "$match")[0]["seq"] == {"$lte": 2}
+    # Nothing comes before position 0, which still maps to bucket 0
+    pipeline = _window_pipeline("u1", 10, 0, None, True)
+    assert pipeline_stage(pipeline, "$match")[0]["seq"] == {"$lte": 0}
+
+    # Paging forward starts in the bucket holding the message after the cursor
+    pipeline = _window_pipeline("u1", 10, None, size - 1, False)
+    assert pipeline_stage(pipeline, "$match") == [
+        {"user_id": "u1", "seq": {"$gte": 1}},
+        {"position": {"$gt": size - 1}},
+    ]
+    assert pipeline_stage(pipeline, "$sort") == [{"seq": 1}, {"position": 1}]
+    pipeline = _window_pipeline("u1", 10, None, -1, False)
+    assert pipeline_stage(pipeline, "$match")[0]["seq"] == {"$gte": 0}
+
+    pipeline = _window_pipeline("u1", 10, size + 5, size - 5, True)
+    assert pipeline_stage(pipeline, "$match") == [
+        {"user_id": "u1", "seq": {"$lte": 1, "$gte": 0}},
+        {"position": {"$lt": size + 5, "$gt": size - 5}},
+    ]
+
+
+async def seed_buckets(db, user_id, count, archived_seqs=()):
+    """Store count messages in full buckets, moving archived_seqs to the archive"""
+    for seq in range((count - 1) // MESSAGE_BUCKET_SIZE + 1):
+        first = seq * MESSAGE_BUCKET_SIZE
+        size = min(MESSAGE_BUCKET_SIZE, count - first)
+        collection = (
+            db.message_buckets_archive if seq in archived_seqs else db.message_buckets
+        )
+        await collection.insert_one(
+            {
+                "user_id": user_id,
+                "seq": seq,
+                "count": size,
+                "messages": [
+                    {
+                        "content": f"Message {first + i}",
+                        "sender": "user",
+                        "timestamp": datetime(2024, 1, 1),
+                        "message_type": "text",
+                        "position": first + i,
+                    }
+                    for i in range(size)
+                ],
+                "created_at": datetime(2024, 1, 1),
+                "updated_at": datetime(2024, 1, 1),
+            }
+        )
+
+
+def positions(messages):
+    return [msg["position"] for msg in messages]
+
+
+@pytest.mark.asyncio
+async def test_read_window_latest():
+    """Test that the latest window is the newest messages, oldest first"""
+    db = await get_database()
+    await seed_buckets(db, "window_user", 250)
+
+    assert positions(await _read_window(db, "window_user", 50)) == list(range(200, 250))
+    # A window larger than the history returns all of it
+    assert positions(await _read_window(db, "window_user", 500)) == list(range(250))
+
+
+@pytest.mark.asyncio
+async def test_read_window_before_bucket_edge():
+    """Test paging back to a cursor that falls on a bucket boundary"""
+    db = await get_database()
+    await seed_buckets(db, "window_user", 250)
+    size = MESSAGE_BUCKET_SIZE
+
+    window = await _read_window(db, "window_user", 10, before=2 * size)
+    assert positions(window) == list(range(2 * size - 10, 2 * size))
+    # Spanning the edge takes the end of one bucket and the start of the next
+    window = await _read_window(db, "window_user", 10, before=size + 5)
+    assert positions(window) == list(range(size - 5, size + 5))
+    # Clamped at the start of the conversation
+    assert positions(await _read_window(db, "window_user", 10, before=5)) == [
+        0,
+        1,
+        2,
+        3,
+        4,
+    ]
+    assert await _read_window(db, "window_user", 10, before=0) == []
+
+
+@pytest.mark.asyncio
+async def test_read_window_after_near_tail():
+    """Test paging forward from a cursor close to the newest message"""
+    db = await get_database()
+    await seed_buckets(db, "window_user", 250)
+
+    window = await _read_window(db, "window_user", 10, after=245)
+    assert positions(window) == [246, 247, 248, 249]
+    assert await _read_window(db, "window_user", 10, after=249) == []
+    # Paging forward across a bucket edge
+    window = await _read_window(db, "window_user", 10, after=195)
+    assert positions(window) == list(range(196, 206))
+    # after=-1 reads from the very first message
+    assert positions(await _read_window(db, "window_user", 3, after=-1)) == [0, 1, 2]
+
+
+@pytest.mark.asyncio
+async def test_read_window_between_cursors():
+    """Test that both cursors bound the window, newest messages kept when it is full"""
+    db = await get_database()
+    await seed_buckets(db, "window_user", 250)
+    size = MESSAGE_BUCKET_SIZE
+
+    window = await _read_window(db, "window_user", 50, before=size + 5, after=size - 5)
+    assert positions(window) == list(range(size - 4, size + 5))
+    window = await _read_window(db, "window_user", 3, before=size + 5, after=size - 5)
+    assert positions(window) == [size + 2, size + 3, size + 4]
+
+
+@pytest.mark.asyncio
+async def test_read_window_falls_back_to_archive():
+    """Test that windows reaching archived buckets read them from the archive"""
+    db = await get_database()
+    await seed_buckets(db, "archived_user", 250, archived_seqs=(0,))
+    size = MESSAGE_BUCKET_SIZE
+
+    # Recent history never needs the archive
+    assert positions(await _read_window(db, "archived_user", 50)) == list(
+        range(200, 250)
+    )
+    # Crossing from the hot tier into the archive
+    window = await _read_window(db, "archived_user", 20, before=size + 10)
+    assert positions(window) == list(range(size - 10, size + 10))
+    assert [msg["content"] for msg in window] == [
+        f"Message {i}" for i in range(size - 10, size + 10)
+    ]
+    # Entirely archived, paging back and forward
+    window = await _read_window(db, "archived_user", 10, before=50)
+    assert positions(window) == list(range(40, 50))
+    window = await _read_window(db, "archived_user", 10, after=size - 5)
+    assert positions(window) == list(range(size - 4, size + 6))
+    assert positions(await _read_window(db, "archived_user", 500)) == list(range(250))
+
+
+@pytest.mark.asyncio
+async def test_read_window_bucket_in_both_tiers():
+    """Test that messages present in both tiers mid-archive are returned once"""
+    db = await get_database()
+    await seed_buckets(db, "moving_user", 150, archived_seqs=(0,))
+    # The hot copy of bucket 0 still holds its newest messages
+    archived = await db.message_buckets_archive.find_one(
+        {"user_id": "moving_user", "seq": 0}
+    )
+    await db.message_buckets.insert_one(
+        {
+            "user_id": "moving_user",
+            "seq": 0,
+            "count": 10,
+            "messages": archived["messages"][-10:],
+            "created_at": archived["created_at"],
+            "updated_at": archived["updated_at"],
+        }
+    )
+
+    window = await _read_window(db, "moving_user", 20, before=MESSAGE_BUCKET_SIZE)
+    assert positions(window) == list(range(MESSAGE_BUCKET_SIZE - 20, MESSAGE_BUCKET_SIZE))
@@ -0,0 +1,87 @@
+from services.history_cache import HistoryCache
+
+
+class FakeClock:
+    def __init__(self):
+        self.now = 0.0
+
+    def __call__(self):
+        return self.now
+
+
+def msgs(*positions):
+    return [{"position": p, "content": f"m{p}"} for p in positions]
+
+
+def test_seeded_window_serves_reads():
+    """Test that a read result is served until it expires"""
+    clock = FakeClock()
+    cache = HistoryCache(ttl_seconds=10, clock=clock)
+    cache.put("u1", msgs(0, 1, 2), complete=True, token=cache.read_token())
+
+    assert [m["position"] for m in cache.get("u1", 2)] == [1, 2]
+    assert [m["position"] for m in cache.get("u1", 10)] == [0, 1, 2]
+
+    clock.now = 11
+    assert cache.get("u1", 2) is None
+
+
+def test_partial_window_misses_larger_limits():
+    """Test that older messages outside the window are not assumed absent"""
+    cache = HistoryCache()
+    cache.put("u1", msgs(5, 6, 7), complete=False, token=cache.read_token())
+
+    assert cache.get("u1", 3) is not None
+    assert cache.get("u1", 4) is None
+    assert cache.get("u1", 2, before=7) is not None
+    assert cache.get("u1", 3, before=7) is None
+
+
+def test_writes_extend_the_window():
+    """Test that contiguous writes are appended and the window stays bounded"""
+    cache = HistoryCache(window=3)
+    cache.put("u1", msgs(0, 1), complete=True, token=cache.read_token())
+
+    cache.append("u1", msgs(2))
+    assert [m["position"] for m in cache.get("u1", 5)] == [0, 1, 2]
+
+    cache.append("u1", msgs(3))
+    assert [m["position"] for m in cache.get("u1", 3)] == [1, 2, 3]
+    assert cache.get("u1", 4) is None  # Position 0 was trimmed
+
+
+def test_out_of_order_write_invalidates():
+    """Test that a gap in positions drops the window"""
+    cache = HistoryCache()
+    cache.put("u1", msgs(0, 1), complete=True, token=cache.read_token())
+
+    cache.append("u1", msgs(3))
+
+    assert cache.get("u1", 1) is None
+    assert cache.stats()["invalidations"] == 1
+
+
+def test_read_racing_a_write_is_not_cached():
+    """Test that a read started before a write can't seed stale history"""
+    cache = HistoryCache()
+    token = cache.read_token()
+    cache.append("u1", msgs(2))  # Lands while the read is in flight
+
+    cache.put("u1", msgs(0, 1), complete=True, token=token)
+    assert cache.get("u1", 1) is None
+
+    cache.put("u1", msgs(0, 1, 2), complete=True, token=cache.read_token())
+    assert cache.get("u1", 1) is not None
+
+
+def test_lru_eviction():
+    """Test that the least recently used user is evicted first"""
+    cache = HistoryCache(max_users=2)
+    for user in ("u1", "u2"):
+        cache.put(user, msgs(0), complete=True, token=cache.read_token())
+    cache.get("u1", 1)
+    cache.put("u3", msgs(0), complete=True, token=cache.read_token())
+
+    assert cache.get("u2", 1) is None
+    assert cache.get("u1", 1) is not None
+    assert cache.stats()["evictions"] == 1
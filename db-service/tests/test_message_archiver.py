@@ -0,0 +1,96 @@
+import pytest
+from datetime import datetime
+from httpx import AsyncClient
+from app import app
+from database import get_database
+from models.conversation import MESSAGE_BUCKET_SIZE
+from routes.conversation import _read_window
+from services.message_archiver import MessageArchiver
+
+
+@pytest.mark.asyncio
+async def test_history_reads_across_archived_buckets():
+    """Test that archived messages are still returned by history reads"""
+    async with AsyncClient(app=app, base_url="http://test") as client:
+        messages = [
+            {"user_id": "test_user", "content": f"Message {i}", "sender": "user"}
+            for i in range(250)
+        ]
+        response = await client.post(
+            "/api/v1/conversations/messages/bulk", json={"messages": messages}
+        )
+        assert response.status_code == 200
+
+        archiver = MessageArchiver(get_database, keep_messages=100)
+        assert await archiver.run_once() == 1
+
+        db = await get_database()
+        assert await db.message_buckets_archive.count_documents({}) == 1
+        assert await db.message_buckets.count_documents({}) == 2
+
+        response = await client.get("/api/v1/conversations/test_user?limit=500")
+        history = response.json()["messages"]
+        assert [msg["content"] for msg in history] == [
+            f"Message {i}" for i in range(250)
+        ]
+
+        response = await client.get(
+            "/api/v1/conversations/test_user?limit=10&before=50"
+        )
+        history = response.json()["messages"]
+        assert [msg["content"] for msg in history] == [
+            f"Message {i}" for i in range(40, 50)
+        ]
+
+
+@pytest.mark.asyncio
+async def test_archiving_migrated_bucket_keeps_positions():
+    """Test that messages without a stored position keep it when merged into the archive"""
+    db = await get_database()
+    now = datetime.utcnow()
+
+    def message(i, positioned):
+        msg = {
+            "content": f"Message {i}",
+            "sender": "user",
+            "timestamp": now,
+            "message_type": "text",
+        }
+        if positioned:
+            msg["position"] = i
+        return msg
+
+    # Migrated bucket: positions come from each message's slot in the array
+    await db.message_buckets.insert_one(
+        {
+            "user_id": "migrated_user",
+            "seq": 0,
+            "count": MESSAGE_BUCKET_SIZE,
+            "messages": [message(i, False) for i in range(MESSAGE_BUCKET_SIZE)],
+            "created_at": now,
+            "updated_at": now,
+        }
+    )
+    # An earlier run already archived part of it
+    await db.message_buckets_archive.insert_one(
+        {
+            "user_id": "migrated_user",
+            "seq": 0,
+            "messages": [message(i, True) for i in range(10)],
+            "created_at": now,
+            "updated_at": now,
+        }
+    )
+
+    archiver = MessageArchiver(get_database)
+    bucket = await db.message_buckets.find_one({"user_id": "migrated_user"})
+    assert await archiver.archive_bucket(db, bucket)
+
+    archived = await db.message_buckets_archive.find_one({"user_id": "migrated_user"})
+    assert [msg["position"] for msg in archived["messages"]] == list(
+        range(MESSAGE_BUCKET_SIZE)
+    )
+    history = await _read_window(db, "migrated_user", 20, after=-1)
+    assert [(msg["position"], msg["content"]) for msg in history] == [
+        (i, f"Message {i}") for i in range(20)
+    ]
@@ -0,0 +1,34 @@
+import asyncio
+import pytest
+from services.message_batcher import MessageBatcher
+
+
+@pytest.mark.asyncio
+async def test_concurrent_items_share_a_batch():
+    """Test that items added together are flushed in one call"""
+    batches = []
+
+    async def flush(items):
+        batches.append(items)
+
+    batcher = MessageBatcher(flush, max_batch_size=10, max_delay=0.01)
+    results = await asyncio.gather(*[batcher.add(i) for i in range(5)])
+
+    assert results == [True] * 5
+    assert batches == [[0, 1, 2, 3, 4]]
+
+
+@pytest.mark.asyncio
+async def test_per_item_errors_fail_only_those_items():
+    """Test that flush can fail individual items of a batch"""
+    error = ValueError("write failed")
+
+    async def flush(items):
+        return [error if item == "bad" else None for item in items]
+
+    batcher = MessageBatcher(flush, max_delay=0.001)
+    results = await asyncio.gather(
+        batcher.add("ok"), batcher.add("bad"), batcher.add("ok"), return_exceptions=True
+    )
+
+    assert results == [True, error, True]
@@ -0,0 +1,154 @@
+import pytest
+from datetime import datetime, timedelta
+from database import get_database
+from models.conversation import MESSAGE_BUCKET_SIZE
+from routes.conversation import _read_window, _store_messages
+from scripts.migrate_to_buckets import migrate_conversation
+
+
+def make_messages(start, end):
+    base = datetime(2024, 1, 1)
+    return [
+        {
+            "content": f"Message {i}",
+            "sender": "user" if i % 2 == 0 else "assistant",
+            "timestamp": base + timedelta(seconds=i),
+            "message_type": "text",
+        }
+        for i in range(start, end)
+    ]
+
+
+async def bucket_documents(db, user_id):
+    cursor = db.message_buckets.find({"user_id": user_id}, {"_id": 0}).sort("seq", 1)
+    return await cursor.to_list(length=None)
+
+
+@pytest.mark.asyncio
+async def test_batch_crossing_bucket_edge_is_split():
+    """Test that a batch spanning two buckets fills each with contiguous positions"""
+    db = await get_database()
+    first = MESSAGE_BUCKET_SIZE - 5
+    totals = await _store_messages(db, {"split_user": make_messages(0, first)})
+    assert totals == {"split_user": first}
+
+    totals = await _store_messages(db, {"split_user": make_messages(first, first + 10)})
+    assert totals == {"split_user": first + 10}
+
+    buckets = await bucket_documents(db, "split_user")
+    assert [bucket["seq"] for bucket in buckets] == [0, 1]
+    assert [bucket["count"] for bucket in buckets] == [MESSAGE_BUCKET_SIZE, 5]
+    for bucket in buckets:
+        assert len(bucket["messages"]) == bucket["count"]
+
+    positions = [msg["position"] for bucket in buckets for msg in bucket["messages"]]
+    assert positions == list(range(first + 10))
+    assert [msg["position"] for msg in buckets[1]["messages"]] == list(
+        range(MESSAGE_BUCKET_SIZE, MESSAGE_BUCKET_SIZE + 5)
+    )
+    contents = [msg["content"] for bucket in buckets for msg in bucket["messages"]]
+    assert contents == [f"Message {i}" for i in range(first + 10)]
+
+    conversation = await db.conversations.find_one({"user_id": "split_user"})
+    assert conversation["message_count"] == first + 10
+
+
+@pytest.mark.asyncio
+async def test_users_in_one_batch_get_their_own_positions():
+    """Test that a batch for several users numbers each conversation from zero"""
+    db = await get_database()
+    totals = await _store_messages(
+        db, {"user_a": make_messages(0, 3), "user_b": make_messages(0, 2)}
+    )
+    assert totals == {"user_a": 3, "user_b": 2}
+
+    for user_id, count in totals.items():
+        buckets = await bucket_documents(db, user_id)
+        assert [msg["position"] for msg in buckets[0]["messages"]] == list(range(count))
+
+
+async def insert_flat_conversation(db, user_id, messages):
+    result = await db.conversations.insert_one(
+        {
+            "user_id": user_id,
+            "title": f"Chat with {user_id}",
+            "participants": [user_id],
+            "messages": messages,
+            "created_at": datetime(2024, 1, 1),
+            "updated_at": datetime(2024, 1, 2),
+        }
+    )
+    return await db.conversations.find_one({"_id": result.inserted_id})
+
+
+@pytest.mark.asyncio
+async def test_migration_keeps_messages_and_order():
+    """Test that migrated history reads back exactly like the old messages array"""
+    db = await get_database()
+    count = 2 * MESSAGE_BUCKET_SIZE + 30
+    flat = make_messages(0, count)
+    conversation = await insert_flat_conversation(db, "migrated_user", flat)
+
+    assert await migrate_conversation(db, conversation) == count
+
+    buckets = await bucket_documents(db, "migrated_user")
+    assert [bucket["seq"] for bucket in buckets] == [0, 1, 2]
+    assert [bucket["count"] for bucket in buckets] == [
+        MESSAGE_BUCKET_SIZE,
+        MESSAGE_BUCKET_SIZE,
+        30,
+    ]
+
+    history = await _read_window(db, "migrated_user", 500)
+    assert [msg["position"] for msg in history] == list(range(count))
+    assert [
+        (msg["content"], msg["sender"], msg["timestamp"]) for msg in history
+    ] == [(msg["content"], msg["sender"], msg["timestamp"]) for msg in flat]
+
+    migrated = await db.conversations.find_one({"user_id": "migrated_user"})
+    assert "messages" not in migrated
+    assert migrated["message_count"] == count
+
+
+@pytest.mark.asyncio
+async def test_migration_sorts_by_timestamp():
+    """Test that an out-of-order messages array is stored oldest first"""
+    db = await get_database()
+    flat = make_messages(0, 5)
+    conversation = await insert_flat_conversation(db, "unsorted_user", flat[::-1])
+
+    await migrate_conversation(db, conversation)
+
+    history = await _read_window(db, "unsorted_user", 50)
+    assert [msg["content"] for msg in history] == [msg["content"] for msg in flat]
+
+
+@pytest.mark.asyncio
+async def test_migration_rerun_is_idempotent():
+    """Test that migrating a conversation twice leaves the same buckets"""
+    db = await get_database()
+    count = MESSAGE_BUCKET_SIZE + 10
+    conversation = await insert_flat_conversation(
+        db, "rerun_user", make_messages(0, count)
+    )
+
+    await migrate_conversation(db, conversation)
+    first_run = await bucket_documents(db, "rerun_user")
+
+    # An interrupted run may have written the buckets without dropping the array
+    await migrate_conversation(db, conversation)
+    second_run = await bucket_documents(db, "rerun_user")
+
+    def without_write_time(buckets):
+        return [
+            {key: value for key, value in bucket.items() if key != "updated_at"}
+            for bucket in buckets
+        ]
+
+    assert without_write_time(second_run) == without_write_time(first_run)
+    history = await _read_window(db, "rerun_user", 500)
+    assert [msg["content"] for msg in history] == [
+        f"Message {i}" for i in range(count)
+    ]
+    migrated = await db.conversations.find_one({"user_id": "rerun_user"})
+    assert migrated["message_count"] == count
@@ -0,0 +1,331 @@
+import argparse
+import asyncio
+import hashlib
+import hmac
+import json
+import random
+import time
+from collections import defaultdict, deque
+from typing import Deque, Dict, List, Optional, Tuple
+import httpx
+import uvicorn
+from prometheus_client.parser import text_string_to_metric_families
+from fake_graph_api import FakeGraphAPI
+
+DEFAULT_METRICS = (
+    "http://localhost:8501/metrics",
+    "http://localhost:8502/metrics",
+    "http://localhost:8000/metrics",
+)
+PROMPTS = (
+    "Hola, necesito una planificación para matemática de 5to grado",
+    "¿Cómo puedo explicar fracciones equivalentes?",
+    "Dame una actividad de lectura comprensiva",
+    "Quiero evaluar a mis estudiantes sobre el sistema solar",
+    "¿Qué dinámica grupal recomiendas para empezar la clase?",
+)
+
+# Histogram label sets, without "le", mapped to cumulative bucket counts
+Histograms = Dict[Tuple[str, Tuple[Tuple[str, str], ...]], Dict[float, float]]
+
+
+def percentile(values: List[float], q: float) -> float:
+    if not values:
+        return float("nan")
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, int(q * len(ordered)))]
+
+
+def webhook_payload(user: str, message_id: str, text: str, number_id: str) -> Dict:
+    """A Meta webhook notification carrying one text message"""
+    return {
+        "object": "whatsapp_business_account",
+        "entry": [
+            {
+                "id": "loadtest",
+                "changes": [
+                    {
+                        "field": "messages",
+                        "value": {
+                            "messaging_product": "whatsapp",
+                            "metadata": {
+                                "display_phone_number": number_id,
+                                "phone_number_id": number_id,
+                            },
+                            "contacts": [{"profile": {"name": user}, "wa_id": user}],
+                            "messages": [
+                                {
+                                    "from": user,
+                                    "id": message_id,
+                                    "timestamp": str(int(time.time())),
+                                    "type": "text",
+                                    "text": {"body": text},
+                                }
+                            ],
+                        },
+                    }
+                ],
+            }
+        ],
+    }
+
+
+def sign(body: bytes, app_secret: str) -> str:
+    """X-Hub-Signature-256 header value, as Meta signs webhook deliveries"""
+    digest = hmac.new(app_secret.encode(), body, hashlib.sha256).hexdigest()
+    return f"sha256={digest}"
+
+
+async def scrape_histograms(client: httpx.AsyncClient, urls: List[str]) -> Histograms:
+    """Collect every *_duration_seconds histogram exposed by the services"""
+    histograms: Histograms = defaultdict(dict)
+    for url in urls:
+        try:
+            response = await client.get(url, timeout=5)
+            response.raise_for_status()
+        except httpx.HTTPError as e:
+            print(f"Could not scrape {url}: {str(e)}")
+            continue
+        for family in text_string_to_metric_families(response.text):
+            if family.type != "histogram" or not family.name.endswith(
+                "_duration_seconds"
+            ):
+                continue
+            for sample in family.samples:
+                if not sample.name.endswith("_bucket"):
+                    continue
+                labels = tuple(
+                    sorted((k, v) for k, v in sample.labels.items() if k != "le")
+                )
+                bound = float(sample.labels["le"])
+                histograms[(family.name, labels)][bound] = sample.value
+    return histograms
+
+
+def histogram_percentile(buckets: List[Tuple[float, float]], q: float) -> float:
+    """Estimate a percentile from cumulative buckets, interpolating linearly"""
+    total = buckets[-1][1]
+    rank = q * total
+    lower_bound, lower_count = 0.0, 0.0
+    for bound, count in buckets:
+        if count >= rank:
+            if bound == float("inf"):
+                return lower_bound
+            if count == lower_count:
+                return bound
+            fraction = (rank - lower_count) / (count - lower_count)
+            return lower_bound + (bound - lower_bound) * fraction
+        lower_bound, lower_count = bound, count
+    return lower_bound
+
+
+def stage_report(before: Histograms, after: Histograms) -> List[str]:
+    """Per-stage percentiles of the observations made during the run"""
+    lines = []
+    for key in sorted(after):
+        name, labels = key
+        previous = before.get(key, {})
+        buckets = sorted(
+            (bound, count - previous.get(bound, 0.0))
+            for bound, count in after[key].items()
+        )
+        if not buckets or buckets[-1][1] <= 0:
+            continue
+        label = ",".join(value for _, value in labels)
+        p50, p95, p99 = (histogram_percentile(buckets, q) for q in (0.5, 0.95, 0.99))
+        lines.append(
+            f"  {name.replace('_duration_seconds', ''):<28} {label:<32} "
+            f"{int(buckets[-1][1]):>7} {p50 * 1000:>9.1f} {p95 * 1000:>9.1f} "
+            f"{p99 * 1000:>9.1f}"
+        )
+    return lines
+
+
+class LoadTest:
+    """Fire signed webhooks at a fixed rate and time the replies.
+
+    Replies are matched to users: a reply's latency is measured from the
+    oldest of that user's messages still waiting for one, and a reply
+    answers everything the user sent before it (bursts are coalesced).
+    Later parts of a streamed reply find nothing waiting and are only
+    counted.
+    """
+
+    def __init__(self, args: argparse.Namespace):
+        self.args = args
+        self.rng = random.Random(args.seed)
+        self.users = [f"549110{i:06d}" for i in range(args.users)]
+        self.waiting: Dict[str, Deque[float]] = defaultdict(deque)
+        self.ack_latencies: List[float] = []
+        self.reply_latencies: List[float] = []
+        self.webhook_errors: Dict[str, int] = defaultdict(int)
+        self.sent = 0
+        self.answered = 0
+        self.reply_parts = 0
+        self.graph = FakeGraphAPI(
+            args.graph_latency_ms, args.graph_error_rate, args.seed, self.on_reply
+        )
+
+    def on_reply(self, to: str, text: str, arrived: float):
+        self.reply_parts += 1
+        waiting = self.waiting.get(to)
+        if not waiting:
+            return
+        self.reply_latencies.append(arrived - waiting[0])
+        self.answered += len(waiting)
+        waiting.clear()
+
+    async def send_webhook(self, client: httpx.AsyncClient, index: int):
+        user = self.rng.choice(self.users)
+        message_id = f"wamid.loadtest.{self.args.seed}.{index}"
+        body = json.dumps(
+            webhook_payload(
+                user, message_id, self.rng.choice(PROMPTS), self.args.number_id
+            )
+        ).encode()
+        headers = {
+            "Content-Type": "application/json",
+            "X-Hub-Signature-256": sign(body, self.args.app_secret),
+        }
+        start = time.monotonic()
+        self.waiting[user].append(start)
+        self.sent += 1
+        try:
+            response = await client.post(self.args.url, content=body, headers=headers)
+            self.ack_latencies.append(time.monotonic() - start)
+            if response.status_code != 200:
+                self.webhook_errors[str(response.status_code)] += 1
+                self.waiting[user].remove(start)
+        except httpx.HTTPError as e:
+            self.webhook_errors[type(e).__name__] += 1
+            self.waiting[user].remove(start)
+
+    async def fire(self, client: httpx.AsyncClient) -> float:
+        """Send rate * duration webhooks on an open-loop schedule"""
+        total = int(self.args.rate * self.args.duration)
+        start = time.monotonic()
+        tasks = []
+        for index in range(total):
+            delay = start + index / self.args.rate - time.monotonic()
+            if delay > 0:
+                await asyncio.sleep(delay)
+            tasks.append(asyncio.create_task(self.send_webhook(client, index)))
+        await asyncio.gather(*tasks)
+        return time.monotonic() - start
+
+    async def drain(self) -> float:
+        """Wait for outstanding replies, up to drain_seconds"""
+        start = time.monotonic()
+        deadline = start + self.args.drain_seconds
+        while time.monotonic() < deadline and any(self.waiting.values()):
+            await asyncio.sleep(0.1)
+        return time.monotonic() - start
+
+    async def run(self):
+        config = uvicorn.Config(
+            self.graph.app,
+            host=self.args.graph_host,
+            port=self.args.graph_port,
+            log_level="warning",
+        )
+        server = uvicorn.Server(config)
+        server_task = asyncio.create_task(server.serve())
+        while not server.started:
+            await asyncio.sleep(0.05)
+
+        limits = httpx.Limits(max_connections=self.args.connections)
+        try:
+            async with httpx.AsyncClient(limits=limits, timeout=30) as client:
+                before = await scrape_histograms(client, self.args.metrics)
+                fire_seconds = await self.fire(client)
+                drain_seconds = await self.drain()
+                after = await scrape_histograms(client, self.args.metrics)
+        finally:
+            server.should_exit = True
+            await server_task
+
+        self.report(fire_seconds, fire_seconds + drain_seconds, before, after)
+
+    def report(
+        self,
+        fire_seconds: float,
+        total_seconds: float,
+        before: Histograms,
+        after: Histograms,
+    ):
+        unanswered = sum(len(waiting) for waiting in self.waiting.values())
+        accepted = len(self.ack_latencies) - sum(
+            count for key, count in self.webhook_errors.items() if key.isdigit()
+        )
+        graph = self.graph.stats()
+
+        print(
+            f"\nSent {self.sent} webhooks in {fire_seconds:.1f}s "
+            f"({self.sent / fire_seconds:.1f}/s, target {self.args.rate}/s)"
+        )
+        print(
+            f"Accepted {accepted}, answered {self.answered} messages "
+            f"with {len(self.reply_latencies)} replies "
+            f"({self.answered / total_seconds:.1f} messages/s)"
+        )
+        print(f"Reply parts delivered: {self.reply_parts}")
+
+        print(f"\n{'latency (ms)':<24} {'count':>7} {'p50':>9} {'p95':>9} {'p99':>9}")
+        for name, values in (
+            ("webhook ack", self.ack_latencies),
+            ("first reply", self.reply_latencies),
+        ):
+            print(
+                f"  {name:<22} {len(values):>7} "
+                + " ".join(
+                    f"{percentile(values, q) * 1000:>9.1f}" for q in (0.5, 0.95, 0.99)
+                )
+            )
+
+        print("\nerrors")
+        print(f"  webhook rejected/failed  {dict(self.webhook_errors) or 0}")
+        print(
+            f"  unanswered messages      {unanswered} "
+            f"({unanswered / max(self.sent, 1):.1%})"
+        )
+        print(f"  error replies            {graph['error_replies']}")
+        print(f"  injected Graph API 5xx   {graph['injected_errors']}")
+
+        lines = stage_report(before, after)
+        if lines:
+            print(
+                f"\n{'stage latency (ms)':<61} {'count':>7} {'p50':>9} "
+                f"{'p95':>9} {'p99':>9}"
+            )
+            print("\n".join(lines))
+
+
+def main(argv: Optional[List[str]] = None):
+    parser = argparse.ArgumentParser(
+        description="Drive the WhatsApp pipeline with synthetic signed webhooks"
+    )
+    parser.add_argument("--url", default="http://localhost:8501/whatsapp")
+    parser.add_argument("--rate", type=float, default=10.0, help="Webhooks per second")
+    parser.add_argument("--duration", type=float, default=60.0, help="Seconds")
+    parser.add_argument("--users", type=int, default=100)
+    parser.add_argument("--drain-seconds", type=float, default=60.0)
+    parser.add_argument("--connections", type=int, default=100)
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--app-secret", default="loadtest")
+    parser.add_argument("--number-id", default="100000000000000")
+    parser.add_argument("--graph-host", default="127.0.0.1")
+    parser.add_argument("--graph-port", type=int, default=9100)
+    parser.add_argument("--graph-latency-ms", type=float, default=50.0)
+    parser.add_argument("--graph-error-rate", type=float, default=0.0)
+    parser.add_argument(
+        "--metrics",
+        nargs="*",
+        default=list(DEFAULT_METRICS),
+        help="Service /metrics URLs to report stage latencies from",
+    )
+    args = parser.parse_args(argv)
+    asyncio.run(LoadTest(args).run())
+
+
+if __name__ == "__main__":
+    main()
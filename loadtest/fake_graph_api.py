@@ -0,0 +1,96 @@
+import argparse
+import asyncio
+import itertools
+import random
+import time
+from typing import Callable, Dict, List, Optional
+from fastapi import FastAPI, Request
+from fastapi.responses import JSONResponse
+
+# The WhatsApp service's reply when processing a message fails
+ERROR_REPLY_PREFIX = "Lo siento, hubo un error"
+
+
+class FakeGraphAPI:
+    """Local stand-in for the WhatsApp Graph API messages endpoint.
+
+    Accepts sends at /{version}/{number_id}/messages after latency_ms,
+    answers a seeded error_rate fraction with 500 (which the WhatsApp
+    service retries), and records every delivered message. on_message is
+    called with the recipient, text and arrival time of each delivery.
+    """
+
+    def __init__(
+        self,
+        latency_ms: float = 50.0,
+        error_rate: float = 0.0,
+        seed: int = 0,
+        on_message: Optional[Callable[[str, str, float], None]] = None,
+    ):
+        self.latency_ms = latency_ms
+        self.error_rate = error_rate
+        self.on_message = on_message
+        self._rng = random.Random(seed)
+        self._ids = itertools.count(1)
+        self.requests = 0
+        self.delivered = 0
+        self.injected_errors = 0
+        self.error_replies = 0
+        self.recipients: Dict[str, int] = {}
+
+        self.app = FastAPI(title="Fake WhatsApp Graph API")
+        self.app.post("/{version}/{number_id}/messages")(self.send_message)
+        self.app.get("/stats")(self.stats)
+
+    async def send_message(self, version: str, number_id: str, request: Request):
+        body = await request.json()
+        self.requests += 1
+        if self.latency_ms:
+            await asyncio.sleep(self.latency_ms / 1000)
+        if self._rng.random() < self.error_rate:
+            self.injected_errors += 1
+            return JSONResponse(
+                {"error": {"message": "Injected failure", "code": 2}}, status_code=500
+            )
+
+        to = body.get("to", "")
+        text = body.get("text", {}).get("body", "")
+        self.delivered += 1
+        self.recipients[to] = self.recipients.get(to, 0) + 1
+        if text.startswith(ERROR_REPLY_PREFIX):
+            self.error_replies += 1
+        if self.on_message is not None:
+            self.on_message(to, text, time.monotonic())
+        return {
+            "messaging_product": "whatsapp",
+            "contacts": [{"input": to, "wa_id": to}],
+            "messages": [{"id": f"wamid.fake.{next(self._ids)}"}],
+        }
+
+    def stats(self) -> Dict[str, int]:
+        return {
+            "requests": self.requests,
+            "delivered": self.delivered,
+            "injected_errors": self.injected_errors,
+            "error_replies": self.error_replies,
+            "recipients": len(self.recipients),
+        }
+
+
+def main(argv: Optional[List[str]] = None):
+    import uvicorn
+
+    parser = argparse.ArgumentParser(description="Run the fake WhatsApp Graph API")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=9100)
+    parser.add_argument("--latency-ms", type=float, default=50.0)
+    parser.add_argument("--error-rate", type=float, default=0.0)
+    parser.add_argument("--seed", type=int, default=0)
+    args = parser.parse_args(argv)
+
+    graph = FakeGraphAPI(args.latency_ms, args.error_rate, args.seed)
+    uvicorn.run(graph.app, host=args.host, port=args.port, log_level="warning")
+
+
+if __name__ == "__main__":
+    main()
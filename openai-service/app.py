@@ -1,20 +1,31 @@
 import sys
-from fastapi import FastAPI, HTTPException, Depends
+import json
+import asyncio
+from fastapi import FastAPI, HTTPException, Depends, Response
+from fastapi.responses import StreamingResponse
 from fastapi.middleware.cors import CORSMiddleware
 from loguru import logger
 from contextlib import asynccontextmanager
 from datetime import datetime
+from typing import Awaitable, List, Optional, Tuple
 
 from shared.templates.prompts import TEMPLATES
 from services.db_client import DBClient
 from services.chat_service import ChatService
-from models.chat import Message, ChatResponse, ConversationHistory
+from services.conversation_cache import ConversationCache
+from services.fair_scheduler import PRIORITY_NAMES
+from services.summary_memory import SummaryMemory
+from models.chat import Message, ChatResponse, ConversationHistory, TurnRequest
 from config.settings import get_settings, Settings
 from logging_config import setup_logging
+from metrics import CONTENT_TYPE_LATEST, STAGE_SECONDS, register_stats, render
 
 # Setup logging
 setup_logging()
 
+# Messages of history read per turn; trimming to the token budget happens later
+HISTORY_LIMIT = 50
+
 
 @asynccontextmanager
 async def lifespan(app: FastAPI):
@@ -28,6 +39,8 @@ async def lifespan(app: FastAPI):
 
     # Shutdown
     logger.info("Shutting down OpenAI service")
+    if getattr(app, "summary_memory", None) is not None:
+        await app.summary_memory.close()
     if hasattr(app, "db_client"):
         await app.db_client.close()
     if hasattr(app, "chat_service"):
@@ -69,6 +82,129 @@ app.add_middleware(
 logger.info("Initializing service clients")
 app.db_client = DBClient()
 app.chat_service = ChatService()
+app.summary_memory = (
+    SummaryMemory(
+        app.db_client,
+        app.chat_service,
+        recent_messages=settings.SUMMARY_RECENT_MESSAGES,
+        fold_messages=settings.SUMMARY_FOLD_MESSAGES,
+    )
+    if settings.MEMORY_MODE == "summary"
+    else None
+)
+app.conversation_cache = (
+    ConversationCache(
+        app.chat_service.format_message,
+        window=HISTORY_LIMIT,
+        max_bytes=settings.CONVERSATION_CACHE_MAX_BYTES,
+    )
+    if settings.CONVERSATION_CACHE_ENABLED
+    else None
+)
+
+
+async def _chat_history(user_id: str) -> List[dict]:
+    """Read the user's history, fetching only what the conversation cache lacks"""
+    cache = app.conversation_cache
+    entry = cache.get(user_id) if cache is not None else None
+    if entry is not None and entry.next_position is not None:
+        # /chat callers store the user's message in the DB Service themselves,
+        # so the cache is always behind: ask only for what follows it
+        new_messages = await app.db_client.get_conversation_history(
+            user_id, HISTORY_LIMIT, after=entry.next_position - 1
+        )
+        # A full page may have skipped messages; read the window again then
+        if len(new_messages) < HISTORY_LIMIT:
+            entry = cache.extend(user_id, new_messages)
+            if entry is not None:
+                return list(entry.messages)
+
+    history = await app.db_client.get_conversation_history(user_id, HISTORY_LIMIT)
+    if cache is not None:
+        cache.put(user_id, history)
+    return history
+
+
+async def _turn_history(turn: TurnRequest) -> List[dict]:
+    """Store the turn's messages and return the history up to and including them"""
+    cache = app.conversation_cache
+    entry = cache.get(turn.user_id) if cache is not None else None
+    # A cached user only needs the new messages back, for their positions
+    warm = entry is not None and entry.next_position is not None
+    history = await app.db_client.add_turn_messages(
+        turn.user_id,
+        turn.messages,
+        message_type=turn.message_type,
+        timestamp=turn.timestamp,
+        limit=len(turn.messages) if warm else HISTORY_LIMIT,
+    )
+    if cache is None:
+        return history
+
+    if warm:
+        entry = cache.extend(turn.user_id, history)
+        if entry is not None:
+            return list(entry.messages)
+        # Something else wrote to the conversation since it was cached
+        history = await app.db_client.get_conversation_history(
+            turn.user_id, HISTORY_LIMIT
+        )
+    cache.put(turn.user_id, history)
+    return history
+
+
+def _formatted_history(user_id: str, history: List[dict]) -> Optional[List]:
+    """The history's LangChain messages, if the conversation cache has them"""
+    if app.conversation_cache is None:
+        return None
+    return app.conversation_cache.formatted(user_id, history)
+
+
+async def _store_reply(turn: TurnRequest, response: str):
+    """Store the assistant's reply and add it to the cached conversation"""
+    with STAGE_SECONDS.labels("store_reply").time():
+        stored = await app.db_client.store_message(
+            turn.user_id, response, "assistant", turn.message_type
+        )
+    cache = app.conversation_cache
+    if cache is None:
+        return
+    if stored:
+        cache.append_stored(
+            turn.user_id,
+            {
+                "content": response,
+                "sender": "assistant",
+                "message_type": turn.message_type,
+                "timestamp": datetime.utcnow().isoformat(),
+            },
+        )
+    else:
+        cache.invalidate(turn.user_id)
+
+
+async def _load_history(
+    user_id: str, history_call: Awaitable[List[dict]]
+) -> Tuple[List[dict], Optional[str], int]:
+    """Await a history read, fetching the summary alongside it in summary mode.
+
+    Returns the unsummarized history, the summary and the position of the
+    first message the summary doesn't cover.
+    """
+    if app.summary_memory is None:
+        return await history_call, None, 0
+    history, (summary, position) = await asyncio.gather(
+        history_call, app.db_client.get_summary(user_id)
+    )
+    return app.summary_memory.unsummarized(history, position), summary, position
+
+
+def _after_reply(
+    user_id: str, summary: Optional[str], position: int, history: List[dict]
+):
+    """Fold older messages into the summary once enough have piled up"""
+    if app.summary_memory is not None:
+        app.summary_memory.maybe_fold(user_id, summary, position, history)
 
 
 @app.post("/chat", response_model=ChatResponse)
@@ -83,22 +219,157 @@ async def chat_endpoint(message: Message):
     try:
         # Get conversation history
         logger.debug("Fetching conversation history")
-        history = await app.db_client.get_conversation_history(message.user_id)
+        with STAGE_SECONDS.labels("history_fetch").time():
+            history, summary, position = await _load_history(
+                message.user_id, _chat_history(message.user_id)
+            )
 
         # Process with LangChain
         logger.debug("Processing message with LangChain")
         response = await app.chat_service.process_message(
-            message.content, message.user_id, history
+            message.content,
+            message.user_id,
+            history,
+            summary,
+            message.use_cache,
+            formatted_history=_formatted_history(message.user_id, history),
+            priority=PRIORITY_NAMES.index(message.priority),
         )
+        _after_reply(message.user_id, summary, position, history)
 
         logger.info(f"Successfully processed message for user {message.user_id}")
         return ChatResponse(response=response)
 
+    except HTTPException:
+        # Overload responses (429, 503) reach the caller as they are
+        raise
     except Exception as e:
         logger.error(f"Error in chat endpoint: {str(e)}", exc_info=True)
         raise HTTPException(status_code=500, detail=str(e))
 
 
+@app.post("/chat/stream")
+async def chat_stream_endpoint(message: Message):
+    """
+    Same as /chat, but streams the reply as newline-delimited JSON events:
+    {"type": "delta", "content": ...} while generating, then
+    {"type": "done", "response": ...} with the full text, or
+    {"type": "error", "detail": ...} if generation fails part way.
+    """
+    logger.info(f"Streaming chat message for user {message.user_id}")
+    with STAGE_SECONDS.labels("history_fetch").time():
+        history, summary, position = await _load_history(
+            message.user_id, _chat_history(message.user_id)
+        )
+
+    async def events():
+        parts = []
+        try:
+            async for delta in app.chat_service.stream_message(
+                message.content,
+                message.user_id,
+                history,
+                summary,
+                message.use_cache,
+                formatted_history=_formatted_history(message.user_id, history),
+                priority=PRIORITY_NAMES.index(message.priority),
+            ):
+                parts.append(delta)
+                yield json.dumps({"type": "delta", "content": delta}) + "\n"
+            yield json.dumps({"type": "done", "response": "".join(parts)}) + "\n"
+            _after_reply(message.user_id, summary, position, history)
+            logger.info(f"Successfully streamed message for user {message.user_id}")
+        except Exception as e:
+            logger.error(f"Error in chat stream: {str(e)}", exc_info=True)
+            yield json.dumps({"type": "error", "detail": str(e)}) + "\n"
+
+    return StreamingResponse(events(), media_type="application/x-ndjson")
+
+
+async def _start_turn(
+    turn: TurnRequest,
+) -> Tuple[str, List[dict], Optional[str], int]:
+    """Persist the user's messages and return the prompt input, prior history,
+    summary and summary position"""
+    # Storing the messages and fetching history is a single DB call here
+    with STAGE_SECONDS.labels("store_turn").time():
+        history, summary, position = await _load_history(
+            turn.user_id, _turn_history(turn)
+        )
+    # The new messages are sent as the input, not repeated as history
+    prior_history = history[: max(0, len(history) - len(turn.messages))]
+    return "\n".join(turn.messages), prior_history, summary, position
+
+
+@app.post("/turn", response_model=ChatResponse)
+async def turn_endpoint(turn: TurnRequest):
+    """
+    Handle a full conversation turn so callers need a single request:
+    1. Store the user's messages and read history in one DB call
+    2. Generate AI response using LangChain
+    3. Store the reply
+    """
+    logger.info(f"Processing turn for user {turn.user_id}")
+    try:
+        content, history, summary, position = await _start_turn(turn)
+        response = await app.chat_service.process_message(
+            content,
+            turn.user_id,
+            history,
+            summary,
+            turn.use_cache,
+            formatted_history=_formatted_history(turn.user_id, history),
+            priority=PRIORITY_NAMES.index(turn.priority),
+        )
+        await _store_reply(turn, response)
+        _after_reply(turn.user_id, summary, position, history)
+
+        logger.info(f"Successfully processed turn for user {turn.user_id}")
+        return ChatResponse(response=response)
+
+    except HTTPException:
+        raise
+    except Exception as e:
+        logger.error(f"Error in turn endpoint: {str(e)}", exc_info=True)
+        raise HTTPException(status_code=500, detail=str(e))
+
+
+@app.post("/turn/stream")
+async def turn_stream_endpoint(turn: TurnRequest):
+    """Same as /turn, streaming the reply with the /chat/stream event format"""
+    logger.info(f"Streaming turn for user {turn.user_id}")
+    try:
+        content, history, summary, position = await _start_turn(turn)
+    except Exception as e:
+        logger.error(f"Error storing turn: {str(e)}", exc_info=True)
+        raise HTTPException(status_code=500, detail=str(e))
+
+    async def events():
+        parts = []
+        try:
+            async for delta in app.chat_service.stream_message(
+                content,
+                turn.user_id,
+                history,
+                summary,
+                turn.use_cache,
+                formatted_history=_formatted_history(turn.user_id, history),
+                priority=PRIORITY_NAMES.index(turn.priority),
+            ):
+                parts.append(delta)
+                yield json.dumps({"type": "delta", "content": delta}) + "\n"
+            response = "".join(parts)
+            await _store_reply(turn, response)
+            _after_reply(turn.user_id, summary, position, history)
+            yield json.dumps({"type": "done", "response": response}) + "\n"
+            logger.info(f"Successfully streamed turn for user {turn.user_id}")
+        except Exception as e:
+            logger.error(f"Error in turn stream: {str(e)}", exc_info=True)
+            yield json.dumps({"type": "error", "detail": str(e)}) + "\n"
+
+    return StreamingResponse(events(), media_type="application/x-ndjson")
+
+
 @app.get("/conversations/{user_id}", response_model=ConversationHistory)
 async def get_conversation(user_id: str, limit: int = 20):
     """Get conversation history for a user"""
@@ -112,6 +383,26 @@ async def get_conversation(user_id: str, limit: int = 20):
         raise HTTPException(status_code=500, detail=str(e))
 
 
+register_stats(
+    "openai",
+    {
+        "store_batcher": lambda: app.db_client.batcher.stats(),
+        "summary_memory": lambda: app.summary_memory.stats(),
+        "conversation_cache": lambda: app.conversation_cache.stats(),
+        "rate_limiter": lambda: app.chat_service.rate_limiter.stats(),
+        "scheduler": lambda: app.chat_service.scheduler.stats(),
+        "response_cache": lambda: app.chat_service.response_cache.stats(),
+        "semantic_cache": lambda: app.chat_service.semantic_cache.stats(),
+    },
+)
+
+
+@app.get("/metrics")
+async def metrics():
+    """Prometheus metrics: per-stage latency histograms and write batching"""
+    return Response(content=render(), media_type=CONTENT_TYPE_LATEST)
+
+
 @app.get("/health")
 async def health_check():
     """Health check endpoint"""
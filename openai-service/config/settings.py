@@ -1,4 +1,4 @@
-from typing import Optional
+from typing import Literal, Optional
 from functools import lru_cache
 from pydantic_settings import BaseSettings, SettingsConfigDict
 from enum import Enum
@@ -18,9 +18,57 @@ class Settings(BaseSettings):
 
     # OpenAI settings
     OPENAI_API_KEY: str
+    LLM_BACKEND: Literal["openai", "fake"] = "openai"
+    LLM_MODEL: str = "gpt-4"
+    LLM_MAX_OUTPUT_TOKENS: int = 1000
+    LLM_TEMPERATURE: float = 0.7
+    # OpenAI account quotas; calls wait rather than hit 429s
+    LLM_REQUESTS_PER_MINUTE: int = 30
+    LLM_TOKENS_PER_MINUTE: int = 40000
+
+    # Fair queuing of LLM calls across users
+    LLM_MAX_CONCURRENCY: int = 8  # Calls in flight at once; the rest queue
+    SCHEDULER_MAX_QUEUE_DEPTH: int = 200  # Queued calls before new ones get a 503
+    SCHEDULER_MAX_USER_QUEUE_DEPTH: int = 20  # Same, per user
+    SCHEDULER_QUANTUM_TOKENS: int = 2000  # Tokens of credit per user per round
+    SCHEDULER_INTERACTIVE_WEIGHT: int = 4  # Interactive dispatches per bulk one
+    # Context window budget; unset uses the model's known window
+    LLM_CONTEXT_TOKENS: Optional[int] = None
+    LLM_CONTEXT_MARGIN_TOKENS: int = 100  # Headroom for tokenizer differences
+
+    # Fake LLM settings, for offline load tests (LLM_BACKEND=fake)
+    FAKE_LLM_LATENCY_MS: float = 800.0  # Median time to the first token
+    FAKE_LLM_LATENCY_SIGMA: float = 0.5  # Log-normal spread of that latency
+    FAKE_LLM_TOKEN_DELAY_MS: float = 20.0
+    FAKE_LLM_TOKENS: int = 60
+    FAKE_LLM_SEED: int = 0
+
+    # Conversation memory: "summary" prompts with a rolling summary plus recent turns
+    MEMORY_MODE: Literal["window", "summary"] = "window"
+    SUMMARY_RECENT_MESSAGES: int = 10  # Raw messages always kept in the prompt
+    SUMMARY_FOLD_MESSAGES: int = 10  # Older messages folded into the summary at once
+
+    # Exact-match reply cache, keyed on the full formatted prompt
+    RESPONSE_CACHE_ENABLED: bool = True
+    RESPONSE_CACHE_MAX_ENTRIES: int = 5000
+    RESPONSE_CACHE_MAX_BYTES: int = 20_000_000
+    RESPONSE_CACHE_TTL_SECONDS: float = 3600.0
+
+    # Semantic reply cache: similar messages in turns with little history
+    SEMANTIC_CACHE_ENABLED: bool = False
+    SEMANTIC_CACHE_THRESHOLD: float = 0.85  # Cosine similarity needed for a hit
+    SEMANTIC_CACHE_MAX_ENTRIES: int = 1000
+    SEMANTIC_CACHE_TTL_SECONDS: float = 3600.0
+    SEMANTIC_CACHE_MAX_HISTORY: int = 0  # Prior messages a turn may have to use it
+
+    # Per-user cache of formatted history, kept current as turns complete
+    CONVERSATION_CACHE_ENABLED: bool = True
+    CONVERSATION_CACHE_MAX_BYTES: int = 50_000_000
 
     # Database settings
     DB_SERVICE_URL: str = "http://db-service:8000/api/v1"
+    STORE_BATCH_MAX_SIZE: int = 50
+    STORE_BATCH_MAX_DELAY_MS: float = 5.0
 
     model_config = SettingsConfigDict(
         env_file=".env",
@@ -1,5 +1,5 @@
 from pydantic import BaseModel, Field
-from typing import Dict, Optional, List
+from typing import Dict, Literal, Optional, List
 from datetime import datetime
 
 
@@ -10,6 +10,20 @@ class Message(BaseModel):
     user_id: str
     message_type: str = "text"
     timestamp: datetime = Field(default_factory=datetime.utcnow)
+    use_cache: bool = True  # False always asks the model for a fresh reply
+    # Scheduler class: "bulk" for long generation work that can wait behind live turns
+    priority: Literal["interactive", "bulk"] = "interactive"
+
+
+class TurnRequest(BaseModel):
+    """One or more user messages answered with a single reply"""
+
+    user_id: str
+    messages: List[str]
+    message_type: str = "text"
+    timestamp: datetime = Field(default_factory=datetime.utcnow)
+    use_cache: bool = True
+    priority: Literal["interactive", "bulk"] = "interactive"
 
 
 class ChatResponse(BaseModel):
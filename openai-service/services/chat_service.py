@@ -1,68 +1,103 @@
-from typing import Dict, List
+from typing import AsyncIterator, Callable, Dict, List, Optional, Tuple
+from functools import partial
 import os
 from loguru import logger
-from langchain_core.messages import HumanMessage, AIMessage, BaseMessage
+from langchain_core.messages import HumanMessage, AIMessage, BaseMessage, SystemMessage
 from langchain_core.prompts import ChatPromptTemplate, MessagesPlaceholder
 from langchain_openai import ChatOpenAI
 from langchain_core.runnables import RunnablePassthrough
-from shared.templates.prompts import SYSTEM_PROMPT
-from services.db_client import DBClient
+from shared.templates.prompts import (
+    SUMMARY_CONTEXT_PROMPT,
+    SUMMARY_PROMPT,
+    SYSTEM_PROMPT,
+)
+from services.fair_scheduler import BULK, INTERACTIVE, FairScheduler, SchedulerFull
+from services.rate_limiter import TokenBucketLimiter
+from services.response_cache import ResponseCache, prompt_key
+from services.semantic_cache import SemanticCache
+from services.token_counter import (
+    REPLY_PRIMING_TOKENS,
+    TokenCounter,
+    context_tokens_for,
+)
+from config.settings import get_settings
 from datetime import datetime
 from tenacity import retry, stop_after_attempt, wait_exponential, retry_if_exception_type
 from openai import RateLimitError, APIError, APITimeoutError
-import asyncio
+import time
 from fastapi import HTTPException
-
-MAX_CHARS = 12000  # Approximate character limit for context window
-SYSTEM_PROMPT_CHARS = 400  # Approximate chars for system prompt
-BUFFER_CHARS = 2000  # Leave room for the response
-
-
-class RateLimiter:
-    def __init__(self, max_requests: int, time_window: float):
-        self.max_requests = max_requests
-        self.time_window = time_window
-        self.requests = []
-        self._lock = asyncio.Lock()
-
-    async def acquire(self):
-        async with self._lock:
-            now = asyncio.get_event_loop().time()
-            
-            # Remove old requests
-            self.requests = [req_time for req_time in self.requests 
-                        if now - req_time < self.time_window]
-
-            if len(self.requests) >= self.max_requests:
-                sleep_time = self.requests[0] + self.time_window - now
-                if sleep_time > 0:
-                    await asyncio.sleep(sleep_time)
-                    
-            self.requests.append(now)
+from metrics import STAGE_SECONDS
 
 
 class ChatService:
     def __init__(self):
         logger.info("Initializing ChatService")
         try:
-            # Initialize DB client (only for reading history)
-            self.db_client = DBClient()
-            logger.debug("DB client initialized successfully")
+            settings = get_settings()
 
-            # Initialize rate limiter for OpenAI requests
-            self.rate_limiter = RateLimiter(max_requests=30, time_window=60.0)
+            # Keep within the OpenAI requests and tokens per minute quotas
+            self.rate_limiter = TokenBucketLimiter(
+                requests_per_minute=settings.LLM_REQUESTS_PER_MINUTE,
+                tokens_per_minute=settings.LLM_TOKENS_PER_MINUTE,
+            )
             logger.debug("Rate limiter initialized successfully")
 
-            # Initialize the ChatOpenAI model with proper configuration
-            self.llm = ChatOpenAI(
-                model_name="gpt-4",
-                temperature=0.7,
-                max_tokens=1000,
-                api_key=os.getenv("OPENAI_API_KEY"),
-                streaming=True,
-                request_timeout=30.0,
+            # Share LLM capacity fairly between users once calls queue up
+            self.scheduler = FairScheduler(
+                max_concurrency=settings.LLM_MAX_CONCURRENCY,
+                max_queue_depth=settings.SCHEDULER_MAX_QUEUE_DEPTH,
+                max_user_queue_depth=settings.SCHEDULER_MAX_USER_QUEUE_DEPTH,
+                quantum=settings.SCHEDULER_QUANTUM_TOKENS,
+                interactive_weight=settings.SCHEDULER_INTERACTIVE_WEIGHT,
             )
-            logger.debug("ChatOpenAI model initialized successfully")
+            if settings.LLM_BACKEND == "fake":
+                # Offline stand-in for load tests: no network, seeded replies
+                from services.fake_llm import FakeChatModel
+
+                self.llm = FakeChatModel(
+                    latency_ms=settings.FAKE_LLM_LATENCY_MS,
+                    latency_sigma=settings.FAKE_LLM_LATENCY_SIGMA,
+                    token_delay_ms=settings.FAKE_LLM_TOKEN_DELAY_MS,
+                    tokens=settings.FAKE_LLM_TOKENS,
+                    seed=settings.FAKE_LLM_SEED,
+                )
+                logger.warning("Using the fake LLM backend")
+            else:
+                # Initialize the ChatOpenAI model with proper configuration
+                self.llm = ChatOpenAI(
+                    model_name=settings.LLM_MODEL,
+                    temperature=settings.LLM_TEMPERATURE,
+                    max_tokens=settings.LLM_MAX_OUTPUT_TOKENS,
+                    api_key=os.getenv("OPENAI_API_KEY"),
+                    streaming=True,
+                    request_timeout=30.0,
+                )
+                logger.debug("ChatOpenAI model initialized successfully")
+
+            # Identical prompts get identical replies from the cache
+            self.model_id = f"{settings.LLM_BACKEND}:{settings.LLM_MODEL}"
+            self.temperature = settings.LLM_TEMPERATURE
+            self.response_cache = (
+                ResponseCache(
+                    max_entries=settings.RESPONSE_CACHE_MAX_ENTRIES,
+                    max_bytes=settings.RESPONSE_CACHE_MAX_BYTES,
+                    ttl_seconds=settings.RESPONSE_CACHE_TTL_SECONDS,
+                )
+                if settings.RESPONSE_CACHE_ENABLED
+                else None
+            )
+            # Similar opening messages get the same reply; pass embed= to
+            # SemanticCache to use a real embedding model
+            self.semantic_cache = (
+                SemanticCache(
+                    threshold=settings.SEMANTIC_CACHE_THRESHOLD,
+                    max_entries=settings.SEMANTIC_CACHE_MAX_ENTRIES,
+                    ttl_seconds=settings.SEMANTIC_CACHE_TTL_SECONDS,
+                )
+                if settings.SEMANTIC_CACHE_ENABLED
+                else None
+            )
+            self.semantic_cache_max_history = settings.SEMANTIC_CACHE_MAX_HISTORY
 
             # Initialize prompt template with external system prompt
             self.prompt = ChatPromptTemplate.from_messages(
@@ -74,38 +109,59 @@ class ChatService:
             )
             logger.debug("Prompt template initialized successfully")
 
+            # History gets whatever the model's window leaves after the fixed
+            # parts of the prompt; the system prompt is only counted once
+            self.token_counter = TokenCounter(settings.LLM_MODEL)
+            self.max_output_tokens = settings.LLM_MAX_OUTPUT_TOKENS
+            self.system_prompt_tokens = self.token_counter.count_message(SYSTEM_PROMPT)
+            self.prompt_budget = (
+                context_tokens_for(settings.LLM_MODEL, settings.LLM_CONTEXT_TOKENS)
+                - settings.LLM_MAX_OUTPUT_TOKENS
+                - settings.LLM_CONTEXT_MARGIN_TOKENS
+                - self.system_prompt_tokens
+                - REPLY_PRIMING_TOKENS
+            )
+            logger.debug(
+                f"System prompt uses {self.system_prompt_tokens} tokens, "
+                f"{self.prompt_budget} left for history and the message"
+            )
+
         except Exception as e:
             logger.error(f"Error initializing ChatService: {str(e)}")
             raise
 
-    def _count_chars(self, text: str) -> int:
-        """Count characters in a text string"""
-        return len(text)
-
     def _trim_history_to_fit(
-        self, history: List[BaseMessage], current_message: str
+        self,
+        history: List[BaseMessage],
+        current_message: str,
+        summary: Optional[str] = None,
     ) -> List[BaseMessage]:
-        """Trim history to fit within character limit"""
-        current_chars = self._count_chars(current_message)
-        available_chars = MAX_CHARS - SYSTEM_PROMPT_CHARS - current_chars - BUFFER_CHARS
+        """Keep the newest history that fits the model's token budget"""
+        available_tokens = self.prompt_budget - self.token_counter.count_message(
+            current_message
+        )
+        if summary:
+            available_tokens -= self.token_counter.count_message(summary)
 
-        if available_chars <= 0:
+        if available_tokens <= 0:
             logger.warning("Message too long, no room for history")
             return []
 
-        total_chars = 0
-        trimmed_history = []
+        total_tokens = 0
+        kept = 0
 
-        # Process messages from newest to oldest
+        # Count messages from newest to oldest
         for msg in reversed(history):
-            msg_chars = self._count_chars(msg.content)
-            if total_chars + msg_chars > available_chars:
+            msg_tokens = self.token_counter.count_message(msg.content)
+            if total_tokens + msg_tokens > available_tokens:
                 break
-            total_chars += msg_chars
-            trimmed_history.insert(0, msg)  # Insert at beginning to maintain order
+            total_tokens += msg_tokens
+            kept += 1
 
+        trimmed_history = history[len(history) - kept :]
         logger.info(
-            f"Trimmed history from {len(history)} to {len(trimmed_history)} messages"
+            f"Trimmed history from {len(history)} to {len(trimmed_history)} messages "
+            f"({total_tokens} tokens)"
         )
         return trimmed_history
 
@@ -119,38 +175,152 @@ class ChatService:
             f"Retrying request after error: {retry_state.outcome.exception()}"
         )
     )
-    async def _invoke_llm(self, messages):
+    async def _invoke_llm(self, messages, user_id: str, priority: int = INTERACTIVE):
         """Protected method to invoke LLM with retries"""
-        await self.rate_limiter.acquire()
-        return await self.llm.ainvoke(messages)
+        cost = self._prompt_tokens(messages) + self.max_output_tokens
+        queued = time.perf_counter()
+        async with self.scheduler.slot(user_id, cost, priority):
+            STAGE_SECONDS.labels("scheduler_wait").observe(time.perf_counter() - queued)
+            with STAGE_SECONDS.labels("rate_limiter_wait").time():
+                reservation = await self.rate_limiter.acquire(cost)
+            with STAGE_SECONDS.labels("llm_call").time():
+                response = await self.llm.ainvoke(messages)
+        usage = self._usage_tokens(response)
+        if usage is not None:
+            self.rate_limiter.reconcile(reservation, usage)
+        return response
+
+    def _prompt_tokens(self, messages: List[BaseMessage]) -> int:
+        """Tokens the prompt counts against the tokens per minute quota"""
+        return (
+            sum(self.token_counter.count_message(msg.content) for msg in messages)
+            + REPLY_PRIMING_TOKENS
+        )
+
+    @staticmethod
+    def _usage_tokens(response) -> Optional[int]:
+        """Total tokens the API reports for a reply, if it reports any"""
+        usage = getattr(response, "usage_metadata", None)
+        if isinstance(usage, dict) and isinstance(usage.get("total_tokens"), int):
+            return usage["total_tokens"]
+        metadata = getattr(response, "response_metadata", None)
+        if isinstance(metadata, dict):
+            total = (metadata.get("token_usage") or {}).get("total_tokens")
+            if isinstance(total, int):
+                return total
+        return None
+
+    def _build_messages(
+        self,
+        message: str,
+        history: List[Dict],
+        summary: Optional[str] = None,
+        formatted_history: Optional[List[BaseMessage]] = None,
+    ) -> List[BaseMessage]:
+        """Format, trim and template the prompt for the LLM"""
+        # Format history into messages, unless the caller kept them formatted
+        if formatted_history is not None:
+            chat_history = formatted_history
+        else:
+            chat_history = self._format_history(history)
+        logger.debug(f"Formatted chat history length: {len(chat_history)}")
+
+        # Trim history to fit character limit
+        trimmed_history = self._trim_history_to_fit(chat_history, message, summary)
+        logger.debug(f"Trimmed history length: {len(trimmed_history)}")
+
+        # Create messages for the prompt
+        messages = self.prompt.format_messages(
+            chat_history=trimmed_history, input=message
+        )
+        if summary:
+            # Older turns folded into a summary go right after the system prompt
+            messages.insert(
+                1, SystemMessage(content=SUMMARY_CONTEXT_PROMPT.format(summary=summary))
+            )
+        logger.debug(f"Formatted messages for LLM")
+        return messages
+
+    def _cached_reply(
+        self,
+        messages: List[BaseMessage],
+        message: str,
+        history: List[Dict],
+        summary: Optional[str],
+        use_cache: bool,
+    ) -> Tuple[Optional[str], List[Callable[[str], None]]]:
+        """Look the turn up in the response caches.
+
+        Returns the cached reply, or None and the functions that store a
+        freshly generated reply in the caches that missed.
+        """
+        stores: List[Callable[[str], None]] = []
+        if not use_cache:
+            return None, stores
+
+        if self.response_cache is not None:
+            with STAGE_SECONDS.labels("response_cache").time():
+                key = prompt_key(messages, self.model_id, self.temperature)
+                reply = self.response_cache.get(key)
+            if reply is not None:
+                return reply, []
+            stores.append(partial(self.response_cache.put, key))
+
+        # Only turns that barely depend on the conversation so far are
+        # matched by the message alone
+        if (
+            self.semantic_cache is not None
+            and not summary
+            and len(history) <= self.semantic_cache_max_history
+        ):
+            with STAGE_SECONDS.labels("semantic_cache").time():
+                query, reply = self.semantic_cache.lookup(message)
+            if reply is not None:
+                for store in stores:
+                    store(reply)
+                return reply, []
+            stores.append(partial(self.semantic_cache.add, query))
+
+        return None, stores
 
     async def process_message(
-        self, message: str, user_id: str, history: List[Dict]
+        self,
+        message: str,
+        user_id: str,
+        history: List[Dict],
+        summary: Optional[str] = None,
+        use_cache: bool = True,
+        formatted_history: Optional[List[BaseMessage]] = None,
+        priority: int = INTERACTIVE,
     ) -> str:
-        """Process a message using LangChain"""
+        """Process a message using LangChain.
+
+        priority is the scheduler class of the call: INTERACTIVE for a user
+        waiting on the reply, BULK for background or batch work.
+        """
         logger.info(f"Processing message for user {user_id}")
         logger.debug(f"Message content: {message}")
         logger.debug(f"History length: {len(history)}")
 
         try:
-            # Format history into messages
-            chat_history = self._format_history(history)
-            logger.debug(f"Formatted chat history length: {len(chat_history)}")
+            with STAGE_SECONDS.labels("prompt_build").time():
+                messages = self._build_messages(
+                    message, history, summary, formatted_history
+                )
 
-            # Trim history to fit character limit
-            trimmed_history = self._trim_history_to_fit(chat_history, message)
-            logger.debug(f"Trimmed history length: {len(trimmed_history)}")
-
-            # Create messages for the prompt
-            messages = self.prompt.format_messages(
-                chat_history=trimmed_history, input=message
+            cached, cache_stores = self._cached_reply(
+                messages, message, history, summary, use_cache
             )
-            logger.debug(f"Formatted messages for LLM")
+            if cached is not None:
+                logger.info(f"Answered user {user_id} from the response cache")
+                return cached
 
             # Run chain with rate limiting and retries
             logger.info("Invoking LLM")
-            response = await self._invoke_llm(messages)
+            response = await self._invoke_llm(messages, user_id, priority)
             logger.debug(f"Raw LLM response: {response}")
+            for store in cache_stores:
+                store(response.content)
 
             logger.info(f"Successfully processed message for user {user_id}")
             return response.content
@@ -161,10 +331,104 @@ class ChatService:
                 status_code=429,
                 detail="Rate limit exceeded. Please try again later."
             )
+        except SchedulerFull as e:
+            logger.warning(f"Rejected message for user {user_id}: {str(e)}")
+            raise HTTPException(
+                status_code=503,
+                detail="Too many requests queued. Please try again later.",
+            )
         except Exception as e:
             logger.error(f"Error in process_message: {str(e)}", exc_info=True)
             raise
 
+    async def stream_message(
+        self,
+        message: str,
+        user_id: str,
+        history: List[Dict],
+        summary: Optional[str] = None,
+        use_cache: bool = True,
+        formatted_history: Optional[List[BaseMessage]] = None,
+        priority: int = INTERACTIVE,
+    ) -> AsyncIterator[str]:
+        """Process a message using LangChain, yielding the reply as it is generated"""
+        logger.info(f"Streaming message for user {user_id}")
+        logger.debug(f"History length: {len(history)}")
+
+        try:
+            with STAGE_SECONDS.labels("prompt_build").time():
+                messages = self._build_messages(
+                    message, history, summary, formatted_history
+                )
+
+            cached, cache_stores = self._cached_reply(
+                messages, message, history, summary, use_cache
+            )
+            if cached is not None:
+                logger.info(f"Answered user {user_id} from the response cache")
+                yield cached
+                return
+
+            # Tokens can't be taken back once sent, so streams are not retried
+            prompt_tokens = self._prompt_tokens(messages)
+            cost = prompt_tokens + self.max_output_tokens
+            queued = time.perf_counter()
+            async with self.scheduler.slot(user_id, cost, priority):
+                STAGE_SECONDS.labels("scheduler_wait").observe(
+                    time.perf_counter() - queued
+                )
+                with STAGE_SECONDS.labels("rate_limiter_wait").time():
+                    reservation = await self.rate_limiter.acquire(cost)
+                logger.info("Streaming from LLM")
+                start = time.perf_counter()
+                first_token = None
+                parts = []
+                async for chunk in self.llm.astream(messages):
+                    if chunk.content:
+                        if first_token is None:
+                            first_token = time.perf_counter() - start
+                            STAGE_SECONDS.labels("llm_first_token").observe(first_token)
+                        parts.append(chunk.content)
+                        yield chunk.content
+                STAGE_SECONDS.labels("llm_call").observe(time.perf_counter() - start)
+            # Streams don't report usage, so the reply is counted here
+            response = "".join(parts)
+            self.rate_limiter.reconcile(
+                reservation, prompt_tokens + self.token_counter.count(response)
+            )
+            # Only complete replies are cached
+            for store in cache_stores:
+                store(response)
+
+            logger.info(f"Successfully streamed message for user {user_id}")
+
+        except Exception as e:
+            logger.error(f"Error in stream_message: {str(e)}", exc_info=True)
+            raise
+
+    async def summarize(
+        self, previous_summary: Optional[str], history: List[Dict], user_id: str
+    ) -> str:
+        """Fold messages into the previous summary, returning the new summary"""
+        lines = []
+        for msg in self._format_history(history):
+            speaker = "Docente" if isinstance(msg, HumanMessage) else "TutorIA"
+            lines.append(f"{speaker}: {msg.content}")
+        transcript = "\n".join(lines)
+        content = (
+            f"Resumen anterior:\n{previous_summary or '(ninguno)'}\n\n"
+            f"Mensajes nuevos:\n{transcript}"
+        )
+
+        with STAGE_SECONDS.labels("summarize").time():
+            # Background work, so it yields to the users' turns
+            response = await self._invoke_llm(
+                [SystemMessage(content=SUMMARY_PROMPT), HumanMessage(content=content)],
+                user_id,
+                BULK,
+            )
+        return response.content
+
     def _format_history(self, history: List[Dict]) -> List[BaseMessage]:
         """Format DB history into LangChain messages"""
         logger.debug(f"Formatting history of length: {len(history)}")
@@ -185,18 +449,9 @@ class ChatService:
             sorted_history = sorted(valid_history, key=lambda x: x["timestamp"])
 
             for msg in sorted_history:
-                if not msg.get("content"):
-                    logger.warning("Skipping message without content")
-                    continue
-
-                if msg.get("sender") == "user":
-                    chat_history.append(HumanMessage(content=msg["content"]))
-                    logger.debug(f"Added human message: {msg['content'][:50]}...")
-                elif msg.get("sender") == "assistant":
-                    chat_history.append(AIMessage(content=msg["content"]))
-                    logger.debug(f"Added AI message: {msg['content'][:50]}...")
-                else:
-                    logger.warning(f"Unknown sender type: {msg.get('sender')}")
+                formatted = self.format_message(msg)
+                if formatted is not None:
+                    chat_history.append(formatted)
 
             logger.info(
                 f"Successfully formatted {len(chat_history)} messages from {len(history)} total"
@@ -208,7 +463,21 @@ class ChatService:
             logger.error(f"Raw history: {history}")
             raise
 
+    def format_message(self, msg: Dict) -> Optional[BaseMessage]:
+        """Turn one stored message into a LangChain message, or None to skip it"""
+        if not msg.get("content"):
+            logger.warning("Skipping message without content")
+            return None
+
+        if msg.get("sender") == "user":
+            logger.debug(f"Added human message: {msg['content'][:50]}...")
+            return HumanMessage(content=msg["content"])
+        if msg.get("sender") == "assistant":
+            logger.debug(f"Added AI message: {msg['content'][:50]}...")
+            return AIMessage(content=msg["content"])
+        logger.warning(f"Unknown sender type: {msg.get('sender')}")
+        return None
+
     async def close(self):
-        """Close the service and its clients"""
+        """Close the service"""
         logger.info("Closing ChatService")
-        await self.db_client.close()
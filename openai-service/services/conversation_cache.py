@@ -0,0 +1,161 @@
+from collections import OrderedDict
+from dataclasses import dataclass, field
+from typing import Callable, Dict, List, Optional
+from langchain_core.messages import BaseMessage
+
+# Rough per-message cost of the dicts, message object and bookkeeping
+MESSAGE_OVERHEAD_BYTES = 400
+
+
+def _message_size(msg: Dict) -> int:
+    # Content is held twice: in the stored dict and the LangChain message
+    return len(str(msg.get("content", "")).encode()) * 2 + MESSAGE_OVERHEAD_BYTES
+
+
+@dataclass
+class CachedConversation:
+    messages: List[Dict]
+    # LangChain message for each position; None where formatting skipped it
+    formatted: Dict[int, Optional[BaseMessage]] = field(default_factory=dict)
+    size: int = 0
+
+    @property
+    def next_position(self) -> Optional[int]:
+        return self.messages[-1]["position"] + 1 if self.messages else None
+
+
+class ConversationCache:
+    """Per-user history window, kept formatted and extended as turns complete.
+
+    Entries hold the newest `window` messages read from db-service along
+    with their formatted LangChain messages, so a warm turn only formats
+    what is new. db-service positions double as the staleness check: new
+    messages must start at the position after the cached ones, otherwise
+    something else wrote to the conversation and the entry is dropped.
+    Least recently used users are evicted past max_bytes.
+    """
+
+    def __init__(
+        self,
+        format_message: Callable[[Dict], Optional[BaseMessage]],
+        window: int = 50,
+        max_bytes: int = 50_000_000,
+    ):
+        self.format_message = format_message
+        self.window = window
+        self.max_bytes = max_bytes
+        self._entries: "OrderedDict[str, CachedConversation]" = OrderedDict()
+        self.bytes = 0
+        self.hits = 0
+        self.misses = 0
+        self.stale = 0
+        self.evictions = 0
+
+    def get(self, user_id: str) -> Optional[CachedConversation]:
+        entry = self._entries.get(user_id)
+        if entry is None:
+            self.misses += 1
+            return None
+        self._entries.move_to_end(user_id)
+        self.hits += 1
+        return entry
+
+    def put(self, user_id: str, messages: List[Dict]) -> Optional[CachedConversation]:
+        """Cache a freshly read window, newest messages last"""
+        self.invalidate(user_id)
+        if any("position" not in msg for msg in messages):
+            # Without positions there is no telling whether the cache is stale
+            return None
+        entry = CachedConversation(messages=[])
+        self._entries[user_id] = entry
+        self._append(entry, messages)
+        self._evict()
+        return self._entries.get(user_id)
+
+    def extend(self, user_id: str, messages: List[Dict]) -> Optional[CachedConversation]:
+        """Append messages stored after the cached ones.
+
+        Returns None, dropping the entry, if they don't follow on from it.
+        """
+        entry = self._entries.get(user_id)
+        if entry is None:
+            return None
+        if not messages:
+            return entry
+        expected = entry.next_position
+        if any("position" not in msg for msg in messages) or (
+            expected is not None and messages[0]["position"] != expected
+        ):
+            self.stale += 1
+            self.invalidate(user_id)
+            return None
+        self._append(entry, messages)
+        self._evict()
+        return self._entries.get(user_id)
+
+    def append_stored(self, user_id: str, message: Dict):
+        """Append a message just stored, which takes the next position.
+
+        If another write took that position first, the next extend()
+        finds the positions don't follow on and drops the entry.
+        """
+        entry = self._entries.get(user_id)
+        if entry is None or entry.next_position is None:
+            return
+        self._append(entry, [{**message, "position": entry.next_position}])
+        self._evict()
+
+    def formatted(
+        self, user_id: str, history: List[Dict]
+    ) -> Optional[List[BaseMessage]]:
+        """Formatted messages for part of the cached window, or None if it isn't cached"""
+        entry = self._entries.get(user_id)
+        if entry is None or any(
+            msg.get("position") not in entry.formatted for msg in history
+        ):
+            return None
+        formatted = [entry.formatted[msg["position"]] for msg in history]
+        return [message for message in formatted if message is not None]
+
+    def invalidate(self, user_id: str):
+        entry = self._entries.pop(user_id, None)
+        if entry is not None:
+            self.bytes -= entry.size
+
+    def _append(self, entry: CachedConversation, messages: List[Dict]):
+        for msg in messages:
+            entry.messages.append(msg)
+            entry.formatted[msg["position"]] = self.format_message(msg)
+            size = _message_size(msg)
+            entry.size += size
+            self.bytes += size
+
+        # Keep only the window the prompt could use
+        while len(entry.messages) > self.window:
+            oldest = entry.messages.pop(0)
+            entry.formatted.pop(oldest["position"], None)
+            size = _message_size(oldest)
+            entry.size -= size
+            self.bytes -= size
+
+    def _evict(self):
+        while self.bytes > self.max_bytes and self._entries:
+            _, entry = self._entries.popitem(last=False)
+            self.bytes -= entry.size
+            self.evictions += 1
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+    def stats(self) -> Dict[str, float]:
+        """Return size and hit/miss/stale counters"""
+        lookups = self.hits + self.misses
+        return {
+            "users": len(self._entries),
+            "bytes": self.bytes,
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_rate": self.hits / lookups if lookups else 0.0,
+            "stale": self.stale,
+            "evictions": self.evictions,
+        }
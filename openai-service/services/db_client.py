@@ -1,10 +1,16 @@
 import httpx
 from loguru import logger
-from typing import List, Optional
-from tenacity import retry, stop_after_attempt, wait_exponential
+from typing import List, Optional, Tuple
+from tenacity import retry, retry_if_exception_type, stop_after_attempt, wait_exponential
 from datetime import datetime
 
 from config.settings import get_settings
+from services.message_batcher import MessageBatcher
+
+# Failures before the request reached db-service. Writes that append messages
+# are only retried on these, since a timeout after db-service committed would
+# store the messages twice.
+CONNECT_ERRORS = (httpx.ConnectError, httpx.ConnectTimeout)
 
 
 class DBClient:
@@ -14,11 +20,21 @@ class DBClient:
         self.base_url = self.settings.DB_SERVICE_URL
         logger.debug(f"Using DB service URL: {self.base_url}")
         self.client = httpx.AsyncClient(timeout=30.0)
+        # Messages stored concurrently are written together through the bulk endpoint
+        self.batcher = MessageBatcher(
+            self._store_batch,
+            max_batch_size=self.settings.STORE_BATCH_MAX_SIZE,
+            max_delay=self.settings.STORE_BATCH_MAX_DELAY_MS / 1000,
+        )
 
     async def get_conversation_history(
-        self, user_id: str, limit: int = 50
+        self, user_id: str, limit: int = 50, after: Optional[int] = None
     ) -> List[dict]:
-        """Get conversation history from DB service"""
+        """Get conversation history from DB service.
+
+        With `after`, only messages past that position are returned, oldest
+        first, up to `limit` of them.
+        """
         logger.info(f"Getting conversation history for user {user_id}")
         logger.debug(f"History limit: {limit}")
 
@@ -26,7 +42,10 @@ class DBClient:
             url = f"{self.base_url}/conversations/{user_id}"
             logger.debug(f"Making GET request to: {url}")
 
-            response = await self.client.get(url, params={"limit": limit})
+            params = {"limit": limit}
+            if after is not None:
+                params["after"] = after
+            response = await self.client.get(url, params=params)
             response.raise_for_status()
 
             data = response.json()
@@ -42,9 +61,80 @@ class DBClient:
             logger.error(f"URL attempted: {self.base_url}/conversations/{user_id}")
             return []
 
+    @retry(
+        stop=stop_after_attempt(3),
+        wait=wait_exponential(multiplier=1, min=4, max=10),
+        retry=retry_if_exception_type(CONNECT_ERRORS),
+    )
+    async def add_turn_messages(
+        self,
+        user_id: str,
+        contents: List[str],
+        sender: str = "user",
+        message_type: str = "text",
+        timestamp: Optional[datetime] = None,
+        limit: int = 50,
+    ) -> List[dict]:
+        """Store the turn's messages and get the updated history in one request"""
+        logger.info(f"Storing {len(contents)} turn messages for user {user_id}")
+        timestamp = (timestamp or datetime.utcnow()).isoformat()
+        payload = {
+            "messages": [
+                {
+                    "content": content,
+                    "sender": sender,
+                    "message_type": message_type,
+                    "timestamp": timestamp,
+                }
+                for content in contents
+            ],
+            "limit": limit,
+        }
+
+        response = await self.client.post(
+            f"{self.base_url}/conversations/{user_id}/turn",
+            json=payload,
+            timeout=10.0,
+        )
+        response.raise_for_status()
+
+        messages = response.json().get("messages", [])
+        logger.info(f"Retrieved {len(messages)} messages for user {user_id}")
+        return messages
+
+    async def get_summary(self, user_id: str) -> Tuple[Optional[str], int]:
+        """Get the conversation summary and the first position it doesn't cover"""
+        try:
+            response = await self.client.get(
+                f"{self.base_url}/conversations/{user_id}/summary"
+            )
+            response.raise_for_status()
+            data = response.json()
+            return data.get("summary"), data.get("position", 0)
+
+        except Exception as e:
+            # Prompting with the full window is always a safe fallback
+            logger.error(f"Error getting conversation summary: {str(e)}")
+            return None, 0
+
     @retry(
         stop=stop_after_attempt(3), wait=wait_exponential(multiplier=1, min=4, max=10)
     )
+    async def store_summary(self, user_id: str, summary: str, position: int) -> bool:
+        """Store a summary of the messages before position, unless a newer one exists"""
+        response = await self.client.put(
+            f"{self.base_url}/conversations/{user_id}/summary",
+            json={"summary": summary, "position": position},
+            timeout=10.0,
+        )
+        response.raise_for_status()
+        return response.json().get("updated", False)
+
+    @retry(
+        stop=stop_after_attempt(3),
+        wait=wait_exponential(multiplier=1, min=4, max=10),
+        retry=retry_if_exception_type(CONNECT_ERRORS),
+    )
     async def _store_message_with_retry(
         self,
         url: str,
@@ -59,6 +149,31 @@ class DBClient:
         response.raise_for_status()
         return True
 
+    @retry(
+        stop=stop_after_attempt(3),
+        wait=wait_exponential(multiplier=1, min=4, max=10),
+        retry=retry_if_exception_type(CONNECT_ERRORS),
+    )
+    async def _store_messages_bulk_with_retry(self, payloads: List[dict]) -> bool:
+        """Internal method to store several messages in one request with retries"""
+        response = await self.client.post(
+            f"{self.base_url}/conversations/messages/bulk",
+            json={"messages": payloads},
+            timeout=10.0,
+        )
+        response.raise_for_status()
+        return True
+
+    async def _store_batch(self, payloads: List[dict]):
+        """Write a batch, using the plain endpoint when there is only one message"""
+        if len(payloads) == 1:
+            await self._store_message_with_retry(
+                f"{self.base_url}/conversations/messages", payloads[0]
+            )
+        else:
+            logger.debug(f"Storing batch of {len(payloads)} messages")
+            await self._store_messages_bulk_with_retry(payloads)
+
     async def store_message(
         self,
         user_id: str,
@@ -80,10 +195,10 @@ class DBClient:
                 "message_type": message_type,
                 "timestamp": (timestamp or datetime.utcnow()).isoformat(),
             }
-            logger.debug(f"Making POST request to: {url}")
+            logger.debug(f"Queueing POST request to: {url}")
             logger.debug(f"Request payload: {payload}")
 
-            success = await self._store_message_with_retry(url, payload)
+            success = await self.batcher.add(payload)
 
             logger.info(f"Successfully stored message for user {user_id}")
             return success
@@ -101,6 +216,7 @@ class DBClient:
         """Close the HTTP client"""
         logger.info("Closing DB client")
         try:
+            await self.batcher.close()
             await self.client.aclose()
         except Exception as e:
             logger.error(f"Error closing DB client: {str(e)}", exc_info=True)
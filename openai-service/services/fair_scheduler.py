@@ -0,0 +1,169 @@
+import asyncio
+from collections import OrderedDict, deque
+from contextlib import asynccontextmanager
+from dataclasses import dataclass, field
+from typing import AsyncIterator, Deque, Dict, List
+
+# Priority classes, most urgent first
+INTERACTIVE = 0
+BULK = 1
+PRIORITY_NAMES = ("interactive", "bulk")
+
+
+class SchedulerFull(Exception):
+    """The queue is at its depth limit; the call was rejected without waiting"""
+
+
+@dataclass
+class _Waiter:
+    cost: float
+    future: asyncio.Future
+
+
+@dataclass
+class _UserQueue:
+    waiters: Deque[_Waiter] = field(default_factory=deque)
+    deficit: float = 0.0
+    credited: bool = False
+
+
+class FairScheduler:
+    """Admit LLM calls by deficit round robin across users.
+
+    At most max_concurrency calls run at once; the rest wait in per-user
+    queues. Each round a user with waiting calls earns quantum tokens of
+    credit and is served while the credit covers the cost of their next
+    call, so a user sending many long calls gets the same share of tokens
+    as one sending a few short ones. Interactive calls are served before
+    bulk ones, except that every interactive_weight-th dispatch goes to
+    bulk work so it isn't starved. Calls beyond max_queue_depth, or beyond
+    max_user_queue_depth for their user, are rejected at once.
+    """
+
+    def __init__(
+        self,
+        max_concurrency: int = 8,
+        max_queue_depth: int = 200,
+        max_user_queue_depth: int = 20,
+        quantum: float = 2000.0,
+        interactive_weight: int = 4,
+    ):
+        self.max_concurrency = max_concurrency
+        self.max_queue_depth = max_queue_depth
+        self.max_user_queue_depth = max_user_queue_depth
+        self.quantum = quantum
+        self.interactive_weight = interactive_weight
+        # One round-robin order of users with waiting calls per priority
+        self._queues: List["OrderedDict[str, _UserQueue]"] = [
+            OrderedDict() for _ in PRIORITY_NAMES
+        ]
+        self._interactive_streak = 0
+        self.running = 0
+        self.queued = 0
+        self.dispatched = [0 for _ in PRIORITY_NAMES]
+        self.rejected = 0
+
+    @asynccontextmanager
+    async def slot(
+        self, user_id: str, cost: float, priority: int = INTERACTIVE
+    ) -> AsyncIterator[None]:
+        """Hold one of the concurrent call slots for the block"""
+        await self.acquire(user_id, cost, priority)
+        try:
+            yield
+        finally:
+            self.release()
+
+    async def acquire(self, user_id: str, cost: float, priority: int = INTERACTIVE):
+        """Wait for a call slot, or raise SchedulerFull if the queue is full"""
+        if self.running < self.max_concurrency and not self.queued:
+            self.running += 1
+            self.dispatched[priority] += 1
+            return
+
+        queues = self._queues[priority]
+        user_queue = queues.get(user_id)
+        user_depth = sum(
+            len(q[user_id].waiters) for q in self._queues if user_id in q
+        )
+        if (
+            self.queued >= self.max_queue_depth
+            or user_depth >= self.max_user_queue_depth
+        ):
+            self.rejected += 1
+            raise SchedulerFull(
+                f"LLM queue full ({self.queued} waiting, {user_depth} for this user)"
+            )
+
+        if user_queue is None:
+            user_queue = queues[user_id] = _UserQueue()
+        waiter = _Waiter(cost, asyncio.get_running_loop().create_future())
+        user_queue.waiters.append(waiter)
+        self.queued += 1
+        try:
+            await waiter.future
+        except asyncio.CancelledError:
+            if waiter.future.done() and not waiter.future.cancelled():
+                # Granted a slot just as the caller gave up
+                self.release()
+            else:
+                self._remove(queues, user_id, waiter)
+            raise
+
+    def release(self):
+        """Free a slot and hand it to the next waiting call"""
+        self.running -= 1
+        while self.running < self.max_concurrency and self.queued:
+            self.running += 1
+            self._next_waiter().future.set_result(None)
+
+    def _remove(self, queues: "OrderedDict[str, _UserQueue]", user_id: str, waiter):
+        user_queue = queues[user_id]
+        user_queue.waiters.remove(waiter)
+        self.queued -= 1
+        if not user_queue.waiters:
+            del queues[user_id]
+
+    def _next_waiter(self) -> _Waiter:
+        interactive, bulk = self._queues
+        if interactive and (
+            not bulk or self._interactive_streak < self.interactive_weight
+        ):
+            self._interactive_streak += 1
+            priority = INTERACTIVE
+        else:
+            self._interactive_streak = 0
+            priority = BULK
+        self.queued -= 1
+        self.dispatched[priority] += 1
+        return self._next_in_round(self._queues[priority])
+
+    def _next_in_round(self, queues: "OrderedDict[str, _UserQueue]") -> _Waiter:
+        """Deficit round robin: serve the user at the front while their credit lasts"""
+        while True:
+            user_id, user_queue = next(iter(queues.items()))
+            if not user_queue.credited:
+                user_queue.deficit += self.quantum
+                user_queue.credited = True
+            head = user_queue.waiters[0]
+            if user_queue.deficit >= head.cost:
+                user_queue.deficit -= head.cost
+                user_queue.waiters.popleft()
+                if not user_queue.waiters:
+                    # Idle users don't bank credit
+                    del queues[user_id]
+                return head
+            user_queue.credited = False
+            queues.move_to_end(user_id)
+
+    def stats(self) -> Dict[str, int]:
+        """Return running and queued calls and dispatch counters"""
+        stats = {
+            "running": self.running,
+            "queued": self.queued,
+            "queued_users": len(set().union(*self._queues)),
+            "rejected": self.rejected,
+        }
+        for priority, name in enumerate(PRIORITY_NAMES):
+            stats[f"dispatched_{name}"] = self.dispatched[priority]
+        return stats
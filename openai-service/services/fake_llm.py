@@ -0,0 +1,99 @@
+import asyncio
+import math
+import random
+import time
+import zlib
+from typing import Any, AsyncIterator, Iterator, List, Optional
+from langchain_core.language_models.chat_models import BaseChatModel
+from langchain_core.messages import AIMessage, AIMessageChunk, BaseMessage
+from langchain_core.outputs import ChatGeneration, ChatGenerationChunk, ChatResult
+
+WORDS = (
+    "la clase puede empezar con una actividad breve sobre fracciones y luego "
+    "pasar a ejercicios en grupos donde cada estudiante explica su razonamiento "
+    "al resto mientras el docente registra las dudas para la próxima sesión"
+).split()
+
+
+class FakeChatModel(BaseChatModel):
+    """Deterministic stand-in for ChatOpenAI used for offline load tests.
+
+    The time to the first token is drawn from a log-normal distribution
+    (median latency_ms, shape latency_sigma) and every following token
+    takes token_delay_ms. Replies are `tokens` words long. Both the reply
+    and its timing are seeded by `seed` and the prompt, so a run can be
+    repeated exactly.
+    """
+
+    latency_ms: float = 800.0
+    latency_sigma: float = 0.5
+    token_delay_ms: float = 20.0
+    tokens: int = 60
+    seed: int = 0
+
+    @property
+    def _llm_type(self) -> str:
+        return "fake"
+
+    def _plan(self, messages: List[BaseMessage]):
+        """Return the first-token delay and the reply's tokens for a prompt"""
+        prompt = "".join(str(message.content) for message in messages)
+        rng = random.Random(zlib.crc32(prompt.encode()) ^ self.seed)
+        first_token = rng.lognormvariate(math.log(self.latency_ms), self.latency_sigma)
+        words = [rng.choice(WORDS) for _ in range(self.tokens)]
+        tokens = [word if i == 0 else f" {word}" for i, word in enumerate(words)]
+        return first_token / 1000, tokens
+
+    def _result(self, tokens: List[str]) -> ChatResult:
+        message = AIMessage(content="".join(tokens))
+        return ChatResult(generations=[ChatGeneration(message=message)])
+
+    def _generate(
+        self,
+        messages: List[BaseMessage],
+        stop: Optional[List[str]] = None,
+        run_manager: Optional[Any] = None,
+        **kwargs: Any,
+    ) -> ChatResult:
+        first_token, tokens = self._plan(messages)
+        time.sleep(first_token + len(tokens) * self.token_delay_ms / 1000)
+        return self._result(tokens)
+
+    async def _agenerate(
+        self,
+        messages: List[BaseMessage],
+        stop: Optional[List[str]] = None,
+        run_manager: Optional[Any] = None,
+        **kwargs: Any,
+    ) -> ChatResult:
+        first_token, tokens = self._plan(messages)
+        await asyncio.sleep(first_token + len(tokens) * self.token_delay_ms / 1000)
+        return self._result(tokens)
+
+    def _stream(
+        self,
+        messages: List[BaseMessage],
+        stop: Optional[List[str]] = None,
+        run_manager: Optional[Any] = None,
+        **kwargs: Any,
+    ) -> Iterator[ChatGenerationChunk]:
+        first_token, tokens = self._plan(messages)
+        time.sleep(first_token)
+        for i, token in enumerate(tokens):
+            if i:
+                time.sleep(self.token_delay_ms / 1000)
+            yield ChatGenerationChunk(message=AIMessageChunk(content=token))
+
+    async def _astream(
+        self,
+        messages: List[BaseMessage],
+        stop: Optional[List[str]] = None,
+        run_manager: Optional[Any] = None,
+        **kwargs: Any,
+    ) -> AsyncIterator[ChatGenerationChunk]:
+        first_token, tokens = self._plan(messages)
+        await asyncio.sleep(first_token)
+        for i, token in enumerate(tokens):
+            if i:
+                await asyncio.sleep(self.token_delay_ms / 1000)
+            yield ChatGenerationChunk(message=AIMessageChunk(content=token))
@@ -0,0 +1,123 @@
+import asyncio
+import time
+from dataclasses import dataclass
+from typing import Callable, Dict
+
+
+class _Bucket:
+    """Token bucket refilled continuously up to a per-minute quota.
+
+    The level may go negative: a caller takes what it needs at once and
+    waits until the bucket has refilled back to zero.
+    """
+
+    def __init__(self, per_minute: float, now: float):
+        self.capacity = per_minute
+        self.rate = per_minute / 60.0
+        self.level = per_minute
+        self.updated = now
+
+    def refill(self, now: float):
+        elapsed = max(0.0, now - self.updated)
+        self.level = min(self.capacity, self.level + elapsed * self.rate)
+        self.updated = now
+
+    def wait_seconds(self) -> float:
+        return -self.level / self.rate if self.level < 0 else 0.0
+
+
+@dataclass
+class Reservation:
+    tokens: int
+    wait: float
+
+
+class TokenBucketLimiter:
+    """Keep LLM calls within the requests- and tokens-per-minute quotas.
+
+    acquire() charges one request and the call's estimated tokens up front
+    and then sleeps until both buckets are back above zero. Charging is
+    synchronous, so no lock is held while anyone waits, and callers are
+    admitted in the order they arrived. A caller cancelled while waiting
+    gets its charge back; reconcile() replaces the estimate with the usage
+    the response reports.
+    """
+
+    def __init__(
+        self,
+        requests_per_minute: float,
+        tokens_per_minute: float,
+        clock: Callable[[], float] = time.monotonic,
+    ):
+        self._clock = clock
+        now = clock()
+        self.requests = _Bucket(requests_per_minute, now)
+        self.tokens = _Bucket(tokens_per_minute, now)
+        self.waiting = 0
+        self.acquired = 0
+        self.cancelled = 0
+        self.wait_seconds = 0.0
+        self.estimated_tokens = 0
+        self.reconciled_tokens = 0
+
+    def reserve(self, tokens: int) -> Reservation:
+        """Charge a call to the buckets and return how long it must wait"""
+        now = self._clock()
+        self.requests.refill(now)
+        self.tokens.refill(now)
+        self.requests.level -= 1
+        self.tokens.level -= tokens
+        self.estimated_tokens += tokens
+        wait = max(self.requests.wait_seconds(), self.tokens.wait_seconds())
+        return Reservation(tokens=tokens, wait=wait)
+
+    def release(self, reservation: Reservation):
+        """Give back the charge of a call that was never made"""
+        now = self._clock()
+        self.requests.refill(now)
+        self.tokens.refill(now)
+        self.requests.level = min(self.requests.capacity, self.requests.level + 1)
+        self.tokens.level = min(
+            self.tokens.capacity, self.tokens.level + reservation.tokens
+        )
+
+    async def acquire(self, tokens: int) -> Reservation:
+        """Wait until a call of about this many tokens fits in the quotas"""
+        reservation = self.reserve(tokens)
+        if reservation.wait > 0:
+            self.waiting += 1
+            try:
+                await asyncio.sleep(reservation.wait)
+            except asyncio.CancelledError:
+                self.cancelled += 1
+                self.release(reservation)
+                raise
+            finally:
+                self.waiting -= 1
+        self.acquired += 1
+        self.wait_seconds += reservation.wait
+        return reservation
+
+    def reconcile(self, reservation: Reservation, actual_tokens: int):
+        """Correct the token charge once the call's real usage is known"""
+        difference = actual_tokens - reservation.tokens
+        self.tokens.refill(self._clock())
+        self.tokens.level = min(self.tokens.capacity, self.tokens.level - difference)
+        reservation.tokens = actual_tokens
+        self.reconciled_tokens += difference
+
+    def stats(self) -> Dict[str, float]:
+        """Return bucket levels, waiters and wait totals"""
+        now = self._clock()
+        self.requests.refill(now)
+        self.tokens.refill(now)
+        return {
+            "waiting": self.waiting,
+            "acquired": self.acquired,
+            "cancelled": self.cancelled,
+            "wait_seconds_total": self.wait_seconds,
+            "requests_available": self.requests.level,
+            "tokens_available": self.tokens.level,
+            "estimated_tokens": self.estimated_tokens,
+            "reconciled_tokens": self.reconciled_tokens,
+        }
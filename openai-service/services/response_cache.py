@@ -0,0 +1,108 @@
+import hashlib
+import json
+from collections import OrderedDict
+from dataclasses import dataclass
+from time import monotonic
+from typing import Callable, Dict, List, Optional
+from langchain_core.messages import BaseMessage
+
+# Rough per-entry cost of the key, entry object and dict slot
+ENTRY_OVERHEAD_BYTES = 200
+
+
+@dataclass
+class CachedResponse:
+    response: str
+    size: int
+    expires_at: float
+
+
+def prompt_key(messages: List[BaseMessage], model: str, temperature: float) -> str:
+    """Hash of everything that determines the reply to a formatted prompt.
+
+    The messages include the system prompt, so editing it changes every key.
+    """
+    state = {
+        "model": model,
+        # Temperatures this close behave the same for caching purposes
+        "temperature": round(temperature, 1),
+        "messages": [(message.type, message.content) for message in messages],
+    }
+    payload = json.dumps(state, ensure_ascii=False, sort_keys=True)
+    return hashlib.sha256(payload.encode()).hexdigest()
+
+
+class ResponseCache:
+    """LRU cache of LLM replies keyed by prompt_key, bounded in entries and bytes.
+
+    Entries expire after ttl_seconds so edits to prompts or models that
+    don't change the key (e.g. a model alias moving) age out.
+    """
+
+    def __init__(
+        self,
+        max_entries: int = 5000,
+        max_bytes: int = 20_000_000,
+        ttl_seconds: float = 3600.0,
+        clock: Callable[[], float] = monotonic,
+    ):
+        self.max_entries = max_entries
+        self.max_bytes = max_bytes
+        self.ttl_seconds = ttl_seconds
+        self._clock = clock
+        self._entries: "OrderedDict[str, CachedResponse]" = OrderedDict()
+        self.bytes = 0
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.expirations = 0
+
+    def get(self, key: str) -> Optional[str]:
+        entry = self._entries.get(key)
+        if entry is None:
+            self.misses += 1
+            return None
+        if entry.expires_at <= self._clock():
+            self._remove(key)
+            self.expirations += 1
+            self.misses += 1
+            return None
+        self._entries.move_to_end(key)
+        self.hits += 1
+        return entry.response
+
+    def put(self, key: str, response: str):
+        size = len(key) + len(response.encode()) + ENTRY_OVERHEAD_BYTES
+        if not response or size > self.max_bytes:
+            return
+        if key in self._entries:
+            self._remove(key)
+        self._entries[key] = CachedResponse(
+            response=response, size=size, expires_at=self._clock() + self.ttl_seconds
+        )
+        self.bytes += size
+        while len(self._entries) > self.max_entries or self.bytes > self.max_bytes:
+            oldest = next(iter(self._entries))
+            self._remove(oldest)
+            self.evictions += 1
+
+    def _remove(self, key: str):
+        entry = self._entries.pop(key)
+        self.bytes -= entry.size
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+    def stats(self) -> Dict[str, float]:
+        """Return size and hit/miss counters"""
+        lookups = self.hits + self.misses
+        return {
+            "entries": len(self._entries),
+            "bytes": self.bytes,
+            "max_bytes": self.max_bytes,
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_rate": self.hits / lookups if lookups else 0.0,
+            "evictions": self.evictions,
+            "expirations": self.expirations,
+        }
@@ -0,0 +1,170 @@
+import re
+import time
+import unicodedata
+import zlib
+from dataclasses import dataclass
+from typing import Callable, Dict, Optional, Sequence, Tuple
+import numpy as np
+
+# Maps a message to a vector; vectors are L2-normalized by the cache
+EmbeddingFunction = Callable[[str], np.ndarray]
+
+
+def normalize_text(text: str) -> str:
+    """Lowercase, drop accents and punctuation, collapse whitespace"""
+    text = unicodedata.normalize("NFKD", text.lower())
+    text = "".join(ch for ch in text if not unicodedata.combining(ch))
+    text = re.sub(r"[^\w\s]", " ", text)
+    return " ".join(text.split())
+
+
+def number_signature(text: str) -> int:
+    """Hash of the tokens with digits, which must match exactly ("2do" vs "3ro")"""
+    words = normalize_text(text).split()
+    numbers = sorted({word for word in words if re.search(r"\d", word)})
+    return zlib.crc32(" ".join(numbers).encode())
+
+
+@dataclass
+class SemanticQuery:
+    vector: np.ndarray
+    signature: int
+
+
+class HashedNgramEmbedder:
+    """Local embedding: character n-grams hashed into a fixed-size vector.
+
+    Needs no model or network. Variants in accents, punctuation and filler
+    words ("necesito una sesion de matematica para 2do") land close to the
+    original; rewordings with other words ("sesión de mate de segundo") do
+    not, which needs a real embedding model passed to SemanticCache.
+    """
+
+    def __init__(self, dim: int = 1024, ngram_sizes: Sequence[int] = (3, 4)):
+        self.dim = dim
+        self.ngram_sizes = tuple(ngram_sizes)
+
+    def __call__(self, text: str) -> np.ndarray:
+        vector = np.zeros(self.dim, dtype=np.float32)
+        for word in normalize_text(text).split():
+            padded = f" {word} "
+            for n in self.ngram_sizes:
+                for i in range(max(1, len(padded) - n + 1)):
+                    digest = zlib.crc32(padded[i : i + n].encode())
+                    # The top bit picks a sign so collisions tend to cancel out
+                    sign = 1.0 if digest & 0x80000000 else -1.0
+                    vector[digest % self.dim] += sign
+        return vector
+
+
+class SemanticCache:
+    """Reply cache matched by cosine similarity of the user's message.
+
+    Embeddings live in one preallocated matrix, so a lookup is a single
+    matrix-vector product. Messages only match entries with the same
+    numbers in them, since near-identical text with another grade or count
+    needs another reply. Entries expire after ttl_seconds; when full, an
+    expired or else the least recently used entry is replaced.
+    """
+
+    def __init__(
+        self,
+        embed: Optional[EmbeddingFunction] = None,
+        threshold: float = 0.85,
+        max_entries: int = 1000,
+        ttl_seconds: float = 3600.0,
+        clock: Callable[[], float] = time.monotonic,
+    ):
+        self.embed_function = embed or HashedNgramEmbedder()
+        self.threshold = threshold
+        self.max_entries = max_entries
+        self.ttl_seconds = ttl_seconds
+        self._clock = clock
+        # Allocated on the first add, once the embedding size is known
+        self._vectors: Optional[np.ndarray] = None
+        self._signatures = np.zeros(max_entries, dtype=np.int64)
+        self._expires_at = np.zeros(max_entries)
+        self._last_used = np.zeros(max_entries)
+        self._responses: list = []
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.lookup_seconds = 0.0
+
+    def embed(self, text: str) -> Optional[SemanticQuery]:
+        """Normalized embedding of a message, or None if it has no content"""
+        vector = np.asarray(self.embed_function(text), dtype=np.float32)
+        norm = float(np.linalg.norm(vector))
+        if norm == 0.0:
+            return None
+        return SemanticQuery(vector / norm, number_signature(text))
+
+    def lookup(self, text: str) -> Tuple[Optional[SemanticQuery], Optional[str]]:
+        """Return the message's query and the closest cached reply above the threshold"""
+        start = time.perf_counter()
+        try:
+            query = self.embed(text)
+            if query is None or not self._responses:
+                self.misses += 1
+                return query, None
+
+            count = len(self._responses)
+            now = self._clock()
+            similarities = self._vectors[:count] @ query.vector
+            unusable = (self._expires_at[:count] <= now) | (
+                self._signatures[:count] != query.signature
+            )
+            similarities[unusable] = -1.0
+            best = int(np.argmax(similarities))
+            if similarities[best] < self.threshold:
+                self.misses += 1
+                return query, None
+
+            self._last_used[best] = now
+            self.hits += 1
+            return query, self._responses[best]
+        finally:
+            self.lookup_seconds += time.perf_counter() - start
+
+    def add(self, query: Optional[SemanticQuery], response: str):
+        """Cache a reply under the query returned by lookup"""
+        if query is None or not response:
+            return
+        now = self._clock()
+        if self._vectors is None:
+            self._vectors = np.zeros(
+                (self.max_entries, query.vector.shape[0]), dtype=np.float32
+            )
+
+        count = len(self._responses)
+        if count < self.max_entries:
+            slot = count
+            self._responses.append(response)
+        else:
+            expired = np.flatnonzero(self._expires_at <= now)
+            if expired.size:
+                slot = int(expired[0])
+            else:
+                slot = int(np.argmin(self._last_used))
+                self.evictions += 1
+            self._responses[slot] = response
+
+        self._vectors[slot] = query.vector
+        self._signatures[slot] = query.signature
+        self._expires_at[slot] = now + self.ttl_seconds
+        self._last_used[slot] = now
+
+    def __len__(self) -> int:
+        return len(self._responses)
+
+    def stats(self) -> Dict[str, float]:
+        """Return size, hit/miss counters and mean lookup time"""
+        lookups = self.hits + self.misses
+        return {
+            "entries": len(self._responses),
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_rate": self.hits / lookups if lookups else 0.0,
+            "evictions": self.evictions,
+            "lookup_ms_avg": self.lookup_seconds * 1000 / lookups if lookups else 0.0,
+        }
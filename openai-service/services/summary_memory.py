@@ -0,0 +1,109 @@
+import asyncio
+from typing import Dict, List, Optional, Set
+from loguru import logger
+
+
+class SummaryMemory:
+    """Keep prompts to a rolling summary plus the most recent messages.
+
+    db-service stores one summary per user with the position of the first
+    message it doesn't cover. Prompts use that summary and the messages
+    from that position on. Once fold_messages messages have piled up
+    beyond the newest recent_messages, they are folded into the summary
+    in the background, so prompts stay between recent_messages and
+    recent_messages + fold_messages long however long the conversation
+    gets. Messages older than the history window that the summary doesn't
+    cover yet (e.g. when summary mode is turned on for a long conversation)
+    are read back and folded first, so the summary never skips any.
+    """
+
+    def __init__(
+        self,
+        db_client,
+        chat_service,
+        recent_messages: int = 10,
+        fold_messages: int = 10,
+    ):
+        self.db_client = db_client
+        self.chat_service = chat_service
+        self.recent_messages = recent_messages
+        self.fold_messages = fold_messages
+        self._folding: Set[str] = set()
+        self._tasks: Set[asyncio.Task] = set()
+        self.folds = 0
+        self.gap_folds = 0
+        self.fold_failures = 0
+
+    @staticmethod
+    def unsummarized(history: List[Dict], position: int) -> List[Dict]:
+        """Messages of the history window the summary doesn't cover yet"""
+        if any("position" not in msg for msg in history):
+            # Without positions there is no telling what was summarized
+            return history
+        return [msg for msg in history if msg["position"] >= position]
+
+    def maybe_fold(
+        self, user_id: str, summary: Optional[str], position: int, history: List[Dict]
+    ):
+        """Start folding older messages into the summary if enough have piled up.
+
+        history holds the unsummarized part of the window, and position is
+        the first message the summary doesn't cover.
+        """
+        older = history[: max(0, len(history) - self.recent_messages)]
+        if len(older) < self.fold_messages or user_id in self._folding:
+            return
+        if any("position" not in msg for msg in older):
+            return
+
+        self._folding.add(user_id)
+        task = asyncio.create_task(self._fold(user_id, summary, position, older))
+        self._tasks.add(task)
+        task.add_done_callback(self._tasks.discard)
+
+    async def _fold(
+        self, user_id: str, summary: Optional[str], position: int, older: List[Dict]
+    ):
+        try:
+            if older[0]["position"] > position:
+                # The window starts past the summary's end, so the messages in
+                # between come first; a gap is folded a chunk per turn
+                self.gap_folds += 1
+                older = await self.db_client.get_conversation_history(
+                    user_id, len(older), after=position - 1
+                )
+                if not older or older[0].get("position") != position:
+                    logger.warning(
+                        f"Could not read messages from {position} for user {user_id}"
+                    )
+                    self.fold_failures += 1
+                    return
+
+            new_summary = await self.chat_service.summarize(summary, older, user_id)
+            await self.db_client.store_summary(
+                user_id, new_summary, older[-1]["position"] + 1
+            )
+            self.folds += 1
+            logger.info(
+                f"Folded {len(older)} messages into the summary for user {user_id}"
+            )
+        except Exception as e:
+            # The messages stay in the prompt and are folded on a later turn
+            self.fold_failures += 1
+            logger.error(f"Error summarizing conversation for {user_id}: {str(e)}")
+        finally:
+            self._folding.discard(user_id)
+
+    async def close(self):
+        """Let folds in progress finish"""
+        if self._tasks:
+            await asyncio.gather(*self._tasks, return_exceptions=True)
+
+    def stats(self) -> Dict[str, int]:
+        """Return fold counters"""
+        return {
+            "folding": len(self._folding),
+            "folds": self.folds,
+            "gap_folds": self.gap_folds,
+            "fold_failures": self.fold_failures,
+        }
@@ -0,0 +1,69 @@
+import math
+from functools import lru_cache
+from typing import Dict, Optional
+from loguru import logger
+import tiktoken
+
+# Context window of each model family, matched by the longest prefix
+MODEL_CONTEXT_TOKENS: Dict[str, int] = {
+    "gpt-4": 8192,
+    "gpt-4-32k": 32768,
+    "gpt-4-turbo": 128000,
+    "gpt-4-1106": 128000,
+    "gpt-4-0125": 128000,
+    "gpt-4o": 128000,
+    "gpt-3.5-turbo": 16385,
+}
+DEFAULT_CONTEXT_TOKENS = 8192
+
+# Chat formatting adds a few tokens around every message and primes the reply
+TOKENS_PER_MESSAGE = 3
+REPLY_PRIMING_TOKENS = 3
+
+# Used when no encoding can be loaded: Spanish text averages more than 3
+# characters per token, so this overestimates rather than overflowing
+FALLBACK_CHARS_PER_TOKEN = 3
+
+
+def context_tokens_for(model: str, override: Optional[int] = None) -> int:
+    """Return the model's context window, or the configured override"""
+    if override:
+        return override
+    matches = [prefix for prefix in MODEL_CONTEXT_TOKENS if model.startswith(prefix)]
+    if not matches:
+        logger.warning(f"Unknown context window for {model}, using {DEFAULT_CONTEXT_TOKENS}")
+        return DEFAULT_CONTEXT_TOKENS
+    return MODEL_CONTEXT_TOKENS[max(matches, key=len)]
+
+
+class TokenCounter:
+    """Count chat message tokens with the model's tokenizer.
+
+    Counts are cached by text, so history messages are only encoded the
+    first time they are seen. If the encoding can't be loaded (tiktoken
+    downloads it on first use), a conservative character estimate is used.
+    """
+
+    def __init__(self, model: str, cache_size: int = 10000):
+        self.model = model
+        try:
+            try:
+                self.encoding = tiktoken.encoding_for_model(model)
+            except KeyError:
+                self.encoding = tiktoken.get_encoding("cl100k_base")
+        except Exception as e:
+            logger.warning(
+                f"Could not load the tokenizer for {model}, estimating tokens: {str(e)}"
+            )
+            self.encoding = None
+        self.count = lru_cache(maxsize=cache_size)(self._count)
+
+    def _count(self, text: str) -> int:
+        """Tokens in a text, without message overhead"""
+        if self.encoding is None:
+            return math.ceil(len(text) / FALLBACK_CHARS_PER_TOKEN)
+        return len(self.encoding.encode(text, disallowed_special=()))
+
+    def count_message(self, text: str) -> int:
+        """Tokens a message with this content takes in the prompt"""
+        return self.count(text) + TOKENS_PER_MESSAGE
@@ -159,6 +159,24 @@ DIRECTRICES FINALES:
 4. Mantén un enfoque amigable pero profesional para generar confianza y eficacia en el usuario.
 """
 
-TEMPLATES = {"system": SYSTEM_PROMPT}
+SUMMARY_PROMPT = """
+Resume la conversación entre un docente y TutorIA para que TutorIA pueda continuarla sin ver los mensajes originales.
 
-__all__ = ["SYSTEM_PROMPT", "TEMPLATES"]
+Conserva siempre:
+- Área curricular, grado, sección y cualquier dato del contexto de los estudiantes.
+- Competencias, capacidades, desempeños y propósito de aprendizaje acordados.
+- Decisiones tomadas, preferencias del docente y el paso de la sesión en el que se encuentran.
+- Pendientes o preguntas que quedaron abiertas.
+
+Integra el resumen anterior (si existe) con los mensajes nuevos. Escribe en español, en viñetas breves, sin saludos ni relleno, en no más de 200 palabras.
+"""
+
+SUMMARY_CONTEXT_PROMPT = "Resumen de la conversación anterior con este docente:\n{summary}"
+
+TEMPLATES = {
+    "system": SYSTEM_PROMPT,
+    "summary": SUMMARY_PROMPT,
+    "summary_context": SUMMARY_CONTEXT_PROMPT,
+}
+
+__all__ = ["SYSTEM_PROMPT", "SUMMARY_PROMPT", "SUMMARY_CONTEXT_PROMPT", "TEMPLATES"]
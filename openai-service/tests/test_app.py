@@ -1,7 +1,13 @@
+import asyncio
+import json
+import httpx
 import pytest
+from fastapi import HTTPException
 from fastapi.testclient import TestClient
 from unittest.mock import patch, AsyncMock
 from app import app
+from langchain_core.messages import AIMessage
+from services.fair_scheduler import BULK, INTERACTIVE, FairScheduler
 
 
 @pytest.fixture
@@ -57,3 +63,253 @@ async def test_get_conversation():
             response = client.get("/conversations/test_user")
             assert response.status_code == 200
             assert "messages" in response.json()
+
+
+def test_chat_stream_endpoint(test_client):
+    """Test streaming chat endpoint emits deltas and the full response"""
+
+    async def fake_stream(content, user_id, history, summary=None, use_cache=True, formatted_history=None, priority=INTERACTIVE):
+        for delta in ["Hola", " profe"]:
+            yield delta
+
+    with patch.object(
+        app.db_client, "get_conversation_history", AsyncMock(return_value=[])
+    ), patch.object(app.chat_service, "stream_message", fake_stream):
+        response = test_client.post(
+            "/chat/stream", json={"content": "test message", "user_id": "test_user"}
+        )
+
+    assert response.status_code == 200
+    events = [json.loads(line) for line in response.text.splitlines()]
+    assert events == [
+        {"type": "delta", "content": "Hola"},
+        {"type": "delta", "content": " profe"},
+        {"type": "done", "response": "Hola profe"},
+    ]
+
+
+def test_chat_stream_endpoint_error(test_client):
+    """Test streaming chat endpoint reports errors in the stream"""
+
+    async def failing_stream(content, user_id, history, summary=None, use_cache=True, formatted_history=None, priority=INTERACTIVE):
+        yield "Hola"
+        raise Exception("LLM Error")
+
+    with patch.object(
+        app.db_client, "get_conversation_history", AsyncMock(return_value=[])
+    ), patch.object(app.chat_service, "stream_message", failing_stream):
+        response = test_client.post(
+            "/chat/stream", json={"content": "test message", "user_id": "test_user"}
+        )
+
+    events = [json.loads(line) for line in response.text.splitlines()]
+    assert events[-1] == {"type": "error", "detail": "LLM Error"}
+
+
+def test_turn_endpoint(test_client):
+    """Test a turn stores messages, generates and stores the reply"""
+    history = [
+        {"content": "Hola", "sender": "user", "timestamp": "2024-01-01T00:00:00"},
+        {"content": "¡Hola!", "sender": "assistant", "timestamp": "2024-01-01T00:00:01"},
+        {"content": "sesión de mate", "sender": "user", "timestamp": "2024-01-01T00:00:02"},
+        {"content": "para 2do", "sender": "user", "timestamp": "2024-01-01T00:00:02"},
+    ]
+    add_turn = AsyncMock(return_value=history)
+    store = AsyncMock(return_value=True)
+    process = AsyncMock(return_value="Test response")
+
+    with patch.object(app.db_client, "add_turn_messages", add_turn), patch.object(
+        app.db_client, "store_message", store
+    ), patch.object(app.chat_service, "process_message", process):
+        response = test_client.post(
+            "/turn",
+            json={"user_id": "test_user", "messages": ["sesión de mate", "para 2do"]},
+        )
+
+    assert response.status_code == 200
+    assert response.json()["response"] == "Test response"
+    assert add_turn.call_args.args[:2] == ("test_user", ["sesión de mate", "para 2do"])
+    content, user_id, prior, summary, use_cache = process.call_args.args
+    assert content == "sesión de mate\npara 2do"
+    assert prior == history[:2]
+    assert summary is None  # Summary memory is off by default
+    assert use_cache is True
+    assert process.call_args.kwargs["priority"] == INTERACTIVE
+    assert store.call_args.args[:3] == ("test_user", "Test response", "assistant")
+
+
+def test_turn_endpoint_warm_conversation_cache(test_client):
+    """Test a cached user's turn only reads back its own messages"""
+    history = [
+        {"content": "Hola", "sender": "user", "timestamp": "2024-01-01T00:00:00", "position": 0},
+        {"content": "¡Hola!", "sender": "assistant", "timestamp": "2024-01-01T00:00:01", "position": 1},
+    ]
+    new_turn = [
+        {"content": "sesión de mate", "sender": "user", "timestamp": "2024-01-01T00:01:00", "position": 2}
+    ]
+    add_turn = AsyncMock(return_value=new_turn)
+    get_history = AsyncMock(return_value=[])
+    process = AsyncMock(return_value="Test response")
+    app.conversation_cache.put("cached_user", history)
+
+    with patch.object(app.db_client, "add_turn_messages", add_turn), patch.object(
+        app.db_client, "get_conversation_history", get_history
+    ), patch.object(
+        app.db_client, "store_message", AsyncMock(return_value=True)
+    ), patch.object(app.chat_service, "process_message", process):
+        response = test_client.post(
+            "/turn", json={"user_id": "cached_user", "messages": ["sesión de mate"]}
+        )
+        assert response.status_code == 200
+        assert add_turn.call_args.kwargs["limit"] == 1
+        get_history.assert_not_awaited()
+        assert process.call_args.args[2] == history
+        assert [m.content for m in process.call_args.kwargs["formatted_history"]] == [
+            "Hola",
+            "¡Hola!",
+        ]
+        # The reply was appended, so the next turn must start at position 4
+        assert app.conversation_cache.get("cached_user").next_position == 4
+
+        # Another writer took position 4: the window is read again
+        add_turn.return_value = [dict(new_turn[0], position=5)]
+        get_history.return_value = history
+        response = test_client.post(
+            "/turn", json={"user_id": "cached_user", "messages": ["sesión de mate"]}
+        )
+        assert response.status_code == 200
+        get_history.assert_awaited_once()
+    app.conversation_cache.invalidate("cached_user")
+
+
+def test_metrics_endpoint(test_client):
+    """Test stage timings recorded by a turn are exposed for Prometheus"""
+    with patch.object(
+        app.db_client, "add_turn_messages", AsyncMock(return_value=[])
+    ), patch.object(app.db_client, "store_message", AsyncMock(return_value=True)), patch.object(
+        app.chat_service, "process_message", AsyncMock(return_value="Test response")
+    ):
+        test_client.post("/turn", json={"user_id": "test_user", "messages": ["hola"]})
+
+    response = test_client.get("/metrics")
+
+    assert response.status_code == 200
+    assert response.headers["content-type"].startswith("text/plain")
+    assert 'openai_stage_duration_seconds_count{stage="store_turn"}' in response.text
+    assert 'openai_stage_duration_seconds_count{stage="store_reply"}' in response.text
+    assert "openai_store_batcher_pending" in response.text
+
+
+def test_turn_endpoint_db_error(test_client):
+    """Test a turn fails when its messages can't be stored"""
+    with patch.object(
+        app.db_client, "add_turn_messages", AsyncMock(side_effect=Exception("DB Error"))
+    ):
+        response = test_client.post(
+            "/turn", json={"user_id": "test_user", "messages": ["hola"]}
+        )
+    assert response.status_code == 500
+
+
+def test_turn_endpoint_overloaded(test_client):
+    """Test a rejected LLM call reaches the caller as a 503"""
+    rejected = AsyncMock(
+        side_effect=HTTPException(status_code=503, detail="Too many requests queued")
+    )
+    with patch.object(
+        app.db_client, "add_turn_messages", AsyncMock(return_value=[])
+    ), patch.object(app.chat_service, "process_message", rejected):
+        response = test_client.post(
+            "/turn", json={"user_id": "test_user", "messages": ["hola"]}
+        )
+    assert response.status_code == 503
+
+
+def test_turn_stream_endpoint(test_client):
+    """Test a streamed turn stores the full reply once generated"""
+
+    async def fake_stream(content, user_id, history, summary=None, use_cache=True, formatted_history=None, priority=INTERACTIVE):
+        for delta in ["Hola", " profe"]:
+            yield delta
+
+    store = AsyncMock(return_value=True)
+    with patch.object(
+        app.db_client, "add_turn_messages", AsyncMock(return_value=[])
+    ), patch.object(app.db_client, "store_message", store), patch.object(
+        app.chat_service, "stream_message", fake_stream
+    ):
+        response = test_client.post(
+            "/turn/stream", json={"user_id": "test_user", "messages": ["hola"]}
+        )
+
+    events = [json.loads(line) for line in response.text.splitlines()]
+    assert events[-1] == {"type": "done", "response": "Hola profe"}
+    assert store.call_args.args[:3] == ("test_user", "Hola profe", "assistant")
+
+
+@pytest.mark.asyncio
+async def test_bulk_requests_wait_behind_interactive_ones():
+    """Test that requests marked bulk are scheduled after interactive ones"""
+    order = []
+    release = asyncio.Event()
+
+    async def ainvoke(messages):
+        content = messages[-1].content
+        order.append(content)
+        if content == "primero":
+            await release.wait()
+        return AIMessage(content=f"Respuesta a {content}")
+
+    scheduler = FairScheduler(max_concurrency=1)
+    llm = AsyncMock()
+    llm.ainvoke = ainvoke
+
+    async def wait_until(condition):
+        for _ in range(200):
+            if condition():
+                return
+            await asyncio.sleep(0.01)
+        raise AssertionError("condition not reached")
+
+    def chat(client, user_id, content, priority):
+        return asyncio.create_task(
+            client.post(
+                "/chat",
+                json={
+                    "user_id": user_id,
+                    "content": content,
+                    "use_cache": False,
+                    "priority": priority,
+                },
+            )
+        )
+
+    with patch.object(app.chat_service, "scheduler", scheduler), patch.object(
+        app.chat_service, "llm", llm
+    ), patch.object(
+        app.db_client, "get_conversation_history", AsyncMock(return_value=[])
+    ):
+        transport = httpx.ASGITransport(app=app)
+        async with httpx.AsyncClient(transport=transport, base_url="http://test") as client:
+            holder = chat(client, "u1", "primero", "interactive")
+            await wait_until(lambda: order == ["primero"])
+            bulk = chat(client, "u2", "unidad completa", "bulk")
+            await wait_until(lambda: scheduler.queued == 1)
+            interactive = chat(client, "u3", "pregunta corta", "interactive")
+            await wait_until(lambda: scheduler.queued == 2)
+
+            release.set()
+            responses = await asyncio.gather(holder, bulk, interactive)
+
+    assert [response.status_code for response in responses] == [200, 200, 200]
+    assert order == ["primero", "pregunta corta", "unidad completa"]
+    assert scheduler.dispatched[INTERACTIVE] == 2
+    assert scheduler.dispatched[BULK] == 1
+
+
+def test_priority_must_be_known(test_client):
+    """Test that only the scheduler's priority classes are accepted"""
+    response = test_client.post(
+        "/chat", json={"user_id": "u1", "content": "Hola", "priority": "urgent"}
+    )
+    assert response.status_code == 422
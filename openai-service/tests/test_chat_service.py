@@ -4,6 +4,9 @@ from datetime import datetime, timezone
 import sys
 from langchain_core.messages import HumanMessage, AIMessage
 
+# Loaded before sys.modules is patched, so settings survive between tests
+import config.settings
+
 # Mock all langchain imports
 mock_langchain = {
     "langchain_core.prompts": MagicMock(),
@@ -18,8 +21,8 @@ mock_langchain = {
     "tiktoken": MagicMock(),
 }
 
-# Constants (copied from chat_service to avoid import issues)
-MAX_CHARS = 12000
+# Token budget for trimming tests
+PROMPT_BUDGET = 1000
 
 
 @pytest.fixture(autouse=True)
@@ -29,16 +32,7 @@ def mock_imports():
 
 
 @pytest.fixture
-def mock_db_client():
-    with patch("services.db_client.DBClient") as mock:
-        client = mock.return_value
-        client.get_conversation_history = AsyncMock(return_value=[])
-        client.close = AsyncMock()
-        yield client
-
-
-@pytest.fixture
-def chat_service(mock_db_client):
+def chat_service():
     with patch.dict("os.environ", {"OPENAI_API_KEY": "test-key"}):
         from services.chat_service import ChatService
 
@@ -46,28 +40,19 @@ def chat_service(mock_db_client):
         # Mock internal methods and dependencies
         service.llm = MagicMock()
         service.llm.ainvoke = AsyncMock(return_value=MagicMock(content="Test response"))
+        # Count tokens with the character estimate and a small budget
+        service.token_counter.encoding = None
+        service.prompt_budget = PROMPT_BUDGET
         yield service
 
 
 @pytest.mark.asyncio
 async def test_init_success(chat_service):
     """Test successful initialization"""
-    assert chat_service.db_client is not None
     assert chat_service.llm is not None
     assert chat_service.prompt is not None
 
 
-@pytest.mark.asyncio
-async def test_init_failure():
-    """Test initialization failure"""
-    with patch("services.db_client.DBClient", side_effect=Exception("DB Error")):
-        from services.chat_service import ChatService
-
-        with pytest.raises(Exception) as exc_info:
-            ChatService()
-        assert "DB Error" in str(exc_info.value)
-
-
 @pytest.mark.asyncio
 async def test_trim_history_empty(chat_service):
     """Test history trimming with empty history"""
@@ -80,7 +65,7 @@ async def test_trim_history_empty(chat_service):
 async def test_trim_history_message_too_long(chat_service):
     """Test history trimming when message is too long"""
     history = [MagicMock(content="test")]
-    long_message = "x" * (MAX_CHARS + 1)  # Exceeds max chars
+    long_message = "x" * (3 * PROMPT_BUDGET + 1)  # Exceeds the token budget
     trimmed = chat_service._trim_history_to_fit(history, long_message)
     assert trimmed == []
 
@@ -95,9 +80,22 @@ async def test_trim_history_partial(chat_service):
         messages.append(msg)
 
     result = chat_service._trim_history_to_fit(messages, "new message")
-    assert len(result) < len(messages)
+    assert len(result) == 2  # 337 tokens each with message overhead
     assert isinstance(result, list)
-    assert result[-1].content == "x" * 1000
+    assert result == messages[-2:]
+
+
+@pytest.mark.asyncio
+async def test_trim_history_counts_each_message_once(chat_service):
+    """Test that token counts are cached across turns"""
+    messages = [MagicMock(content=f"message {i}") for i in range(5)]
+
+    chat_service._trim_history_to_fit(messages, "first turn")
+    chat_service._trim_history_to_fit(messages, "second turn")
+
+    info = chat_service.token_counter.count.cache_info()
+    assert info.misses == 8  # System prompt, five history messages, two new ones
+    assert info.hits == 5
 
 
 @pytest.mark.asyncio
@@ -177,6 +175,70 @@ async def test_process_message_success(chat_service):
     assert response == "Test response"
 
 
+@pytest.mark.asyncio
+async def test_process_message_uses_response_cache(chat_service):
+    """Test that identical prompts are answered once unless the cache is skipped"""
+    chat_service._build_messages = Mock(return_value=[HumanMessage(content="Hola")])
+
+    assert await chat_service.process_message("Hola", "test_user", []) == "Test response"
+    assert await chat_service.process_message("Hola", "other_user", []) == "Test response"
+    assert chat_service.llm.ainvoke.await_count == 1
+
+    await chat_service.process_message("Hola", "test_user", [], use_cache=False)
+    assert chat_service.llm.ainvoke.await_count == 2
+    assert chat_service.response_cache.hits == 1
+
+
+@pytest.mark.asyncio
+async def test_semantic_cache_only_for_turns_without_history(chat_service):
+    """Test similar messages share a reply only when there is no history"""
+    from services.semantic_cache import SemanticCache
+
+    chat_service.response_cache = None
+    chat_service.semantic_cache = SemanticCache()
+    chat_service.semantic_cache_max_history = 0
+    history = [
+        {"content": "Hola", "sender": "user", "timestamp": datetime.now(timezone.utc)}
+    ]
+
+    await chat_service.process_message("Sesión de matemática para 2do", "a", [])
+    await chat_service.process_message("sesion de matematica para 2do!", "b", [])
+    assert chat_service.llm.ainvoke.await_count == 1
+
+    await chat_service.process_message("sesion de matematica para 2do!", "c", history)
+    assert chat_service.llm.ainvoke.await_count == 2
+
+
+@pytest.mark.asyncio
+async def test_process_message_uses_formatted_history(chat_service):
+    """Test history formatted by the caller isn't formatted again"""
+    chat_service._format_history = Mock()
+    chat_service.prompt = MagicMock()
+    formatted = [HumanMessage(content="Hola"), AIMessage(content="¡Hola!")]
+
+    await chat_service.process_message(
+        "Sesión de mate", "test_user", [{}, {}], formatted_history=formatted
+    )
+    chat_service._format_history.assert_not_called()
+    assert chat_service.prompt.format_messages.call_args.kwargs["chat_history"] == formatted
+
+
+@pytest.mark.asyncio
+async def test_priority_comes_from_the_caller(chat_service):
+    """Test that long messages stay interactive unless the caller asks for bulk"""
+    from services.fair_scheduler import BULK
+
+    chat_service.response_cache = None
+    long_message = "Necesito una unidad completa. " * 200
+
+    await chat_service.process_message(long_message, "teacher", [])
+    await chat_service.process_message("Hola", "batch", [], priority=BULK)
+
+    dispatched = chat_service.scheduler.stats()
+    assert dispatched["dispatched_interactive"] == 1
+    assert dispatched["dispatched_bulk"] == 1
+
+
 @pytest.mark.asyncio
 async def test_process_message_failure(chat_service):
     """Test message processing failure"""
@@ -187,13 +249,44 @@ async def test_process_message_failure(chat_service):
     assert "LLM Error" in str(exc_info.value)
 
 
+@pytest.mark.asyncio
+async def test_stream_message_success(chat_service):
+    """Test streaming yields the LLM chunks in order"""
+
+    async def fake_stream(messages):
+        for text in ["Hola", "", " profe"]:
+            yield MagicMock(content=text)
+
+    chat_service.llm.astream = fake_stream
+
+    chunks = [
+        chunk async for chunk in chat_service.stream_message("Hello", "test_user", [])
+    ]
+    assert chunks == ["Hola", " profe"]
+
+
+@pytest.mark.asyncio
+async def test_stream_message_failure(chat_service):
+    """Test streaming propagates LLM errors"""
+
+    async def failing_stream(messages):
+        yield MagicMock(content="Hola")
+        raise Exception("Stream Error")
+
+    chat_service.llm.astream = failing_stream
+
+    with pytest.raises(Exception) as exc_info:
+        async for _ in chat_service.stream_message("test", "user123", []):
+            pass
+    assert "Stream Error" in str(exc_info.value)
+
+
 @pytest.mark.asyncio
 async def test_close(chat_service):
     """Test service cleanup"""
     await chat_service.close()
-    assert (
-        chat_service.db_client.close.call_count == 1
-    )  # Use call_count instead of assert_called_once
+    # History is read by the app's DBClient; the service holds no client of its own
+    assert not hasattr(chat_service, "db_client")
 
 
 @pytest.mark.asyncio
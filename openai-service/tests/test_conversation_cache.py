@@ -0,0 +1,80 @@
+from unittest.mock import Mock
+from services.conversation_cache import ConversationCache
+
+
+def make_history(start, end):
+    return [
+        {
+            "content": f"Mensaje {i}",
+            "sender": "user" if i % 2 == 0 else "assistant",
+            "timestamp": f"2024-01-01T00:00:{i:02d}",
+            "position": i,
+        }
+        for i in range(start, end)
+    ]
+
+
+def make_cache(**kwargs):
+    return ConversationCache(lambda msg: f"formatted {msg['content']}", **kwargs)
+
+
+def test_extend_appends_and_keeps_the_window():
+    """Test new messages are appended and the oldest dropped past the window"""
+    cache = make_cache(window=5)
+    cache.put("user123", make_history(0, 4))
+
+    entry = cache.extend("user123", make_history(4, 7))
+    assert [msg["position"] for msg in entry.messages] == [2, 3, 4, 5, 6]
+    assert sorted(entry.formatted) == [2, 3, 4, 5, 6]
+    assert cache.formatted("user123", make_history(5, 7)) == [
+        "formatted Mensaje 5",
+        "formatted Mensaje 6",
+    ]
+    # Dropped messages aren't cached any more
+    assert cache.formatted("user123", make_history(0, 3)) is None
+
+
+def test_messages_are_formatted_once():
+    """Test cached messages aren't formatted again on later turns"""
+    format_message = Mock(side_effect=lambda msg: msg["content"])
+    cache = ConversationCache(format_message)
+    cache.put("user123", make_history(0, 4))
+    cache.extend("user123", make_history(4, 6))
+    cache.formatted("user123", make_history(0, 6))
+    assert format_message.call_count == 6
+
+
+def test_gap_in_positions_drops_the_entry():
+    """Test messages written elsewhere are detected by their positions"""
+    cache = make_cache()
+    cache.put("user123", make_history(0, 4))
+    cache.append_stored("user123", {"content": "Respuesta", "sender": "assistant"})
+    assert cache.get("user123").next_position == 5
+
+    # Someone else stored position 5 before this turn
+    assert cache.extend("user123", make_history(6, 7)) is None
+    assert cache.get("user123") is None
+    assert cache.stats()["stale"] == 1
+
+
+def test_history_without_positions_is_not_cached():
+    """Test legacy history can't be checked for staleness, so isn't cached"""
+    cache = make_cache()
+    legacy = [{k: v for k, v in msg.items() if k != "position"} for msg in make_history(0, 2)]
+    assert cache.put("user123", legacy) is None
+    assert len(cache) == 0
+
+
+def test_evicts_least_recently_used_users_by_size():
+    """Test the byte cap evicts the least recently used conversations"""
+    cache = make_cache()
+    cache.put("a", make_history(0, 4))
+    cache.max_bytes = cache.bytes * 2
+    cache.put("b", make_history(0, 4))
+    cache.get("a")
+    cache.put("c", make_history(0, 4))
+
+    assert cache.get("b") is None
+    assert cache.get("a") is not None and cache.get("c") is not None
+    assert cache.stats()["evictions"] == 1
+    assert cache.bytes <= cache.max_bytes
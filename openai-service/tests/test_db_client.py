@@ -1,6 +1,8 @@
+import asyncio
 import pytest
 import pytest_asyncio
 from unittest.mock import AsyncMock, MagicMock, patch
+from tenacity import wait_none
 from datetime import datetime, timezone
 import httpx
 from services.db_client import DBClient
@@ -11,6 +13,8 @@ def mock_settings():
     with patch("services.db_client.get_settings") as mock:
         settings = MagicMock()
         settings.DB_SERVICE_URL = "http://test-db:8000/api/v1"
+        settings.STORE_BATCH_MAX_SIZE = 50
+        settings.STORE_BATCH_MAX_DELAY_MS = 5.0
         mock.return_value = settings
         yield settings
 
@@ -132,12 +136,12 @@ async def test_store_message_success(db_client, mock_httpx_client):
 @pytest.mark.asyncio
 async def test_store_message_retry_success(db_client, mock_httpx_client):
     """Test message storage with retry success"""
-    # First call raises HTTPError, second call succeeds
+    # First call can't connect, second call succeeds
     mock_success_response = MagicMock()
     mock_success_response.raise_for_status = MagicMock()  # No error
 
     mock_httpx_client.post.side_effect = [
-        httpx.HTTPError("HTTP Error"),  # First call fails with HTTP error
+        httpx.ConnectError("Connection refused"),  # First call never reaches db-service
         mock_success_response,  # Second call succeeds with valid response
     ]
 
@@ -187,6 +191,104 @@ async def test_store_message_timeout(db_client, mock_httpx_client):
     assert mock_httpx_client.post.call_count >= 1  # At least one attempt
 
 
+@pytest.mark.asyncio
+async def test_concurrent_stores_use_bulk_endpoint(db_client, mock_httpx_client):
+    """Test that messages stored together are written in one bulk request"""
+    mock_response = MagicMock()
+    mock_response.raise_for_status = MagicMock()
+    mock_httpx_client.post.return_value = mock_response
+
+    results = await asyncio.gather(
+        *[
+            db_client.store_message(user_id=f"user_{i}", content="Hello", sender="user")
+            for i in range(3)
+        ]
+    )
+
+    assert results == [True, True, True]
+    mock_httpx_client.post.assert_called_once()
+    args, kwargs = mock_httpx_client.post.call_args
+    assert args[0] == "http://test-db:8000/api/v1/conversations/messages/bulk"
+    assert [m["user_id"] for m in kwargs["json"]["messages"]] == [
+        "user_0",
+        "user_1",
+        "user_2",
+    ]
+
+
+@pytest.mark.asyncio
+async def test_bulk_store_read_timeout_not_retried(db_client, mock_httpx_client):
+    """Test that a batch db-service may already have written is not sent again"""
+    mock_httpx_client.post.side_effect = httpx.ReadTimeout("timed out")
+
+    results = await asyncio.gather(
+        *[
+            db_client.store_message(user_id=f"user_{i}", content="Hello", sender="user")
+            for i in range(3)
+        ]
+    )
+
+    assert results == [False, False, False]
+    mock_httpx_client.post.assert_called_once()
+
+
+@pytest.mark.asyncio
+async def test_add_turn_messages_success(db_client, mock_httpx_client):
+    """Test storing turn messages returns the updated history"""
+    mock_messages = [{"content": "Hello", "sender": "user"}]
+    mock_response = MagicMock()
+    mock_response.json.return_value = {"messages": mock_messages}
+    mock_response.raise_for_status = MagicMock()
+    mock_httpx_client.post.return_value = mock_response
+
+    timestamp = datetime.now(timezone.utc)
+    messages = await db_client.add_turn_messages(
+        "test_user", ["Hello", "again"], timestamp=timestamp
+    )
+
+    assert messages == mock_messages
+    mock_httpx_client.post.assert_called_once_with(
+        "http://test-db:8000/api/v1/conversations/test_user/turn",
+        json={
+            "messages": [
+                {
+                    "content": content,
+                    "sender": "user",
+                    "message_type": "text",
+                    "timestamp": timestamp.isoformat(),
+                }
+                for content in ["Hello", "again"]
+            ],
+            "limit": 50,
+        },
+        timeout=10.0,
+    )
+
+
+@pytest.mark.asyncio
+async def test_add_turn_messages_retries_connect_errors(db_client, mock_httpx_client):
+    """Test that a turn is resent when db-service was never reached"""
+    mock_response = MagicMock()
+    mock_response.json.return_value = {"messages": []}
+    mock_response.raise_for_status = MagicMock()
+    mock_httpx_client.post.side_effect = [httpx.ConnectError("refused"), mock_response]
+
+    with patch.object(DBClient.add_turn_messages.retry, "wait", wait_none()):
+        assert await db_client.add_turn_messages("test_user", ["Hello"]) == []
+    assert mock_httpx_client.post.call_count == 2
+
+
+@pytest.mark.asyncio
+async def test_add_turn_messages_read_timeout_not_retried(db_client, mock_httpx_client):
+    """Test that a turn db-service may already have stored is not sent again"""
+    mock_httpx_client.post.side_effect = httpx.ReadTimeout("timed out")
+
+    with patch.object(DBClient.add_turn_messages.retry, "wait", wait_none()):
+        with pytest.raises(httpx.ReadTimeout):
+            await db_client.add_turn_messages("test_user", ["Hello"])
+    mock_httpx_client.post.assert_called_once()
+
+
 @pytest.mark.asyncio
 async def test_close(db_client, mock_httpx_client):
     """Test client cleanup"""
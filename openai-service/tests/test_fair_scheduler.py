@@ -0,0 +1,111 @@
+import asyncio
+import pytest
+from services.fair_scheduler import BULK, INTERACTIVE, FairScheduler, SchedulerFull
+
+
+async def run_queued(scheduler, calls):
+    """Queue calls behind a held slot, release it and return the service order"""
+    order = []
+
+    async def call(name, user_id, cost, priority):
+        async with scheduler.slot(user_id, cost, priority):
+            order.append(name)
+            await asyncio.sleep(0)
+
+    await scheduler.acquire("holder", 1)
+    tasks = []
+    for name, user_id, cost, priority in calls:
+        tasks.append(asyncio.create_task(call(name, user_id, cost, priority)))
+        await asyncio.sleep(0)
+    scheduler.release()
+    await asyncio.gather(*tasks)
+    return order
+
+
+@pytest.mark.asyncio
+async def test_admits_immediately_below_concurrency():
+    """Test calls don't queue while slots are free"""
+    scheduler = FairScheduler(max_concurrency=2)
+    await scheduler.acquire("a", 100)
+    await scheduler.acquire("b", 100)
+    assert scheduler.stats()["running"] == 2
+    scheduler.release()
+    scheduler.release()
+    assert scheduler.stats()["running"] == 0
+
+
+@pytest.mark.asyncio
+async def test_heavy_user_does_not_starve_others():
+    """Test users get turns in rounds, whoever queued first"""
+    scheduler = FairScheduler(max_concurrency=1, quantum=1000)
+    heavy = [(f"heavy{i}", "heavy", 1000, INTERACTIVE) for i in range(4)]
+    light = [("a", "a", 1000, INTERACTIVE), ("b", "b", 1000, INTERACTIVE)]
+
+    order = await run_queued(scheduler, heavy + light)
+    assert order == ["heavy0", "a", "b", "heavy1", "heavy2", "heavy3"]
+
+
+@pytest.mark.asyncio
+async def test_share_is_by_tokens():
+    """Test a user with cheap calls gets more of them per round"""
+    scheduler = FairScheduler(max_concurrency=1, quantum=1000)
+    calls = [(f"long{i}", "long", 1000, INTERACTIVE) for i in range(2)]
+    calls += [(f"short{i}", "short", 500, INTERACTIVE) for i in range(4)]
+
+    order = await run_queued(scheduler, calls)
+    assert order == ["long0", "short0", "short1", "long1", "short2", "short3"]
+
+
+@pytest.mark.asyncio
+async def test_interactive_goes_first_without_starving_bulk():
+    """Test interactive calls jump bulk ones, with a bulk call every few"""
+    scheduler = FairScheduler(max_concurrency=1, interactive_weight=2)
+    calls = [(f"bulk{i}", "u1", 100, BULK) for i in range(2)]
+    calls += [(f"chat{i}", f"u{i + 2}", 100, INTERACTIVE) for i in range(4)]
+
+    order = await run_queued(scheduler, calls)
+    assert order == ["chat0", "chat1", "bulk0", "chat2", "chat3", "bulk1"]
+    stats = scheduler.stats()
+    # The holder counts too
+    assert (stats["dispatched_interactive"], stats["dispatched_bulk"]) == (5, 2)
+
+
+@pytest.mark.asyncio
+async def test_rejects_beyond_queue_depth():
+    """Test full queues reject at once, per user and overall"""
+    scheduler = FairScheduler(max_concurrency=1, max_queue_depth=3, max_user_queue_depth=2)
+    await scheduler.acquire("holder", 1)
+    waiters = [
+        asyncio.create_task(scheduler.acquire(user_id, 1)) for user_id in ("a", "a")
+    ]
+    await asyncio.sleep(0)
+
+    with pytest.raises(SchedulerFull):
+        await scheduler.acquire("a", 1)
+    waiters.append(asyncio.create_task(scheduler.acquire("b", 1)))
+    await asyncio.sleep(0)
+    with pytest.raises(SchedulerFull):
+        await scheduler.acquire("c", 1)
+    assert scheduler.stats()["rejected"] == 2
+
+    for _ in waiters:
+        scheduler.release()
+    await asyncio.gather(*waiters)
+
+
+@pytest.mark.asyncio
+async def test_cancelled_waiter_leaves_the_queue():
+    """Test a cancelled call frees its queue place and never takes a slot"""
+    scheduler = FairScheduler(max_concurrency=1)
+    await scheduler.acquire("holder", 1)
+    waiter = asyncio.create_task(scheduler.acquire("a", 1))
+    await asyncio.sleep(0)
+    assert scheduler.stats()["queued"] == 1
+
+    waiter.cancel()
+    with pytest.raises(asyncio.CancelledError):
+        await waiter
+    assert scheduler.stats()["queued"] == 0
+
+    scheduler.release()
+    assert scheduler.stats()["running"] == 0
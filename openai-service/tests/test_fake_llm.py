@@ -0,0 +1,34 @@
+import pytest
+from langchain_core.messages import HumanMessage
+from services.fake_llm import FakeChatModel
+
+
+@pytest.mark.asyncio
+async def test_replies_are_deterministic():
+    """Test that the same prompt and seed give the same reply"""
+    llm = FakeChatModel(latency_ms=1, token_delay_ms=0, tokens=12, seed=7)
+    messages = [HumanMessage(content="Hola")]
+
+    first = await llm.ainvoke(messages)
+    second = await FakeChatModel(
+        latency_ms=1, token_delay_ms=0, tokens=12, seed=7
+    ).ainvoke(messages)
+    other_seed = await FakeChatModel(
+        latency_ms=1, token_delay_ms=0, tokens=12, seed=8
+    ).ainvoke(messages)
+
+    assert first.content == second.content
+    assert first.content != other_seed.content
+    assert len(first.content.split()) == 12
+
+
+@pytest.mark.asyncio
+async def test_stream_matches_invoke():
+    """Test that streamed tokens join into the invoked reply"""
+    llm = FakeChatModel(latency_ms=1, token_delay_ms=0, tokens=5)
+    messages = [HumanMessage(content="Planifica una clase")]
+
+    chunks = [chunk.content async for chunk in llm.astream(messages)]
+
+    assert len(chunks) == 5
+    assert "".join(chunks) == (await llm.ainvoke(messages)).content
@@ -0,0 +1,71 @@
+import asyncio
+import pytest
+from services.message_batcher import MessageBatcher
+
+
+class Recorder:
+    def __init__(self, error=None):
+        self.batches = []
+        self.error = error
+
+    async def __call__(self, items):
+        self.batches.append(list(items))
+        if self.error:
+            raise self.error
+
+
+@pytest.mark.asyncio
+async def test_concurrent_items_share_a_batch():
+    """Test that items added together are flushed in one call"""
+    recorder = Recorder()
+    batcher = MessageBatcher(recorder, max_batch_size=10, max_delay=0.01)
+
+    results = await asyncio.gather(*[batcher.add(i) for i in range(5)])
+
+    assert results == [True] * 5
+    assert recorder.batches == [[0, 1, 2, 3, 4]]
+    assert batcher.stats() == {"pending": 0, "batches": 1, "items": 5}
+
+
+@pytest.mark.asyncio
+async def test_batches_split_by_size():
+    """Test that a full batch is flushed without waiting for the delay"""
+    recorder = Recorder()
+    batcher = MessageBatcher(recorder, max_batch_size=2, max_delay=10)
+
+    await asyncio.wait_for(asyncio.gather(*[batcher.add(i) for i in range(4)]), 1)
+
+    assert recorder.batches == [[0, 1], [2, 3]]
+
+
+@pytest.mark.asyncio
+async def test_single_item_flushed_after_delay():
+    """Test that a lone item is written after the delay"""
+    recorder = Recorder()
+    batcher = MessageBatcher(recorder, max_batch_size=10, max_delay=0.01)
+
+    assert await batcher.add("only") is True
+    assert recorder.batches == [["only"]]
+
+
+@pytest.mark.asyncio
+async def test_errors_reach_every_caller():
+    """Test that a failed batch raises for each item in it"""
+    batcher = MessageBatcher(Recorder(error=ValueError("DB down")), max_delay=0.001)
+
+    results = await asyncio.gather(batcher.add(1), batcher.add(2), return_exceptions=True)
+    assert all(isinstance(result, ValueError) for result in results)
+
+
+@pytest.mark.asyncio
+async def test_close_flushes_pending():
+    """Test that close writes items still waiting for the delay"""
+    recorder = Recorder()
+    batcher = MessageBatcher(recorder, max_batch_size=10, max_delay=10)
+
+    task = asyncio.create_task(batcher.add("late"))
+    await asyncio.sleep(0)
+    await asyncio.wait_for(batcher.close(), 1)
+
+    assert await task is True
+    assert recorder.batches == [["late"]]
@@ -0,0 +1,68 @@
+import asyncio
+import pytest
+from services.rate_limiter import TokenBucketLimiter
+
+
+class FakeClock:
+    def __init__(self):
+        self.now = 0.0
+
+    def __call__(self):
+        return self.now
+
+
+def test_waits_for_the_tighter_quota():
+    """Test the wait comes from whichever of RPM and TPM is exhausted"""
+    clock = FakeClock()
+    limiter = TokenBucketLimiter(requests_per_minute=2, tokens_per_minute=600, clock=clock)
+
+    assert limiter.reserve(500).wait == 0
+    # 400 tokens short at 10 tokens/s
+    assert limiter.reserve(500).wait == pytest.approx(40)
+    # Out of requests too: 1 request short at 1 per 30s, 900 tokens at 10/s
+    assert limiter.reserve(100).wait == pytest.approx(50)
+
+    clock.now = 30
+    assert limiter.reserve(0).wait == pytest.approx(30)
+
+
+def test_waiters_are_charged_in_arrival_order():
+    """Test each caller waits behind the charges made before it"""
+    clock = FakeClock()
+    limiter = TokenBucketLimiter(requests_per_minute=60, tokens_per_minute=60, clock=clock)
+    waits = [limiter.reserve(30).wait for _ in range(4)]
+    assert waits == pytest.approx([0, 0, 30, 60])
+
+
+def test_reconcile_corrects_the_estimate():
+    """Test unused estimated tokens are returned and overruns charged"""
+    clock = FakeClock()
+    limiter = TokenBucketLimiter(requests_per_minute=60, tokens_per_minute=600, clock=clock)
+    reservation = limiter.reserve(600)
+    limiter.reconcile(reservation, 200)
+    assert limiter.reserve(400).wait == 0
+
+    reservation = limiter.reserve(0)
+    limiter.reconcile(reservation, 100)
+    assert limiter.reserve(0).wait == pytest.approx(10)
+    assert limiter.stats()["reconciled_tokens"] == -300
+
+
+@pytest.mark.asyncio
+async def test_cancelled_waiter_gives_back_its_charge():
+    """Test a cancelled caller doesn't delay the ones after it"""
+    limiter = TokenBucketLimiter(requests_per_minute=6000, tokens_per_minute=600)
+    await limiter.acquire(600)
+
+    waiter = asyncio.create_task(limiter.acquire(600))
+    await asyncio.sleep(0)
+    assert limiter.stats()["waiting"] == 1
+    waiter.cancel()
+    with pytest.raises(asyncio.CancelledError):
+        await waiter
+
+    # Without the refund this would wait about two minutes
+    reservation = limiter.reserve(10)
+    assert reservation.wait < 2
+    stats = limiter.stats()
+    assert (stats["waiting"], stats["cancelled"], stats["acquired"]) == (0, 1, 1)
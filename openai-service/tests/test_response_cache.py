@@ -0,0 +1,72 @@
+from langchain_core.messages import AIMessage, HumanMessage, SystemMessage
+from services.response_cache import ResponseCache, prompt_key
+
+PROMPT = [
+    SystemMessage(content="Eres TutorIA"),
+    HumanMessage(content="Hola"),
+    AIMessage(content="¡Hola! ¿En qué te ayudo?"),
+    HumanMessage(content="Una actividad de fracciones"),
+]
+
+
+class FakeClock:
+    def __init__(self):
+        self.now = 0.0
+
+    def __call__(self):
+        return self.now
+
+
+def test_prompt_key_covers_prompt_state():
+    """Test that the key changes with any part of the prompt, model or temperature"""
+    key = prompt_key(PROMPT, "openai:gpt-4", 0.7)
+    assert prompt_key(list(PROMPT), "openai:gpt-4", 0.7) == key
+    assert prompt_key(PROMPT, "openai:gpt-4", 0.72) == key
+    assert prompt_key(PROMPT, "openai:gpt-4", 0.2) != key
+    assert prompt_key(PROMPT, "openai:gpt-4o", 0.7) != key
+
+    edited = [SystemMessage(content="Eres TutorIA v2")] + PROMPT[1:]
+    assert prompt_key(edited, "openai:gpt-4", 0.7) != key
+    # Same text from the other speaker is a different prompt
+    swapped = PROMPT[:2] + [HumanMessage(content=PROMPT[2].content)] + PROMPT[3:]
+    assert prompt_key(swapped, "openai:gpt-4", 0.7) != key
+
+
+def test_get_put_and_ttl():
+    """Test hits, misses and expiry"""
+    clock = FakeClock()
+    cache = ResponseCache(ttl_seconds=60, clock=clock)
+
+    assert cache.get("a") is None
+    cache.put("a", "respuesta")
+    assert cache.get("a") == "respuesta"
+
+    clock.now = 61
+    assert cache.get("a") is None
+    assert len(cache) == 0 and cache.bytes == 0
+
+    stats = cache.stats()
+    assert (stats["hits"], stats["misses"], stats["expirations"]) == (1, 2, 1)
+    assert stats["hit_rate"] == 1 / 3
+
+
+def test_evicts_least_recently_used():
+    """Test that the entry and byte caps evict the least recently used entries"""
+    cache = ResponseCache(max_entries=2)
+    cache.put("a", "1")
+    cache.put("b", "2")
+    cache.get("a")
+    cache.put("c", "3")
+    assert cache.get("b") is None
+    assert cache.get("a") == "1" and cache.get("c") == "3"
+
+    entry_bytes = cache.bytes // 2
+    cache = ResponseCache(max_bytes=entry_bytes * 2 + 10)
+    for key in ("a", "b", "c"):
+        cache.put(key, "x")
+    assert len(cache) == 2 and cache.get("a") is None
+    assert cache.stats()["evictions"] == 1
+
+    # Replies bigger than the whole cache are not stored
+    cache.put("d", "x" * (entry_bytes * 3))
+    assert cache.get("d") is None and len(cache) == 2
@@ -0,0 +1,83 @@
+import numpy as np
+from services.semantic_cache import HashedNgramEmbedder, SemanticCache, normalize_text
+
+
+class FakeClock:
+    def __init__(self):
+        self.now = 0.0
+
+    def __call__(self):
+        return self.now
+
+
+def test_normalize_text():
+    """Test accents, case and punctuation are ignored"""
+    assert normalize_text("¿Sesión de  Matemática?") == "sesion de matematica"
+
+
+def test_matches_close_variants_only():
+    """Test variants of a message hit and different requests miss"""
+    cache = SemanticCache(threshold=0.85)
+    query, reply = cache.lookup("sesión de matemática para 2do")
+    assert reply is None
+    cache.add(query, "Sesión de matemática")
+
+    assert cache.lookup("Sesion de matematica para 2do grado")[1] == "Sesión de matemática"
+    assert cache.lookup("necesito una sesión de matemática para 2do")[1] is not None
+    assert cache.lookup("sesión de comunicación para 2do")[1] is None
+    # Nearly the same text, but another grade
+    assert cache.lookup("sesión de matemática para 3ro")[1] is None
+
+    stats = cache.stats()
+    assert (stats["hits"], stats["misses"]) == (2, 3)
+    assert stats["lookup_ms_avg"] > 0
+
+
+def test_pluggable_embedding_function():
+    """Test a custom embedding function is used for similarity"""
+    vectors = {"a": [1.0, 0.0], "b": [0.96, 0.28], "c": [0.0, 1.0]}
+    cache = SemanticCache(embed=lambda text: np.array(vectors[text]), threshold=0.9)
+    query, _ = cache.lookup("a")
+    cache.add(query, "respuesta")
+
+    assert cache.lookup("b")[1] == "respuesta"
+    assert cache.lookup("c")[1] is None
+
+
+def test_expiry_and_eviction():
+    """Test expired entries stop matching and are reused before evicting"""
+    clock = FakeClock()
+    cache = SemanticCache(max_entries=2, ttl_seconds=60, clock=clock)
+    for text in ("planificación anual", "rúbrica de evaluación"):
+        query, _ = cache.lookup(text)
+        cache.add(query, text)
+
+    clock.now = 30
+    cache.lookup("planificación anual")
+    query, _ = cache.lookup("dinámica grupal")
+    cache.add(query, "dinámica grupal")
+    # The least recently used entry made room
+    assert cache.stats()["evictions"] == 1
+    assert cache.lookup("rúbrica de evaluación")[1] is None
+    assert cache.lookup("planificación anual")[1] == "planificación anual"
+
+    clock.now = 100
+    assert cache.lookup("dinámica grupal")[1] is None
+    query, _ = cache.lookup("lectura comprensiva")
+    cache.add(query, "lectura comprensiva")
+    assert len(cache) == 2 and cache.stats()["evictions"] == 1
+
+
+def test_empty_message_is_not_cached():
+    """Test messages without words are neither matched nor stored"""
+    cache = SemanticCache()
+    query, reply = cache.lookup("?!")
+    assert query is None and reply is None
+    cache.add(query, "respuesta")
+    assert len(cache) == 0
+
+
+def test_embedder_is_deterministic():
+    """Test the default embedding doesn't depend on the process hash seed"""
+    embed = HashedNgramEmbedder(dim=64)
+    assert np.array_equal(embed("hola profe"), embed("hola profe"))
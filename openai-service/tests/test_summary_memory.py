@@ -0,0 +1,125 @@
+import asyncio
+import pytest
+from unittest.mock import AsyncMock, MagicMock
+from services.summary_memory import SummaryMemory
+
+
+def make_history(start, end):
+    return [
+        {
+            "content": f"Mensaje {i}",
+            "sender": "user" if i % 2 == 0 else "assistant",
+            "timestamp": f"2024-01-01T00:00:{i:02d}",
+            "position": i,
+        }
+        for i in range(start, end)
+    ]
+
+
+@pytest.fixture
+def memory():
+    db_client = MagicMock()
+    db_client.store_summary = AsyncMock(return_value=True)
+    chat_service = MagicMock()
+    chat_service.summarize = AsyncMock(return_value="Área: matemática, 2do grado")
+    return SummaryMemory(db_client, chat_service, recent_messages=4, fold_messages=3)
+
+
+def test_unsummarized_skips_summarized_messages():
+    """Test that only messages from the summary's position on are kept"""
+    history = make_history(0, 10)
+    assert SummaryMemory.unsummarized(history, 6) == history[6:]
+    # Without positions nothing can be dropped safely
+    legacy = [{"content": "Hola", "sender": "user"}]
+    assert SummaryMemory.unsummarized(legacy, 6) == legacy
+
+
+@pytest.mark.asyncio
+async def test_folds_older_messages_into_summary(memory):
+    """Test that messages beyond the recent ones are summarized and stored"""
+    history = make_history(10, 17)
+
+    memory.maybe_fold("user123", "Resumen previo", 10, history)
+    await memory.close()
+
+    memory.chat_service.summarize.assert_awaited_once_with(
+        "Resumen previo", history[:3], "user123"
+    )
+    memory.db_client.store_summary.assert_awaited_once_with(
+        "user123", "Área: matemática, 2do grado", 13
+    )
+    assert memory.stats()["folds"] == 1
+
+
+@pytest.mark.asyncio
+async def test_waits_until_enough_messages_pile_up(memory):
+    """Test that no fold starts below the threshold or while one is running"""
+    memory.maybe_fold("user123", None, 0, make_history(0, 6))
+    await memory.close()
+    memory.chat_service.summarize.assert_not_awaited()
+
+    release = asyncio.Event()
+
+    async def slow_summarize(summary, messages, user_id):
+        await release.wait()
+        return "Resumen"
+
+    memory.chat_service.summarize = slow_summarize
+    memory.maybe_fold("user123", None, 0, make_history(0, 8))
+    memory.maybe_fold("user123", None, 0, make_history(0, 9))
+    release.set()
+    await memory.close()
+
+    assert memory.db_client.store_summary.await_count == 1
+
+
+@pytest.mark.asyncio
+async def test_gap_before_window_is_folded_first(memory):
+    """Test that messages between the summary and the window are not skipped"""
+    memory.db_client.get_conversation_history = AsyncMock(
+        return_value=make_history(5, 8)
+    )
+    # The summary covers up to 5, but the window only starts at 40
+    memory.maybe_fold("user123", "Resumen previo", 5, make_history(40, 47))
+    await memory.close()
+
+    memory.db_client.get_conversation_history.assert_awaited_once_with(
+        "user123", 3, after=4
+    )
+    memory.chat_service.summarize.assert_awaited_once_with(
+        "Resumen previo", make_history(5, 8), "user123"
+    )
+    # The summary only moves past what was actually summarized
+    memory.db_client.store_summary.assert_awaited_once_with(
+        "user123", "Área: matemática, 2do grado", 8
+    )
+    assert memory.stats()["gap_folds"] == 1
+
+
+@pytest.mark.asyncio
+async def test_gap_that_cannot_be_read_is_not_skipped(memory):
+    """Test that the summary position stays put if the gap can't be read"""
+    memory.db_client.get_conversation_history = AsyncMock(return_value=[])
+
+    memory.maybe_fold("user123", None, 0, make_history(40, 47))
+    await memory.close()
+
+    memory.chat_service.summarize.assert_not_awaited()
+    memory.db_client.store_summary.assert_not_awaited()
+    assert memory.stats()["fold_failures"] == 1
+
+
+@pytest.mark.asyncio
+async def test_short_history_never_folds_recent_messages():
+    """Test that a history shorter than the recent window starts no fold"""
+    db_client = MagicMock()
+    db_client.store_summary = AsyncMock(return_value=True)
+    chat_service = MagicMock()
+    chat_service.summarize = AsyncMock(return_value="Resumen")
+    memory = SummaryMemory(db_client, chat_service, recent_messages=10, fold_messages=3)
+
+    memory.maybe_fold("user123", None, 0, make_history(0, 6))
+    await memory.close()
+
+    chat_service.summarize.assert_not_awaited()
+    db_client.store_summary.assert_not_awaited()
@@ -7,12 +7,16 @@ import asyncio
 from contextlib import asynccontextmanager
 import socket
 from pydantic import BaseModel
-from typing import Optional
+from typing import Any, AsyncIterator, Dict, List, Literal, Optional, Tuple
 
 from config import get_settings
 from logging_config import setup_logging
-from services.chat_service import ChatService
+from services.chat_service import ChatService, StreamInterrupted
+from services.message_queue import MessageQueue, QueueFullError
+from services.message_coalescer import MessageCoalescer
+from services.message_chunker import MessageChunker
 from handlers.webhook_handler import WebhookHandler
+from metrics import CONTENT_TYPE_LATEST, STAGE_SECONDS, register_stats, render
 
 # Setup logging
 setup_logging()
@@ -59,8 +63,24 @@ async def lifespan(app: FastAPI):
     # Initialize services
     app.chat_service = ChatService()
     app.webhook_handler = WebhookHandler()
+    app.message_queue = MessageQueue(
+        process_incoming_messages,
+        max_size=settings.message_queue_max_size,
+        workers=settings.message_workers,
+    )
+    app.message_coalescer = MessageCoalescer(
+        enqueue_messages,
+        window_seconds=settings.coalesce_window_seconds,
+        max_wait_seconds=settings.coalesce_max_wait_seconds,
+        max_batch_size=settings.coalesce_max_batch_size,
+        # Every buffered burst holds its queue slot, so acknowledged messages can't be dropped
+        reserve=lambda user_id: app.message_queue.reserve(),
+    )
+    await app.message_queue.start()
     yield
-    # Cleanup
+    # Cleanup: finish buffered and queued messages before closing the clients they use
+    app.message_coalescer.flush_all()
+    await app.message_queue.stop(timeout=settings.shutdown_drain_timeout)
     await app.chat_service.close()
     await app.webhook_handler.close()
     logger.info("Shutting down WhatsApp service")
@@ -79,6 +99,8 @@ class ChatRequest(BaseModel):
     message: str
     user_id: str
     message_type: Optional[str] = "text"
+    # OpenAI service scheduler class: "bulk" lets live WhatsApp turns go first
+    priority: Literal["interactive", "bulk"] = "interactive"
 
 
 class ChatResponse(BaseModel):
@@ -88,30 +110,33 @@ class ChatResponse(BaseModel):
 @app.post("/chat", response_model=ChatResponse)
 async def chat(request: ChatRequest):
     try:
-        start_time = time.time()
         message = request.message
         user_id = request.user_id
         message_type = request.message_type
-        model = "gpt-4"
 
         # Store user message
-        await app.chat_service.store_message(
-            user_id=user_id,
-            content=message,
-            sender="user",
-            message_type=message_type
-        )
+        with STAGE_SECONDS.labels("store_user_message").time():
+            await app.chat_service.store_message(
+                user_id=user_id,
+                content=message,
+                sender="user",
+                message_type=message_type
+            )
 
         # Get response from OpenAI
-        response = await app.chat_service.send_message_to_openai(message, user_id)
+        with STAGE_SECONDS.labels("llm_reply").time():
+            response = await app.chat_service.send_message_to_openai(
+                message, user_id, priority=request.priority
+            )
 
         # Store assistant response
-        await app.chat_service.store_message(
-            user_id=user_id,
-            content=response,
-            sender="assistant",
-            message_type=message_type,
-        )
+        with STAGE_SECONDS.labels("store_reply").time():
+            await app.chat_service.store_message(
+                user_id=user_id,
+                content=response,
+                sender="assistant",
+                message_type=message_type,
+            )
 
         return {"response": response}
 
@@ -142,8 +167,141 @@ async def webhook_verify(request: Request):
         raise HTTPException(status_code=500, detail="Internal server error")
 
 
+async def send_reply(user_id: str, text: str) -> bool:
+    """Send a text message back to the user"""
+    message_data = app.webhook_handler.create_message_body(user_id, text)
+    with STAGE_SECONDS.labels("whatsapp_send").time():
+        return await app.webhook_handler.send_whatsapp_message(message_data)
+
+
+async def stream_reply(user_id: str, deltas: AsyncIterator[str]) -> Tuple[str, bool]:
+    """Send each completed chunk of a streamed AI response as soon as it's ready.
+
+    StreamInterrupted from deltas propagates, leaving the unsent tail unsent.
+    """
+    chunker = MessageChunker(
+        min_chars=settings.stream_min_chunk_chars,
+        max_chars=settings.stream_max_chunk_chars,
+    )
+    parts = []
+    success = True
+
+    async for delta in deltas:
+        parts.append(delta)
+        for chunk in chunker.feed(delta):
+            success = await send_reply(user_id, chunk) and success
+    for chunk in chunker.flush():
+        success = await send_reply(user_id, chunk) and success
+
+    return "".join(parts), success
+
+
+async def generate_reply(user_id: str, texts: List[str]) -> Tuple[str, Optional[bool]]:
+    """Get the AI response for a burst, returning whether it was already sent"""
+    if settings.use_turn_endpoint:
+        # The OpenAI service stores both sides of the turn: one internal request
+        with STAGE_SECONDS.labels("llm_reply").time():
+            if settings.stream_responses:
+                return await stream_reply(
+                    user_id, app.chat_service.stream_turn(texts, user_id)
+                )
+            return await app.chat_service.send_turn(texts, user_id), None
+
+    # Store each user message as it was sent
+    with STAGE_SECONDS.labels("store_user_message").time():
+        for text in texts:
+            await app.chat_service.store_message(
+                user_id=user_id,
+                content=text,
+                sender="user",
+                message_type="text",
+            )
+
+    prompt = "\n".join(texts)
+    success = None
+    with STAGE_SECONDS.labels("llm_reply").time():
+        if settings.stream_responses:
+            response, success = await stream_reply(
+                user_id, app.chat_service.stream_message_from_openai(prompt, user_id)
+            )
+        else:
+            response = await app.chat_service.send_message_to_openai(prompt, user_id)
+
+    if response:
+        # Store AI response
+        with STAGE_SECONDS.labels("store_reply").time():
+            await app.chat_service.store_message(
+                user_id=user_id,
+                content=response,
+                sender="assistant",
+                message_type="text",
+            )
+    return response, success
+
+
+async def process_incoming_messages(messages: List[Dict[str, Any]]):
+    """Generate, store and send one reply for a burst of messages from a user"""
+    message_ids = [message["id"] for message in messages]
+    user_id = messages[0]["from"]
+    try:
+        texts = [message["text"]["body"] for message in messages]
+        success = None
+
+        # A redelivered message whose reply failed to send is replayed without the LLM
+        response = app.webhook_handler.get_cached_response(message_ids[-1])
+        if response:
+            logger.info(f"Replaying cached response for message {message_ids[-1]}")
+        else:
+            # Get a single AI response for the whole burst
+            response, success = await generate_reply(user_id, texts)
+
+        if response:
+            # Send response back to user unless it was already streamed
+            if success is None:
+                success = await send_reply(user_id, response)
+
+            for message_id in message_ids:
+                if success:
+                    app.webhook_handler.mark_message_processed(message_id, response)
+                else:
+                    app.webhook_handler.mark_message_failed(message_id, response)
+            if not success:
+                logger.error(f"Failed to send response for messages {message_ids}")
+
+    except StreamInterrupted as e:
+        # Part of the reply went out; don't store or mark the cut-off text as the answer
+        logger.error(f"Reply to messages {message_ids} was cut off: {str(e)}")
+        for message_id in message_ids:
+            app.webhook_handler.mark_message_failed(message_id)
+        error_data = app.webhook_handler.create_message_body(
+            user_id,
+            "Lo siento, mi respuesta se interrumpió. Por favor, intenta nuevamente.",
+        )
+        await app.webhook_handler.send_whatsapp_message(error_data)
+
+    except Exception as e:
+        logger.error(
+            f"Error processing messages {message_ids}: {str(e)}",
+            exc_info=True,
+        )
+        for message_id in message_ids:
+            app.webhook_handler.mark_message_processed(message_id)
+        error_data = app.webhook_handler.create_message_body(
+            user_id,
+            "Lo siento, hubo un error al procesar tu mensaje. Por favor, intenta nuevamente.",
+        )
+        await app.webhook_handler.send_whatsapp_message(error_data)
+
+
+def enqueue_messages(user_id: str, messages: List[Dict[str, Any]]):
+    """Hand a coalesced burst to the worker queue, into the slot it reserved"""
+    app.message_queue.submit(user_id, messages, reserved=True)
+
+
 @app.post("/whatsapp")
 async def webhook(request: Request):
+    """Validate and enqueue incoming messages, acknowledging Meta immediately"""
+    start = time.perf_counter()
     try:
         data = await request.json()
         idempotency_key = request.headers.get("X-FB-Request-Id")
@@ -170,67 +328,59 @@ async def webhook(request: Request):
                     if not app.webhook_handler.should_process_message(message):
                         continue
 
-                    message_id = message["id"]
                     try:
-                        user_id = message["from"]
-                        message_text = message["text"]["body"]
-
-                        # Store user message
-                        await app.chat_service.store_message(
-                            user_id=user_id,
-                            content=message_text,
-                            sender="user",
-                            message_type="text",
-                        )
-
-                        # Get AI response
-                        response = await app.chat_service.send_message_to_openai(
-                            message_text, user_id
-                        )
-
-                        if response:
-                            # Store AI response
-                            await app.chat_service.store_message(
-                                user_id=user_id,
-                                content=response,
-                                sender="assistant",
-                                message_type="text",
-                            )
-
-                            # Send response back to user
-                            message_data = app.webhook_handler.create_message_body(
-                                user_id, response
-                            )
-                            success = await app.webhook_handler.send_whatsapp_message(
-                                message_data
-                            )
-
-                            if success:
-                                app.webhook_handler.mark_message_processed(
-                                    message_id, response
-                                )
-                            else:
-                                logger.error(
-                                    f"Failed to send response for message {message_id}"
-                                )
-
-                    except Exception as e:
-                        logger.error(
-                            f"Error processing message {message_id}: {str(e)}",
-                            exc_info=True,
-                        )
-                        app.webhook_handler.mark_message_processed(message_id)
-                        error_data = app.webhook_handler.create_message_body(
-                            user_id,
-                            "Lo siento, hubo un error al procesar tu mensaje. Por favor, intenta nuevamente.",
-                        )
-                        await app.webhook_handler.send_whatsapp_message(error_data)
+                        # Bursts from the same user are merged before reaching the queue,
+                        # which keeps one ordered lane per sender. A new burst reserves
+                        # its queue slot here, before Meta gets its 200.
+                        app.message_coalescer.add(message["from"], message)
+                    except QueueFullError:
+                        # Let Meta redeliver; messages already accepted are deduplicated
+                        logger.error("Rejecting webhook: message queue is full")
+                        return Response(status_code=503)
+
+                    # Accepted messages are handled exactly once by the workers
+                    app.webhook_handler.mark_message_accepted(message["id"])
+
+        if idempotency_key:
+            app.webhook_handler.mark_request_processed(idempotency_key)
 
         return Response(status_code=200)
 
     except Exception as e:
         logger.error(f"Error in webhook: {str(e)}")
         raise HTTPException(status_code=500, detail="Internal server error")
+    finally:
+        STAGE_SECONDS.labels("webhook_parse").observe(time.perf_counter() - start)
+
+
+@app.get("/stats")
+async def stats():
+    """Queue, coalescer, idempotency cache and outbound delivery counters"""
+    return {
+        "message_queue": app.message_queue.stats(),
+        "message_coalescer": app.message_coalescer.stats(),
+        "idempotency_cache": app.webhook_handler.cache_stats(),
+        "whatsapp_sender": app.webhook_handler.sender_stats(),
+    }
+
+
+# The same counters, scraped as gauges alongside the stage histograms
+register_stats(
+    "whatsapp",
+    {
+        "message_queue": lambda: app.message_queue.stats(),
+        "message_coalescer": lambda: app.message_coalescer.stats(),
+        "idempotency_cache": lambda: app.webhook_handler.cache_stats(),
+        "whatsapp_sender": lambda: app.webhook_handler.sender_stats(),
+        "store_batcher": lambda: app.chat_service.batcher.stats(),
+    },
+)
+
+
+@app.get("/metrics")
+async def metrics():
+    """Prometheus metrics: per-stage latency histograms and queue depths"""
+    return Response(content=render(), media_type=CONTENT_TYPE_LATEST)
 
 
 @app.get("/health")
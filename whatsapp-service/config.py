@@ -1,6 +1,6 @@
 from pydantic_settings import BaseSettings
 from functools import lru_cache
-from typing import Literal
+from typing import Literal, Optional
 from pydantic import Field
 from dotenv import load_dotenv
 
@@ -24,6 +24,14 @@ class Settings(BaseSettings):
     whatsapp_access_token: str = Field(default="", alias="WHATSAPP_ACCESS_TOKEN")
     whatsapp_api_version: str = Field(default="v17.0", alias="WHATSAPP_API_VERSION")
     whatsapp_number_id: str = Field(default="", alias="WHATSAPP_NUMBER_ID")
+    whatsapp_api_base_url: str = Field(
+        default="https://graph.facebook.com", alias="WHATSAPP_API_BASE_URL"
+    )
+    whatsapp_send_rate: float = Field(default=20.0, alias="WHATSAPP_SEND_RATE")
+    whatsapp_send_burst: int = Field(default=20, alias="WHATSAPP_SEND_BURST")
+    whatsapp_send_concurrency: int = Field(default=8, alias="WHATSAPP_SEND_CONCURRENCY")
+    whatsapp_send_max_retries: int = Field(default=4, alias="WHATSAPP_SEND_MAX_RETRIES")
+    whatsapp_send_queue_size: int = Field(default=1000, alias="WHATSAPP_SEND_QUEUE_SIZE")
     environment: Literal["development", "production", "test"] = Field(
         default="development", alias="ENVIRONMENT"
     )
@@ -31,6 +39,31 @@ class Settings(BaseSettings):
     mongodb_user: str = Field(default="", alias="MONGODB_USER")
     mongodb_password: str = Field(default="", alias="MONGODB_PASSWORD")
     mongodb_host: str = Field(default="", alias="MONGODB_HOST")
+    message_queue_max_size: int = Field(default=1000, alias="MESSAGE_QUEUE_MAX_SIZE")
+    message_workers: int = Field(default=4, alias="MESSAGE_WORKERS")
+    shutdown_drain_timeout: float = Field(default=25.0, alias="SHUTDOWN_DRAIN_TIMEOUT")
+    idempotency_max_entries: int = Field(default=10000, alias="IDEMPOTENCY_MAX_ENTRIES")
+    idempotency_ttl_seconds: float = Field(
+        default=86400.0, alias="IDEMPOTENCY_TTL_SECONDS"
+    )
+    idempotency_store_responses: bool = Field(
+        default=True, alias="IDEMPOTENCY_STORE_RESPONSES"
+    )
+    coalesce_window_seconds: float = Field(
+        default=1.5, alias="COALESCE_WINDOW_SECONDS"
+    )
+    coalesce_max_wait_seconds: float = Field(
+        default=5.0, alias="COALESCE_MAX_WAIT_SECONDS"
+    )
+    coalesce_max_batch_size: int = Field(default=10, alias="COALESCE_MAX_BATCH_SIZE")
+    use_turn_endpoint: bool = Field(default=True, alias="USE_TURN_ENDPOINT")
+    store_batch_max_size: int = Field(default=50, alias="STORE_BATCH_MAX_SIZE")
+    store_batch_max_delay_ms: float = Field(
+        default=5.0, alias="STORE_BATCH_MAX_DELAY_MS"
+    )
+    stream_responses: bool = Field(default=True, alias="STREAM_RESPONSES")
+    stream_min_chunk_chars: int = Field(default=300, alias="STREAM_MIN_CHUNK_CHARS")
+    stream_max_chunk_chars: int = Field(default=1500, alias="STREAM_MAX_CHUNK_CHARS")
 
     class Config:
         env_file = ".env"
@@ -38,8 +71,8 @@ class Settings(BaseSettings):
         case_sensitive = False
         extra = "allow"
 
-    def get_whatsapp_api_url(self) -> str:
-        return f"https://graph.facebook.com/{self.whatsapp_api_version}/{self.whatsapp_number_id}/messages"
+    def get_whatsapp_api_url(self, number_id: Optional[str] = None) -> str:
+        return f"{self.whatsapp_api_base_url}/{self.whatsapp_api_version}/{number_id or self.whatsapp_number_id}/messages"
 
     def build_service_url(self, service: str, path: str = "") -> str:
         if service == "db":
@@ -2,24 +2,68 @@ import logging
 from typing import Dict, Any, Optional
 import httpx
 from loguru import logger
-from collections import OrderedDict
-from time import time
 from config import get_settings
+from services.idempotency_cache import IdempotencyCache, ACCEPTED, PROCESSED, FAILED
+from services.whatsapp_sender import WhatsAppSender
 
 
 class WebhookHandler:
     def __init__(self):
-        self._processed_messages = set()  # Simple set to track processed messages
         self.settings = get_settings()
+        self._processed_messages = IdempotencyCache(
+            max_entries=self.settings.idempotency_max_entries,
+            ttl_seconds=self.settings.idempotency_ttl_seconds,
+            store_responses=self.settings.idempotency_store_responses,
+        )
         self.token = self.settings.whatsapp_access_token
         self.api_url = self.settings.get_whatsapp_api_url()
-        self.client = httpx.AsyncClient(timeout=30.0)
+        # One shared HTTP/2 connection multiplexes all sends to the Graph API
+        self.client = httpx.AsyncClient(
+            http2=True,
+            timeout=30.0,
+            limits=httpx.Limits(
+                max_connections=self.settings.whatsapp_send_concurrency,
+                max_keepalive_connections=self.settings.whatsapp_send_concurrency,
+                keepalive_expiry=120.0,
+            ),
+        )
+        self.sender = WhatsAppSender(
+            client=self.client,
+            token=self.token,
+            url_for=self.settings.get_whatsapp_api_url,
+            default_number_id=self.settings.whatsapp_number_id,
+            rate_per_second=self.settings.whatsapp_send_rate,
+            burst=self.settings.whatsapp_send_burst,
+            concurrency=self.settings.whatsapp_send_concurrency,
+            max_retries=self.settings.whatsapp_send_max_retries,
+            queue_size=self.settings.whatsapp_send_queue_size,
+        )
 
     def is_message_processed(self, message_id: str) -> bool:
-        return message_id in self._processed_messages
+        """Check if a message is queued or done; failed messages may be retried"""
+        entry = self._processed_messages.get(message_id)
+        return entry is not None and entry.status != FAILED
+
+    def mark_message_accepted(self, message_id: str):
+        """Record that a message was queued so redeliveries are skipped"""
+        # Keep any reply from a failed attempt so the worker can replay it
+        response = self.get_cached_response(message_id)
+        self._processed_messages.put(message_id, ACCEPTED, response)
 
     def mark_message_processed(self, message_id: str, response: Optional[str] = None):
-        self._processed_messages.add(message_id)
+        self._processed_messages.put(message_id, PROCESSED, response)
+
+    def mark_message_failed(self, message_id: str, response: Optional[str] = None):
+        """Allow a redelivery to retry the message, replaying response if given"""
+        self._processed_messages.put(message_id, FAILED, response)
+
+    def get_cached_response(self, message_id: str) -> Optional[str]:
+        """Return the reply already generated for a message, if it was kept"""
+        entry = self._processed_messages.get(message_id)
+        return entry.response if entry else None
+
+    def cache_stats(self) -> Dict[str, float]:
+        return self._processed_messages.stats()
 
     def should_process_message(self, message: Dict) -> bool:
         if message.get("type") != "text":
@@ -31,32 +75,17 @@ class WebhookHandler:
             logger.warning("Message missing ID")
             return False
 
-        if message_id in self._processed_messages:
+        if self.is_message_processed(message_id):
             logger.debug(f"Skipping message {message_id} - already handled")
             return False
 
         return True
 
     async def send_whatsapp_message(self, body: Dict[str, Any]) -> bool:
-        """Send message to WhatsApp API"""
+        """Send message to WhatsApp API through the paced, retrying sender"""
         try:
-            logger.info("Sending WhatsApp message to: %s", body.get("to"))
-            headers = {
-                "Content-Type": "application/json",
-                "Authorization": f"Bearer {self.token}",
-            }
-
-            response = await self.client.post(
-                self.api_url, headers=headers, json=body, timeout=30.0
-            )
-            response.raise_for_status()
-
-            logger.info("WhatsApp message sent successfully to: %s", body.get("to"))
-            return True
-
-        except httpx.TimeoutException:
-            logger.error("Timeout sending WhatsApp message")
-            return False
+            logger.info(f"Sending WhatsApp message to: {body.get('to')}")
+            return await self.sender.send(body)
         except Exception as e:
             logger.error(f"Error sending WhatsApp message: {str(e)}", exc_info=True)
             return False
@@ -76,6 +105,15 @@ class WebhookHandler:
             return False
         return self.is_message_processed(f"req_{request_id}")
 
+    def mark_request_processed(self, request_id: str):
+        """Remember a request ID so Meta redeliveries are skipped"""
+        if request_id:
+            self.mark_message_processed(f"req_{request_id}")
+
+    def sender_stats(self) -> Dict[str, float]:
+        return self.sender.stats()
+
     async def close(self):
-        """Close the HTTP client"""
+        """Flush pending sends and close the HTTP client"""
+        await self.sender.close()
         await self.client.aclose()
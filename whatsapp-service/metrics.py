@@ -0,0 +1,43 @@
+from typing import Callable, Dict, Iterable
+from prometheus_client import CONTENT_TYPE_LATEST, REGISTRY, Histogram, generate_latest
+from prometheus_client.core import GaugeMetricFamily
+
+# Seconds; spans fast in-process steps up to slow LLM replies
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 20, 30, 60)
+
+STAGE_SECONDS = Histogram(
+    "whatsapp_stage_duration_seconds",
+    "Time spent in each stage of the message pipeline",
+    ["stage"],
+    buckets=LATENCY_BUCKETS,
+)
+
+
+class StatsCollector:
+    """Expose the components' stats() dicts as gauges at scrape time"""
+
+    def __init__(self, prefix: str, sources: Dict[str, Callable[[], Dict[str, float]]]):
+        self.prefix = prefix
+        self.sources = sources
+
+    def collect(self) -> Iterable[GaugeMetricFamily]:
+        for component, stats in self.sources.items():
+            try:
+                values = stats()
+            except Exception:
+                # Components are created in the lifespan; nothing to report before that
+                continue
+            for key, value in values.items():
+                yield GaugeMetricFamily(
+                    f"{self.prefix}_{component}_{key}",
+                    f"{component} {key.replace('_', ' ')}",
+                    value=value,
+                )
+
+
+def register_stats(prefix: str, sources: Dict[str, Callable[[], Dict[str, float]]]):
+    REGISTRY.register(StatsCollector(prefix, sources))
+
+
+def render() -> bytes:
+    return generate_latest(REGISTRY)
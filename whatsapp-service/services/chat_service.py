@@ -1,10 +1,21 @@
+import json
 import logging
-from typing import Dict, Optional
+from typing import AsyncIterator, Dict, List, Optional
 from config import get_settings
 import httpx
 from loguru import logger
 from datetime import datetime
-from tenacity import retry, stop_after_attempt, wait_exponential
+from tenacity import retry, retry_if_exception_type, stop_after_attempt, wait_exponential
+from services.message_batcher import MessageBatcher
+
+# Failures before the request reached db-service. Message writes are only
+# retried on these, since a timeout after db-service committed would store
+# the whole batch twice.
+CONNECT_ERRORS = (httpx.ConnectError, httpx.ConnectTimeout)
+
+
+class StreamInterrupted(Exception):
+    """The reply stream failed after part of the reply had been yielded"""
 
 
 class ChatService:
@@ -16,9 +27,20 @@ class ChatService:
             timeout=60.0,
             transport=httpx.AsyncHTTPTransport(local_address="::")
         )
+        self.batcher = MessageBatcher(
+            self._store_batch,
+            max_batch_size=self.settings.store_batch_max_size,
+            max_delay=self.settings.store_batch_max_delay_ms / 1000,
+        )
+
+    async def send_message_to_openai(
+        self, message: str, user_id: str, priority: str = "interactive"
+    ) -> str:
+        """Send message to OpenAI service and get response.
 
-    async def send_message_to_openai(self, message: str, user_id: str) -> str:
-        """Send message to OpenAI service and get response"""
+        priority is the OpenAI service's scheduler class: "interactive" for a
+        user waiting on the reply, "bulk" for long work that can wait.
+        """
         try:
             logger.info("Sending to OpenAI - User: %s, Message: %s", user_id, message)
 
@@ -26,6 +48,7 @@ class ChatService:
                 "content": message,
                 "user_id": user_id,
                 "message_type": "text",
+                "priority": priority,
             }
 
             logger.debug(f"Request payload to OpenAI service: {payload}")
@@ -47,9 +70,104 @@ class ChatService:
             logger.error(f"Error in send_message_to_openai: {str(e)}", exc_info=True)
             return "Lo siento, hubo un error. ¿Podemos intentar nuevamente?"
 
-    @retry(
-        stop=stop_after_attempt(3), wait=wait_exponential(multiplier=1, min=4, max=10)
-    )
+    async def stream_message_from_openai(
+        self, message: str, user_id: str, priority: str = "interactive"
+    ) -> AsyncIterator[str]:
+        """Stream the OpenAI service reply, yielding text as it is generated"""
+        payload = {
+            "content": message,
+            "user_id": user_id,
+            "message_type": "text",
+            "priority": priority,
+        }
+        async for delta in self._stream("/chat/stream", payload, user_id):
+            yield delta
+
+    async def send_turn(
+        self, messages: List[str], user_id: str, priority: str = "interactive"
+    ) -> str:
+        """Send a user's turn to the OpenAI service, which also stores both sides"""
+        try:
+            logger.info(f"Sending turn to OpenAI - User: {user_id}")
+            response = await self.client.post(
+                f"{self.openai_service_url}/turn",
+                json={
+                    "user_id": user_id,
+                    "messages": messages,
+                    "message_type": "text",
+                    "priority": priority,
+                },
+            )
+            response.raise_for_status()
+
+            ai_response = response.json()["response"]
+            logger.info(f"OpenAI turn response received for {user_id}")
+            return ai_response
+
+        except httpx.TimeoutException:
+            logger.error("Timeout while waiting for OpenAI turn response")
+            return "Lo siento, el servicio está tardando demasiado. Por favor, intenta nuevamente."
+        except Exception as e:
+            logger.error(f"Error in send_turn: {str(e)}", exc_info=True)
+            return "Lo siento, hubo un error. ¿Podemos intentar nuevamente?"
+
+    async def stream_turn(
+        self, messages: List[str], user_id: str, priority: str = "interactive"
+    ) -> AsyncIterator[str]:
+        """Streaming version of send_turn"""
+        payload = {
+            "user_id": user_id,
+            "messages": messages,
+            "message_type": "text",
+            "priority": priority,
+        }
+        async for delta in self._stream("/turn/stream", payload, user_id):
+            yield delta
+
+    async def _stream(
+        self, path: str, payload: Dict, user_id: str
+    ) -> AsyncIterator[str]:
+        """Read NDJSON stream events, replying with an apology if nothing arrived.
+
+        Raises StreamInterrupted if the stream fails or ends without its done
+        event once part of the reply has been yielded, since the text so far
+        is not the whole reply.
+        """
+        sent_any = False
+        try:
+            logger.info(f"Streaming from OpenAI {path} - User: {user_id}")
+            done = False
+            async with self.client.stream(
+                "POST", f"{self.openai_service_url}{path}", json=payload
+            ) as response:
+                response.raise_for_status()
+                async for line in response.aiter_lines():
+                    if not line:
+                        continue
+                    event = json.loads(line)
+                    if event["type"] == "delta":
+                        sent_any = True
+                        yield event["content"]
+                    elif event["type"] == "done":
+                        done = True
+                    elif event["type"] == "error":
+                        raise RuntimeError(event.get("detail", "Stream failed"))
+            if not done:
+                raise RuntimeError("Stream ended before the reply was complete")
+
+            logger.info(f"OpenAI stream completed for {user_id}")
+
+        except httpx.TimeoutException as e:
+            logger.error("Timeout while streaming OpenAI response")
+            if sent_any:
+                raise StreamInterrupted("Timed out mid-reply") from e
+            yield "Lo siento, el servicio está tardando demasiado. Por favor, intenta nuevamente."
+        except Exception as e:
+            logger.error(f"Error streaming from OpenAI: {str(e)}", exc_info=True)
+            if sent_any:
+                raise StreamInterrupted(str(e)) from e
+            yield "Lo siento, hubo un error. ¿Podemos intentar nuevamente?"
+
     async def store_message(
         self,
         user_id: str,
@@ -58,23 +176,17 @@ class ChatService:
         message_type: str = "text",
         timestamp: Optional[datetime] = None,
     ) -> bool:
-        """Store message in DB service with retries"""
+        """Store message in DB service, batched with other concurrent writes"""
+        payload = {
+            "user_id": user_id,
+            "content": content,
+            "sender": sender,
+            "message_type": message_type,
+            "timestamp": (timestamp or datetime.utcnow()).isoformat(),
+        }
         try:
-            payload = {
-                "user_id": user_id,
-                "content": content,
-                "sender": sender,
-                "message_type": message_type,
-                "timestamp": (timestamp or datetime.utcnow()).isoformat(),
-            }
-
             logger.debug(f"Storing message with payload: {payload}")
-            response = await self.client.post(
-                f"{self.db_service_url}/api/v1/conversations/messages",
-                json=payload,
-                timeout=10.0,
-            )
-            response.raise_for_status()
+            await self.batcher.add(payload)
 
             logger.info(f"Message stored successfully for user {user_id}")
             return True
@@ -84,6 +196,29 @@ class ChatService:
             logger.error(f"Failed payload: {payload}")
             raise
 
+    @retry(
+        stop=stop_after_attempt(3),
+        wait=wait_exponential(multiplier=1, min=4, max=10),
+        retry=retry_if_exception_type(CONNECT_ERRORS),
+    )
+    async def _store_batch(self, payloads: List[Dict]):
+        """Write a batch of messages in one request, retrying only failed connects"""
+        if len(payloads) == 1:
+            response = await self.client.post(
+                f"{self.db_service_url}/api/v1/conversations/messages",
+                json=payloads[0],
+                timeout=10.0,
+            )
+        else:
+            logger.debug(f"Storing batch of {len(payloads)} messages")
+            response = await self.client.post(
+                f"{self.db_service_url}/api/v1/conversations/messages/bulk",
+                json={"messages": payloads},
+                timeout=10.0,
+            )
+        response.raise_for_status()
+
     async def close(self):
-        """Close the HTTP client"""
+        """Flush pending writes and close the HTTP client"""
+        await self.batcher.close()
         await self.client.aclose()
@@ -0,0 +1,120 @@
+import sys
+from collections import OrderedDict
+from dataclasses import dataclass
+from time import monotonic
+from typing import Callable, Dict, Optional
+
+ACCEPTED = "accepted"
+PROCESSED = "processed"
+FAILED = "failed"
+
+# Rough per-entry overhead of the OrderedDict slot and entry object
+ENTRY_OVERHEAD_BYTES = 200
+
+
+@dataclass
+class CacheEntry:
+    status: str
+    expires_at: float
+    response: Optional[str] = None
+    size: int = 0
+
+
+class IdempotencyCache:
+    """Bounded map of message/request IDs to their processing outcome.
+
+    Entries expire ttl_seconds after they were written and the least
+    recently used entry is evicted once max_entries is reached, so memory
+    stays flat no matter how long the pod runs. All operations are O(1).
+    """
+
+    def __init__(
+        self,
+        max_entries: int = 10000,
+        ttl_seconds: float = 86400.0,
+        store_responses: bool = True,
+        clock: Callable[[], float] = monotonic,
+    ):
+        self.max_entries = max_entries
+        self.ttl_seconds = ttl_seconds
+        self.store_responses = store_responses
+        self._clock = clock
+        self._entries: "OrderedDict[str, CacheEntry]" = OrderedDict()
+        self._bytes = 0
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.expirations = 0
+
+    def get(self, key: str) -> Optional[CacheEntry]:
+        """Return the live entry for key, refreshing its LRU position"""
+        entry = self._entries.get(key)
+        if entry is None:
+            self.misses += 1
+            return None
+        if entry.expires_at <= self._clock():
+            self._remove(key)
+            self.expirations += 1
+            self.misses += 1
+            return None
+        self._entries.move_to_end(key)
+        self.hits += 1
+        return entry
+
+    def put(self, key: str, status: str, response: Optional[str] = None):
+        """Record the outcome for key, evicting expired and LRU entries as needed"""
+        if key in self._entries:
+            self._remove(key)
+
+        if not self.store_responses:
+            response = None
+        size = (
+            ENTRY_OVERHEAD_BYTES
+            + sys.getsizeof(key)
+            + (sys.getsizeof(response) if response is not None else 0)
+        )
+        self._entries[key] = CacheEntry(
+            status=status,
+            expires_at=self._clock() + self.ttl_seconds,
+            response=response,
+            size=size,
+        )
+        self._bytes += size
+        self._evict()
+
+    def __contains__(self, key: str) -> bool:
+        return self.get(key) is not None
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+    def _remove(self, key: str):
+        entry = self._entries.pop(key)
+        self._bytes -= entry.size
+
+    def _evict(self):
+        now = self._clock()
+        # Oldest entries sit at the front; drop the expired ones we find there
+        while self._entries:
+            key, entry = next(iter(self._entries.items()))
+            if entry.expires_at > now:
+                break
+            self._remove(key)
+            self.expirations += 1
+
+        while len(self._entries) > self.max_entries:
+            key = next(iter(self._entries))
+            self._remove(key)
+            self.evictions += 1
+
+    def stats(self) -> Dict[str, float]:
+        """Return size, memory estimate and hit/eviction counters"""
+        return {
+            "entries": len(self._entries),
+            "max_entries": self.max_entries,
+            "memory_bytes": self._bytes,
+            "hits": self.hits,
+            "misses": self.misses,
+            "evictions": self.evictions,
+            "expirations": self.expirations,
+        }
@@ -0,0 +1,79 @@
+import asyncio
+from typing import Any, Awaitable, Callable, Dict, List, Optional, Tuple
+from loguru import logger
+
+
+class MessageBatcher:
+    """Group concurrent writes into batches flushed by size or a short delay.
+
+    Callers await their own item; it resolves once the batch containing it
+    has been written, or raises the batch's error. Only one batch is in
+    flight at a time, so writes reach the database in the order they were
+    added while new items pile up for the next batch.
+    """
+
+    def __init__(
+        self,
+        flush: Callable[[List[Any]], Awaitable[None]],
+        max_batch_size: int = 50,
+        max_delay: float = 0.005,
+    ):
+        self.flush = flush
+        self.max_batch_size = max_batch_size
+        self.max_delay = max_delay
+        self._pending: List[Tuple[Any, asyncio.Future]] = []
+        self._full = asyncio.Event()
+        self._flusher: Optional[asyncio.Task] = None
+        self.batches = 0
+        self.items = 0
+
+    async def add(self, item: Any):
+        """Queue an item and wait until its batch has been written"""
+        future = asyncio.get_running_loop().create_future()
+        self._pending.append((item, future))
+        if len(self._pending) >= self.max_batch_size:
+            self._full.set()
+        if self._flusher is None or self._flusher.done():
+            self._flusher = asyncio.create_task(self._run())
+        return await future
+
+    async def _run(self):
+        while self._pending:
+            if len(self._pending) < self.max_batch_size:
+                try:
+                    await asyncio.wait_for(self._full.wait(), timeout=self.max_delay)
+                except asyncio.TimeoutError:
+                    pass
+            self._full.clear()
+
+            batch = self._pending[: self.max_batch_size]
+            del self._pending[: self.max_batch_size]
+            await self._write(batch)
+
+    async def _write(self, batch: List[Tuple[Any, asyncio.Future]]):
+        self.batches += 1
+        self.items += len(batch)
+        try:
+            await self.flush([item for item, _ in batch])
+            for _, future in batch:
+                if not future.done():
+                    future.set_result(True)
+        except Exception as e:
+            logger.error(f"Failed to write batch of {len(batch)} items: {str(e)}")
+            for _, future in batch:
+                if not future.done():
+                    future.set_exception(e)
+
+    async def close(self):
+        """Write anything still pending"""
+        if self._flusher is not None and not self._flusher.done():
+            self._full.set()
+            await self._flusher
+
+    def stats(self) -> Dict[str, int]:
+        """Return pending items and batch counters"""
+        return {
+            "pending": len(self._pending),
+            "batches": self.batches,
+            "items": self.items,
+        }
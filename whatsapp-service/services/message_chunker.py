@@ -0,0 +1,68 @@
+import re
+from typing import List, Optional
+
+# WhatsApp rejects text bodies longer than this
+WHATSAPP_MAX_CHARS = 4096
+
+SENTENCE_END = re.compile(r"[.!?…:](?=\s)|\n")
+
+
+class MessageChunker:
+    """Split a streamed reply into WhatsApp-sized messages as it arrives.
+
+    Completed paragraphs are released once at least min_chars have built
+    up, so short lines are grouped instead of sent one by one. A paragraph
+    that grows past max_chars is cut at its last sentence boundary.
+    """
+
+    def __init__(self, min_chars: int = 300, max_chars: int = 1500):
+        self.min_chars = min_chars
+        self.max_chars = min(max_chars, WHATSAPP_MAX_CHARS)
+        self._buffer = ""
+
+    def feed(self, delta: str) -> List[str]:
+        """Add streamed text and return any chunks that are ready to send"""
+        self._buffer += delta
+        chunks = []
+        while True:
+            chunk = self._take_ready()
+            if chunk is None:
+                break
+            if chunk:
+                chunks.append(chunk)
+        return chunks
+
+    def flush(self) -> List[str]:
+        """Return whatever is left once the stream has ended"""
+        chunks = []
+        while len(self._buffer) > self.max_chars:
+            chunk = self._cut(self.max_chars)
+            if chunk:
+                chunks.append(chunk)
+        rest = self._buffer.strip()
+        self._buffer = ""
+        if rest:
+            chunks.append(rest)
+        return chunks
+
+    def _take_ready(self) -> Optional[str]:
+        # Send up to the last paragraph break once enough text has built up
+        end = self._buffer.rfind("\n\n", 0, self.max_chars)
+        if end > 0 and end >= self.min_chars:
+            return self._cut(end)
+        if len(self._buffer) > self.max_chars:
+            return self._cut(self.max_chars)
+        return None
+
+    def _cut(self, limit: int) -> str:
+        """Remove and return the head of the buffer, ending on a clean boundary"""
+        if not self._buffer.startswith("\n\n", limit):
+            head = self._buffer[:limit]
+            boundaries = [m.end() for m in SENTENCE_END.finditer(head)]
+            if boundaries and boundaries[-1] > self.min_chars:
+                limit = boundaries[-1]
+            elif head.rfind(" ") > 0:
+                limit = head.rfind(" ")
+        chunk = self._buffer[:limit].strip()
+        self._buffer = self._buffer[limit:].lstrip()
+        return chunk
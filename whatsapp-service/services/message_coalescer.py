@@ -0,0 +1,108 @@
+import asyncio
+from typing import Any, Callable, Dict, List, Optional
+from loguru import logger
+
+
+class _Burst:
+    def __init__(self, first_arrival: float):
+        self.first_arrival = first_arrival
+        self.messages: List[Any] = []
+        self.timer: Optional[asyncio.TimerHandle] = None
+
+
+class MessageCoalescer:
+    """Debounce rapid-fire messages from the same user into a single batch.
+
+    Each new message restarts the user's window; the batch is flushed once
+    the user has been quiet for window_seconds, or max_wait_seconds after
+    the first message of the burst, whichever comes first. A window of 0
+    disables coalescing and flushes every message on its own.
+
+    reserve is called as each batch starts, before its first message is
+    buffered; if it raises, the message is refused and the exception
+    propagates to the caller of add(). This lets a downstream queue hold a
+    slot for every batch that will later be flushed into it.
+    """
+
+    def __init__(
+        self,
+        flush: Callable[[str, List[Any]], None],
+        window_seconds: float = 1.5,
+        max_wait_seconds: float = 5.0,
+        max_batch_size: int = 10,
+        reserve: Optional[Callable[[str], None]] = None,
+    ):
+        self.flush = flush
+        self.reserve = reserve
+        self.window_seconds = window_seconds
+        self.max_wait_seconds = max_wait_seconds
+        self.max_batch_size = max_batch_size
+        self._bursts: Dict[str, _Burst] = {}
+        self.messages = 0
+        self.batches = 0
+        self.merged_messages = 0
+        self.largest_batch = 0
+
+    def add(self, user_id: str, message: Any):
+        """Buffer a message and (re)arm the user's flush timer"""
+        burst = self._bursts.get(user_id)
+        if burst is None and self.reserve:
+            self.reserve(user_id)
+        self.messages += 1
+        if self.window_seconds <= 0:
+            self._flush(user_id, [message])
+            return
+
+        loop = asyncio.get_running_loop()
+        now = loop.time()
+        if burst is None:
+            burst = self._bursts[user_id] = _Burst(now)
+        burst.messages.append(message)
+
+        if burst.timer:
+            burst.timer.cancel()
+        if len(burst.messages) >= self.max_batch_size:
+            self._flush_user(user_id)
+            return
+
+        deadline = min(now + self.window_seconds, burst.first_arrival + self.max_wait_seconds)
+        burst.timer = loop.call_at(deadline, self._flush_user, user_id)
+
+    def _flush_user(self, user_id: str):
+        burst = self._bursts.pop(user_id, None)
+        if burst is None:
+            return
+        if burst.timer:
+            burst.timer.cancel()
+        self._flush(user_id, burst.messages)
+
+    def _flush(self, user_id: str, messages: List[Any]):
+        self.batches += 1
+        self.merged_messages += len(messages) - 1
+        self.largest_batch = max(self.largest_batch, len(messages))
+        if len(messages) > 1:
+            logger.info(f"Coalesced {len(messages)} messages from {user_id}")
+        try:
+            self.flush(user_id, messages)
+        except Exception as e:
+            logger.error(f"Failed to flush messages for {user_id}: {str(e)}", exc_info=True)
+
+    def flush_all(self):
+        """Flush every pending burst immediately (used on shutdown)"""
+        for user_id in list(self._bursts):
+            self._flush_user(user_id)
+
+    @property
+    def buffered(self) -> int:
+        return sum(len(burst.messages) for burst in self._bursts.values())
+
+    def stats(self) -> Dict[str, float]:
+        """Return counters used to tune the debounce window"""
+        return {
+            "window_seconds": self.window_seconds,
+            "buffered": self.buffered,
+            "messages": self.messages,
+            "batches": self.batches,
+            "merged_messages": self.merged_messages,
+            "largest_batch": self.largest_batch,
+        }
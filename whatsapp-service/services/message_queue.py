@@ -0,0 +1,152 @@
+import asyncio
+from collections import deque
+from typing import Any, Awaitable, Callable, Deque, Dict, List, Optional, Set
+from loguru import logger
+
+
+class QueueFullError(Exception):
+    """Raised when the queue cannot accept more work"""
+
+
+class MessageQueue:
+    """Bounded in-process work queue with one ordered lane per key.
+
+    Jobs sharing a key (the sender's WhatsApp number) run one at a time in
+    submission order, while different keys run concurrently on the worker
+    pool. The number of workers is therefore the limit of users served at
+    the same time. A slot can be reserved ahead of a later submit, so work
+    accepted now is guaranteed room when it is handed over.
+    """
+
+    def __init__(
+        self,
+        handler: Callable[[Any], Awaitable[None]],
+        max_size: int = 1000,
+        workers: int = 4,
+    ):
+        self.handler = handler
+        self.max_size = max_size
+        self.worker_count = workers
+        self._lanes: Dict[str, Deque[Any]] = {}
+        self._scheduled: Set[str] = set()  # Keys that are ready or running
+        self._active: Set[str] = set()  # Keys currently running
+        self._ready: Optional[asyncio.Queue] = None
+        self._workers: List[asyncio.Task] = []
+        self._pending = 0
+        self._reserved = 0
+        self._accepting = False
+        self.processed = 0
+        self.failed = 0
+        self.rejected = 0
+
+    async def start(self):
+        """Create the ready queue and spawn the worker pool"""
+        self._ready = asyncio.Queue()
+        self._workers = [
+            asyncio.create_task(self._worker(i), name=f"message-worker-{i}")
+            for i in range(self.worker_count)
+        ]
+        self._accepting = True
+        logger.info(
+            f"Message queue started with {self.worker_count} workers "
+            f"(max size {self.max_size})"
+        )
+
+    def reserve(self) -> None:
+        """Hold a slot for a job submitted later, raising QueueFullError if there is none"""
+        self._check_capacity()
+        self._reserved += 1
+
+    def cancel_reservation(self) -> None:
+        """Give back a reserved slot that will not be used"""
+        self._reserved = max(0, self._reserved - 1)
+
+    def submit(self, key: str, job: Any, reserved: bool = False) -> None:
+        """Append a job to its key's lane, raising QueueFullError if it can't be taken.
+
+        With reserved=True the job takes a slot held by reserve() and is
+        always accepted.
+        """
+        if reserved:
+            self.cancel_reservation()
+        else:
+            self._check_capacity()
+
+        self._lanes.setdefault(key, deque()).append(job)
+        self._pending += 1
+        if key not in self._scheduled:
+            self._scheduled.add(key)
+            self._ready.put_nowait(key)
+
+    def _check_capacity(self):
+        if not self._accepting:
+            self.rejected += 1
+            raise QueueFullError("Message queue is not accepting work")
+        if self._pending + self._reserved >= self.max_size:
+            self.rejected += 1
+            raise QueueFullError(f"Message queue is full ({self.max_size} jobs)")
+
+    def is_full(self) -> bool:
+        """Check whether submit would currently be rejected"""
+        return not self._accepting or self._pending + self._reserved >= self.max_size
+
+    async def _worker(self, index: int):
+        while True:
+            key = await self._ready.get()
+            lane = self._lanes[key]
+            job = lane.popleft()
+            self._pending -= 1
+            self._active.add(key)
+            try:
+                await self.handler(job)
+                self.processed += 1
+            except Exception as e:
+                self.failed += 1
+                logger.error(
+                    f"Worker {index} failed to process job for {key}: {str(e)}",
+                    exc_info=True,
+                )
+            finally:
+                self._active.discard(key)
+                if lane:
+                    # Go to the back of the line so other users get a turn
+                    self._ready.put_nowait(key)
+                else:
+                    del self._lanes[key]
+                    self._scheduled.discard(key)
+                self._ready.task_done()
+
+    async def stop(self, timeout: float = 25.0):
+        """Stop accepting work, drain pending jobs up to timeout, then cancel workers"""
+        self._accepting = False
+        if self._ready is None:
+            return
+
+        logger.info(f"Draining message queue ({self._pending} pending jobs)")
+        try:
+            await asyncio.wait_for(self._ready.join(), timeout=timeout)
+            logger.info("Message queue drained")
+        except asyncio.TimeoutError:
+            logger.warning(
+                f"Message queue drain timed out after {timeout}s, "
+                f"dropping {self._pending} pending jobs"
+            )
+
+        for worker in self._workers:
+            worker.cancel()
+        await asyncio.gather(*self._workers, return_exceptions=True)
+        self._workers = []
+
+    def stats(self) -> Dict[str, int]:
+        """Return queue depth and job counters"""
+        return {
+            "depth": self._pending,
+            "reserved": self._reserved,
+            "max_size": self.max_size,
+            "workers": self.worker_count,
+            "lanes": len(self._lanes),
+            "active_lanes": len(self._active),
+            "processed": self.processed,
+            "failed": self.failed,
+            "rejected": self.rejected,
+        }
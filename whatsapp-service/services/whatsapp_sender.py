@@ -0,0 +1,229 @@
+import asyncio
+import random
+import time
+from collections import deque
+from dataclasses import dataclass, field
+from typing import Any, Callable, Deque, Dict, List, Optional
+import httpx
+from loguru import logger
+
+RETRYABLE_STATUS = {429, 500, 502, 503, 504}
+
+
+class TokenBucket:
+    """Token bucket that paces callers without holding a lock while they wait"""
+
+    def __init__(self, rate: float, capacity: float, clock: Callable[[], float] = time.monotonic):
+        self.rate = rate
+        self.capacity = capacity
+        self.tokens = capacity
+        self._clock = clock
+        self._updated = clock()
+        self._paused_until = 0.0
+
+    def _refill(self, now: float):
+        self.tokens = min(self.capacity, self.tokens + (now - self._updated) * self.rate)
+        self._updated = now
+
+    def reserve(self) -> float:
+        """Take a token and return how long the caller must wait before using it"""
+        now = self._clock()
+        self._refill(now)
+        self.tokens -= 1
+        wait = -self.tokens / self.rate if self.tokens < 0 else 0.0
+        return max(wait, self._paused_until - now)
+
+    async def acquire(self):
+        wait = self.reserve()
+        if wait > 0:
+            await asyncio.sleep(wait)
+
+    def pause(self, seconds: float):
+        """Hold every caller back, e.g. after the API answers 429"""
+        self._paused_until = max(self._paused_until, self._clock() + seconds)
+
+
+@dataclass
+class _Delivery:
+    body: Dict[str, Any]
+    future: asyncio.Future
+    enqueued_at: float = field(default_factory=time.monotonic)
+
+
+class _Lane:
+    def __init__(self, queue: asyncio.Queue, bucket: TokenBucket):
+        self.queue = queue
+        self.bucket = bucket
+        self.workers: List[asyncio.Task] = []
+
+
+class WhatsAppSender:
+    """Queued delivery of outbound messages to the WhatsApp Graph API.
+
+    Each sending number gets its own queue, token bucket and small worker
+    pool. Failed requests are retried on 429/5xx and network errors with
+    jittered exponential backoff, honoring Retry-After when the API sends
+    it. Callers that need ordering (e.g. streamed parts of one reply)
+    await each send before starting the next.
+    """
+
+    def __init__(
+        self,
+        client: httpx.AsyncClient,
+        token: str,
+        url_for: Callable[[str], str],
+        default_number_id: str,
+        rate_per_second: float = 20.0,
+        burst: int = 20,
+        concurrency: int = 8,
+        max_retries: int = 4,
+        base_delay: float = 0.5,
+        max_delay: float = 30.0,
+        queue_size: int = 1000,
+    ):
+        self.client = client
+        self.token = token
+        self.url_for = url_for
+        self.default_number_id = default_number_id
+        self.rate_per_second = rate_per_second
+        self.burst = burst
+        self.concurrency = concurrency
+        self.max_retries = max_retries
+        self.base_delay = base_delay
+        self.max_delay = max_delay
+        self.queue_size = queue_size
+        self._lanes: Dict[str, _Lane] = {}
+        self._latencies: Deque[float] = deque(maxlen=1000)
+        self.sent = 0
+        self.failed = 0
+        self.retries = 0
+        self.throttled = 0
+        self.dropped = 0
+
+    def _lane(self, number_id: str) -> _Lane:
+        lane = self._lanes.get(number_id)
+        if lane is None:
+            lane = _Lane(
+                asyncio.Queue(maxsize=self.queue_size),
+                TokenBucket(self.rate_per_second, self.burst),
+            )
+            lane.workers = [
+                asyncio.create_task(self._worker(number_id, lane))
+                for _ in range(self.concurrency)
+            ]
+            self._lanes[number_id] = lane
+        return lane
+
+    async def send(self, body: Dict[str, Any], number_id: Optional[str] = None) -> bool:
+        """Queue a message and wait until it is delivered or given up on"""
+        lane = self._lane(number_id or self.default_number_id)
+        delivery = _Delivery(body, asyncio.get_running_loop().create_future())
+        try:
+            lane.queue.put_nowait(delivery)
+        except asyncio.QueueFull:
+            self.dropped += 1
+            logger.error(f"Outbound queue full, dropping message to {body.get('to')}")
+            return False
+        return await delivery.future
+
+    async def _worker(self, number_id: str, lane: _Lane):
+        url = self.url_for(number_id)
+        while True:
+            delivery = await lane.queue.get()
+            try:
+                success = await self._deliver(url, lane.bucket, delivery.body)
+                if success:
+                    self.sent += 1
+                    self._latencies.append(time.monotonic() - delivery.enqueued_at)
+                else:
+                    self.failed += 1
+                if not delivery.future.done():
+                    delivery.future.set_result(success)
+            except Exception as e:
+                self.failed += 1
+                logger.error(f"Unexpected error sending WhatsApp message: {str(e)}", exc_info=True)
+                if not delivery.future.done():
+                    delivery.future.set_result(False)
+            finally:
+                lane.queue.task_done()
+
+    async def _deliver(self, url: str, bucket: TokenBucket, body: Dict[str, Any]) -> bool:
+        headers = {
+            "Content-Type": "application/json",
+            "Authorization": f"Bearer {self.token}",
+        }
+        for attempt in range(self.max_retries + 1):
+            await bucket.acquire()
+            retry_after = None
+            try:
+                response = await self.client.post(url, headers=headers, json=body)
+                if response.status_code < 400:
+                    logger.info(f"WhatsApp message sent successfully to: {body.get('to')}")
+                    return True
+                if response.status_code not in RETRYABLE_STATUS:
+                    logger.error(
+                        f"WhatsApp API rejected message to {body.get('to')}: "
+                        f"{response.status_code} {response.text}"
+                    )
+                    return False
+                if response.status_code == 429:
+                    self.throttled += 1
+                retry_after = self._retry_after(response)
+                error = f"HTTP {response.status_code}"
+            except httpx.TransportError as e:
+                error = f"{type(e).__name__}: {str(e)}"
+
+            if attempt == self.max_retries:
+                logger.error(f"Giving up sending to {body.get('to')} after {attempt + 1} attempts: {error}")
+                return False
+
+            # Full jitter keeps retries from many workers from lining up
+            delay = random.uniform(0, min(self.max_delay, self.base_delay * 2**attempt))
+            if retry_after is not None:
+                delay = min(self.max_delay, retry_after)
+                bucket.pause(delay)
+            self.retries += 1
+            logger.warning(f"Retrying WhatsApp send in {delay:.2f}s after {error}")
+            await asyncio.sleep(delay)
+        return False
+
+    @staticmethod
+    def _retry_after(response: httpx.Response) -> Optional[float]:
+        value = response.headers.get("Retry-After")
+        try:
+            return max(0.0, float(value)) if value is not None else None
+        except ValueError:
+            return None
+
+    async def close(self, timeout: float = 10.0):
+        """Wait for queued messages up to timeout, then stop the workers"""
+        for lane in self._lanes.values():
+            try:
+                await asyncio.wait_for(lane.queue.join(), timeout=timeout)
+            except asyncio.TimeoutError:
+                logger.warning(f"Dropping {lane.queue.qsize()} unsent WhatsApp messages")
+            for worker in lane.workers:
+                worker.cancel()
+            await asyncio.gather(*lane.workers, return_exceptions=True)
+        self._lanes = {}
+
+    def stats(self) -> Dict[str, float]:
+        """Return delivery counters, queue depth and latency percentiles (seconds)"""
+        latencies = sorted(self._latencies)
+
+        def percentile(p: float) -> float:
+            if not latencies:
+                return 0.0
+            return latencies[min(len(latencies) - 1, int(p * len(latencies)))]
+
+        return {
+            "depth": sum(lane.queue.qsize() for lane in self._lanes.values()),
+            "sent": self.sent,
+            "failed": self.failed,
+            "retries": self.retries,
+            "throttled": self.throttled,
+            "dropped": self.dropped,
+            "latency_p50": percentile(0.50),
+            "latency_p95": percentile(0.95),
+            "latency_p99": percentile(0.99),
+        }
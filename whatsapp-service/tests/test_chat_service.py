@@ -0,0 +1,204 @@
+import asyncio
+import json
+import httpx
+import pytest
+import pytest_asyncio
+from services.chat_service import ChatService, StreamInterrupted
+
+
+def ndjson(*events):
+    return "".join(json.dumps(event) + "\n" for event in events)
+
+
+@pytest_asyncio.fixture
+async def make_service():
+    services = []
+
+    def factory(handler):
+        service = ChatService()
+        service.client = httpx.AsyncClient(transport=httpx.MockTransport(handler))
+        services.append(service)
+        return service
+
+    yield factory
+    for service in services:
+        await service.close()
+
+
+async def collect(service):
+    return [delta async for delta in service.stream_message_from_openai("hola", "51999")]
+
+
+@pytest.mark.asyncio
+async def test_stream_yields_deltas(make_service):
+    """Test that deltas from the OpenAI service are yielded in order"""
+
+    def handler(request):
+        assert request.url.path == "/chat/stream"
+        assert json.loads(request.content)["user_id"] == "51999"
+        body = ndjson(
+            {"type": "delta", "content": "Hola"},
+            {"type": "delta", "content": " profe"},
+            {"type": "done", "response": "Hola profe"},
+        )
+        return httpx.Response(200, text=body)
+
+    service = make_service(handler)
+    assert await collect(service) == ["Hola", " profe"]
+
+
+@pytest.mark.asyncio
+async def test_stream_error_before_output_yields_apology(make_service):
+    """Test that a failed stream still gives the user a reply"""
+
+    def handler(request):
+        return httpx.Response(500)
+
+    service = make_service(handler)
+    deltas = await collect(service)
+    assert len(deltas) == 1
+    assert deltas[0].startswith("Lo siento")
+
+
+@pytest.mark.asyncio
+async def test_stream_error_after_output_raises(make_service):
+    """Test that an error event mid-stream is reported instead of ending quietly"""
+    deltas = []
+
+    def handler(request):
+        body = ndjson(
+            {"type": "delta", "content": "Hola"},
+            {"type": "error", "detail": "LLM Error"},
+        )
+        return httpx.Response(200, text=body)
+
+    service = make_service(handler)
+    with pytest.raises(StreamInterrupted):
+        async for delta in service.stream_message_from_openai("hola", "51999"):
+            deltas.append(delta)
+    assert deltas == ["Hola"]
+
+
+@pytest.mark.asyncio
+async def test_stream_without_done_event_raises(make_service):
+    """Test that a stream cut off before its done event counts as interrupted"""
+
+    def handler(request):
+        return httpx.Response(200, text=ndjson({"type": "delta", "content": "Hola"}))
+
+    service = make_service(handler)
+    with pytest.raises(StreamInterrupted):
+        await collect(service)
+
+
+@pytest.mark.asyncio
+async def test_send_turn(make_service):
+    """Test that a turn is sent in a single request"""
+    requests = []
+
+    def handler(request):
+        requests.append(request)
+        return httpx.Response(200, json={"response": "¡Hola!"})
+
+    service = make_service(handler)
+    assert await service.send_turn(["hola", "profe"], "51999") == "¡Hola!"
+
+    assert len(requests) == 1
+    assert requests[0].url.path == "/turn"
+    assert json.loads(requests[0].content)["messages"] == ["hola", "profe"]
+    assert json.loads(requests[0].content)["priority"] == "interactive"
+
+
+@pytest.mark.asyncio
+async def test_send_message_forwards_priority(make_service):
+    """Test that the caller's scheduler priority reaches the OpenAI service"""
+    requests = []
+
+    def handler(request):
+        requests.append(request)
+        return httpx.Response(200, json={"response": "Resumen"})
+
+    service = make_service(handler)
+    await service.send_message_to_openai("resume la unidad", "51999", priority="bulk")
+
+    assert json.loads(requests[0].content)["priority"] == "bulk"
+
+
+@pytest.mark.asyncio
+async def test_send_turn_error_returns_apology(make_service):
+    """Test that a failed turn still gives the user a reply"""
+    service = make_service(lambda request: httpx.Response(500))
+    assert (await service.send_turn(["hola"], "51999")).startswith("Lo siento")
+
+
+@pytest.mark.asyncio
+async def test_stream_turn(make_service):
+    """Test that streamed turns use the turn stream endpoint"""
+
+    def handler(request):
+        assert request.url.path == "/turn/stream"
+        body = ndjson(
+            {"type": "delta", "content": "Hola"},
+            {"type": "done", "response": "Hola"},
+        )
+        return httpx.Response(200, text=body)
+
+    service = make_service(handler)
+    assert [d async for d in service.stream_turn(["hola"], "51999")] == ["Hola"]
+
+
+@pytest.mark.asyncio
+async def test_store_message_single(make_service):
+    """Test that a lone message uses the plain endpoint"""
+    requests = []
+
+    def handler(request):
+        requests.append(request)
+        return httpx.Response(200, json={"status": "success"})
+
+    service = make_service(handler)
+    assert await service.store_message("51999", "hola", "user") is True
+
+    assert requests[0].url.path == "/api/v1/conversations/messages"
+    assert json.loads(requests[0].content)["content"] == "hola"
+
+
+@pytest.mark.asyncio
+async def test_concurrent_stores_are_batched(make_service):
+    """Test that concurrent messages go out in one bulk request"""
+    requests = []
+
+    def handler(request):
+        requests.append(request)
+        return httpx.Response(200, json={"status": "success"})
+
+    service = make_service(handler)
+    await asyncio.gather(
+        service.store_message("51999", "hola", "user"),
+        service.store_message("51888", "buenas", "user"),
+    )
+
+    assert len(requests) == 1
+    assert requests[0].url.path == "/api/v1/conversations/messages/bulk"
+    body = json.loads(requests[0].content)
+    assert [m["content"] for m in body["messages"]] == ["hola", "buenas"]
+
+
+@pytest.mark.asyncio
+async def test_bulk_store_read_timeout_not_retried(make_service):
+    """Test that a batch db-service may already have written is not sent again"""
+    requests = []
+
+    def handler(request):
+        requests.append(request)
+        raise httpx.ReadTimeout("timed out", request=request)
+
+    service = make_service(handler)
+    results = await asyncio.gather(
+        service.store_message("51999", "hola", "user"),
+        service.store_message("51888", "buenas", "user"),
+        return_exceptions=True,
+    )
+
+    assert all(isinstance(result, httpx.ReadTimeout) for result in results)
+    assert len(requests) == 1
@@ -0,0 +1,95 @@
+import pytest
+from services.idempotency_cache import IdempotencyCache, PROCESSED, FAILED
+
+
+class FakeClock:
+    def __init__(self):
+        self.now = 0.0
+
+    def __call__(self):
+        return self.now
+
+
+@pytest.fixture
+def clock():
+    return FakeClock()
+
+
+def test_put_and_get(clock):
+    """Test storing and reading an entry"""
+    cache = IdempotencyCache(clock=clock)
+    cache.put("m1", PROCESSED, "hola")
+
+    entry = cache.get("m1")
+    assert entry.status == PROCESSED
+    assert entry.response == "hola"
+    assert "m1" in cache
+    assert "m2" not in cache
+
+
+def test_entries_expire_after_ttl(clock):
+    """Test that entries disappear once their TTL passes"""
+    cache = IdempotencyCache(ttl_seconds=10, clock=clock)
+    cache.put("m1", PROCESSED)
+
+    clock.now = 9.9
+    assert "m1" in cache
+    clock.now = 10.0
+    assert "m1" not in cache
+    assert len(cache) == 0
+    assert cache.stats()["expirations"] == 1
+
+
+def test_lru_eviction_when_full(clock):
+    """Test that the least recently used entry is evicted at capacity"""
+    cache = IdempotencyCache(max_entries=2, clock=clock)
+    cache.put("m1", PROCESSED)
+    cache.put("m2", PROCESSED)
+    cache.get("m1")  # m2 is now least recently used
+    cache.put("m3", PROCESSED)
+
+    assert "m1" in cache
+    assert "m2" not in cache
+    assert "m3" in cache
+    assert cache.stats()["evictions"] == 1
+
+
+def test_expired_entries_purged_on_write(clock):
+    """Test that writes clean expired entries without waiting for reads"""
+    cache = IdempotencyCache(ttl_seconds=5, clock=clock)
+    for i in range(100):
+        cache.put(f"m{i}", PROCESSED)
+
+    clock.now = 6
+    cache.put("fresh", PROCESSED)
+    assert len(cache) == 1
+
+
+def test_responses_not_kept_when_disabled(clock):
+    """Test the option to store only the status"""
+    cache = IdempotencyCache(store_responses=False, clock=clock)
+    cache.put("m1", FAILED, "respuesta")
+    assert cache.get("m1").response is None
+
+
+def test_memory_stats_track_entries(clock):
+    """Test that the memory estimate grows and shrinks with the entries"""
+    cache = IdempotencyCache(max_entries=1, clock=clock)
+    assert cache.stats()["memory_bytes"] == 0
+
+    cache.put("m1", PROCESSED, "x" * 1000)
+    large = cache.stats()["memory_bytes"]
+    assert large > 1000
+
+    cache.put("m2", PROCESSED)
+    assert 0 < cache.stats()["memory_bytes"] < large
+
+
+def test_overwrite_replaces_entry(clock):
+    """Test that writing the same key keeps a single entry"""
+    cache = IdempotencyCache(clock=clock)
+    cache.put("m1", FAILED, "respuesta")
+    cache.put("m1", PROCESSED, "respuesta")
+
+    assert len(cache) == 1
+    assert cache.get("m1").status == PROCESSED
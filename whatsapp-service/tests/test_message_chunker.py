@@ -0,0 +1,62 @@
+from services.message_chunker import MessageChunker
+
+
+def feed_all(chunker, text, step=7):
+    chunks = []
+    for i in range(0, len(text), step):
+        chunks.extend(chunker.feed(text[i : i + step]))
+    return chunks + chunker.flush()
+
+
+def test_short_reply_sent_at_end():
+    """Test that a reply under min_chars is sent once the stream ends"""
+    chunker = MessageChunker(min_chars=100, max_chars=500)
+    assert chunker.feed("¡Hola! ¿En qué área curricular necesitas ayuda?") == []
+    assert chunker.flush() == ["¡Hola! ¿En qué área curricular necesitas ayuda?"]
+
+
+def test_paragraphs_released_as_they_complete():
+    """Test that completed paragraphs are sent before the stream ends"""
+    chunker = MessageChunker(min_chars=20, max_chars=500)
+    first = "1. INICIO: motivación y saberes previos."
+    second = "2. DESARROLLO: actividades."
+
+    assert chunker.feed(first) == []
+    assert chunker.feed("\n\n") == [first]
+    assert chunker.feed(second[:5]) == []
+    assert chunker.feed(second[5:]) == []
+    assert chunker.flush() == [second]
+
+
+def test_short_paragraphs_are_grouped():
+    """Test that paragraphs shorter than min_chars are sent together"""
+    chunker = MessageChunker(min_chars=30, max_chars=500)
+    chunks = feed_all(chunker, "Uno.\n\nDos.\n\nTres es más largo que los otros.\n\nFin")
+    assert chunks == ["Uno.\n\nDos.\n\nTres es más largo que los otros.", "Fin"]
+
+
+def test_long_paragraph_split_on_sentence():
+    """Test that text without paragraph breaks is split at sentence ends"""
+    chunker = MessageChunker(min_chars=10, max_chars=60)
+    text = "Primera oración completa aquí. Segunda oración también. Tercera oración final."
+    chunks = feed_all(chunker, text)
+
+    assert all(len(chunk) <= 60 for chunk in chunks)
+    assert chunks[0] == "Primera oración completa aquí. Segunda oración también."
+    assert " ".join(chunks) == text
+
+
+def test_no_text_is_lost():
+    """Test that the chunks reassemble into the original words"""
+    chunker = MessageChunker(min_chars=50, max_chars=120)
+    text = ("Palabra " * 200).strip()
+    chunks = feed_all(chunker, text, step=13)
+
+    assert all(len(chunk) <= 120 for chunk in chunks)
+    assert " ".join(chunks).split() == text.split()
+
+
+def test_max_chars_capped_at_whatsapp_limit():
+    """Test that chunks never exceed WhatsApp's message size"""
+    chunker = MessageChunker(max_chars=10000)
+    assert chunker.max_chars == 4096
@@ -0,0 +1,160 @@
+import asyncio
+import pytest
+from services.message_coalescer import MessageCoalescer
+from services.message_queue import MessageQueue, QueueFullError
+
+
+class Collector:
+    def __init__(self):
+        self.batches = []
+
+    def __call__(self, user_id, messages):
+        self.batches.append((user_id, list(messages)))
+
+
+@pytest.mark.asyncio
+async def test_burst_is_merged():
+    """Test that messages inside the window become one batch"""
+    collector = Collector()
+    coalescer = MessageCoalescer(collector, window_seconds=0.05)
+
+    for text in ["hola", "necesito", "una sesión"]:
+        coalescer.add("u1", text)
+        await asyncio.sleep(0.01)
+    assert collector.batches == []
+
+    await asyncio.sleep(0.1)
+    assert collector.batches == [("u1", ["hola", "necesito", "una sesión"])]
+
+    stats = coalescer.stats()
+    assert stats["batches"] == 1
+    assert stats["merged_messages"] == 2
+    assert stats["largest_batch"] == 3
+
+
+@pytest.mark.asyncio
+async def test_users_are_batched_separately():
+    """Test that bursts from different users are not mixed"""
+    collector = Collector()
+    coalescer = MessageCoalescer(collector, window_seconds=0.02)
+
+    coalescer.add("u1", "a")
+    coalescer.add("u2", "b")
+    await asyncio.sleep(0.05)
+
+    assert sorted(collector.batches) == [("u1", ["a"]), ("u2", ["b"])]
+
+
+@pytest.mark.asyncio
+async def test_max_wait_caps_debounce():
+    """Test that a never-ending burst is still flushed after max_wait"""
+    collector = Collector()
+    coalescer = MessageCoalescer(collector, window_seconds=0.05, max_wait_seconds=0.08)
+
+    for i in range(6):
+        coalescer.add("u1", i)
+        await asyncio.sleep(0.03)
+
+    assert len(collector.batches) >= 1
+    assert collector.batches[0][1][0] == 0
+
+
+@pytest.mark.asyncio
+async def test_max_batch_size_flushes_immediately():
+    """Test that a full batch does not wait for the window"""
+    collector = Collector()
+    coalescer = MessageCoalescer(collector, window_seconds=10, max_batch_size=2)
+
+    coalescer.add("u1", "a")
+    coalescer.add("u1", "b")
+    assert collector.batches == [("u1", ["a", "b"])]
+
+
+@pytest.mark.asyncio
+async def test_zero_window_disables_coalescing():
+    """Test that every message is flushed on its own with no window"""
+    collector = Collector()
+    coalescer = MessageCoalescer(collector, window_seconds=0)
+
+    coalescer.add("u1", "a")
+    coalescer.add("u1", "b")
+    assert collector.batches == [("u1", ["a"]), ("u1", ["b"])]
+    assert coalescer.stats()["merged_messages"] == 0
+
+
+@pytest.mark.asyncio
+async def test_flush_all():
+    """Test that shutdown flushes pending bursts"""
+    collector = Collector()
+    coalescer = MessageCoalescer(collector, window_seconds=10)
+
+    coalescer.add("u1", "a")
+    assert coalescer.buffered == 1
+    coalescer.flush_all()
+
+    assert collector.batches == [("u1", ["a"])]
+    assert coalescer.buffered == 0
+
+
+@pytest.mark.asyncio
+async def test_flush_errors_are_contained():
+    """Test that a failing flush callback does not break the coalescer"""
+
+    def failing(user_id, messages):
+        raise RuntimeError("queue full")
+
+    coalescer = MessageCoalescer(failing, window_seconds=0)
+    coalescer.add("u1", "a")
+    assert coalescer.stats()["batches"] == 1
+
+
+@pytest.mark.asyncio
+async def test_reserve_refuses_message_without_buffering():
+    """Test that a failing reserve keeps the message out of the coalescer"""
+    collector = Collector()
+
+    def reserve(user_id):
+        raise QueueFullError("full")
+
+    coalescer = MessageCoalescer(collector, window_seconds=10, reserve=reserve)
+    with pytest.raises(QueueFullError):
+        coalescer.add("u1", "a")
+    assert coalescer.buffered == 0
+    assert coalescer.stats()["messages"] == 0
+
+
+@pytest.mark.asyncio
+async def test_queue_filling_during_window_keeps_buffered_bursts():
+    """Test that bursts accepted before the queue filled still get a queue slot"""
+    release = asyncio.Event()
+    handled = []
+
+    async def handler(job):
+        await release.wait()
+        handled.append(job)
+
+    queue = MessageQueue(handler, max_size=2, workers=1)
+    await queue.start()
+    coalescer = MessageCoalescer(
+        lambda user_id, messages: queue.submit(user_id, messages, reserved=True),
+        window_seconds=0.05,
+        reserve=lambda user_id: queue.reserve(),
+    )
+
+    coalescer.add("u1", "a")
+    coalescer.add("u1", "b")  # Same burst, no new slot
+    coalescer.add("u2", "c")
+    # Both slots are held by buffered bursts, so a new sender is refused up front
+    with pytest.raises(QueueFullError):
+        coalescer.add("u3", "d")
+    # Work submitted directly can't take the reserved slots either
+    with pytest.raises(QueueFullError):
+        queue.submit("u4", ["e"])
+
+    await asyncio.sleep(0.1)
+    assert coalescer.buffered == 0
+    assert queue.stats()["reserved"] == 0
+
+    release.set()
+    await queue.stop(timeout=1.0)
+    assert sorted(handled) == [["a", "b"], ["c"]]
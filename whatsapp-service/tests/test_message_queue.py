@@ -0,0 +1,211 @@
+import asyncio
+import pytest
+from services.message_queue import MessageQueue, QueueFullError
+
+
+@pytest.mark.asyncio
+async def test_jobs_are_processed():
+    """Test that workers drain submitted jobs"""
+    seen = []
+
+    async def handler(job):
+        seen.append(job)
+
+    queue = MessageQueue(handler, max_size=10, workers=2)
+    await queue.start()
+    for i in range(5):
+        queue.submit("user", i)
+    await queue.stop(timeout=1.0)
+
+    assert sorted(seen) == [0, 1, 2, 3, 4]
+    assert queue.stats()["processed"] == 5
+
+
+@pytest.mark.asyncio
+async def test_submit_returns_before_job_finishes():
+    """Test that submitting does not wait for the handler"""
+    release = asyncio.Event()
+
+    async def handler(job):
+        await release.wait()
+
+    queue = MessageQueue(handler, max_size=10, workers=1)
+    await queue.start()
+    queue.submit("user", "slow")
+    assert queue.stats()["processed"] == 0
+
+    release.set()
+    await queue.stop(timeout=1.0)
+    assert queue.stats()["processed"] == 1
+
+
+@pytest.mark.asyncio
+async def test_queue_full_rejects():
+    """Test that a full queue raises instead of blocking"""
+    release = asyncio.Event()
+
+    async def handler(job):
+        await release.wait()
+
+    queue = MessageQueue(handler, max_size=1, workers=1)
+    await queue.start()
+    queue.submit("user", 1)
+    await asyncio.sleep(0)  # Let the worker pick up the first job
+    queue.submit("user", 2)
+
+    with pytest.raises(QueueFullError):
+        queue.submit("user", 3)
+    assert queue.stats()["rejected"] == 1
+
+    release.set()
+    await queue.stop(timeout=1.0)
+
+
+@pytest.mark.asyncio
+async def test_handler_errors_do_not_kill_workers():
+    """Test that a failing job is counted and the worker keeps going"""
+
+    async def handler(job):
+        if job == "bad":
+            raise ValueError("boom")
+
+    queue = MessageQueue(handler, max_size=10, workers=1)
+    await queue.start()
+    queue.submit("user", "bad")
+    queue.submit("user", "good")
+    await queue.stop(timeout=1.0)
+
+    stats = queue.stats()
+    assert stats["failed"] == 1
+    assert stats["processed"] == 1
+
+
+@pytest.mark.asyncio
+async def test_stop_rejects_new_work():
+    """Test that the queue refuses work once shutdown has started"""
+
+    async def handler(job):
+        pass
+
+    queue = MessageQueue(handler)
+    await queue.start()
+    await queue.stop(timeout=1.0)
+
+    with pytest.raises(QueueFullError):
+        queue.submit("user", "late")
+
+
+@pytest.mark.asyncio
+async def test_same_key_runs_in_order():
+    """Test that jobs for one user never overlap and keep their order"""
+    seen = []
+    running = set()
+
+    async def handler(job):
+        key, value = job
+        assert key not in running
+        running.add(key)
+        await asyncio.sleep(0.01)
+        seen.append(job)
+        running.discard(key)
+
+    queue = MessageQueue(handler, max_size=20, workers=4)
+    await queue.start()
+    for i in range(5):
+        queue.submit("a", ("a", i))
+        queue.submit("b", ("b", i))
+    await queue.stop(timeout=1.0)
+
+    assert [v for k, v in seen if k == "a"] == [0, 1, 2, 3, 4]
+    assert [v for k, v in seen if k == "b"] == [0, 1, 2, 3, 4]
+
+
+@pytest.mark.asyncio
+async def test_different_keys_run_concurrently():
+    """Test that a slow user does not block other users"""
+    release = asyncio.Event()
+    done = []
+
+    async def handler(job):
+        if job == "slow":
+            await release.wait()
+        done.append(job)
+
+    queue = MessageQueue(handler, max_size=10, workers=2)
+    await queue.start()
+    queue.submit("a", "slow")
+    queue.submit("b", "fast")
+    await asyncio.sleep(0.01)
+
+    assert done == ["fast"]
+    assert queue.stats()["active_lanes"] == 1
+
+    release.set()
+    await queue.stop(timeout=1.0)
+    assert done == ["fast", "slow"]
+
+
+@pytest.mark.asyncio
+async def test_concurrency_limited_by_workers():
+    """Test that no more users than workers run at once"""
+    running = 0
+    peak = 0
+
+    async def handler(job):
+        nonlocal running, peak
+        running += 1
+        peak = max(peak, running)
+        await asyncio.sleep(0.01)
+        running -= 1
+
+    queue = MessageQueue(handler, max_size=20, workers=3)
+    await queue.start()
+    for i in range(10):
+        queue.submit(f"user-{i}", i)
+    await queue.stop(timeout=1.0)
+
+    assert peak == 3
+    assert queue.stats()["lanes"] == 0
+
+
+@pytest.mark.asyncio
+async def test_stop_times_out_on_stuck_job():
+    """Test that draining gives up after the timeout"""
+
+    async def handler(job):
+        await asyncio.sleep(10)
+
+    queue = MessageQueue(handler, max_size=10, workers=1)
+    await queue.start()
+    queue.submit("user", "stuck")
+    await queue.stop(timeout=0.05)
+    assert queue.stats()["processed"] == 0
+
+
+@pytest.mark.asyncio
+async def test_reserved_slot_is_always_accepted():
+    """Test that a reservation counts against capacity and is honoured on submit"""
+    release = asyncio.Event()
+
+    async def handler(job):
+        await release.wait()
+
+    queue = MessageQueue(handler, max_size=2, workers=1)
+    await queue.start()
+    queue.reserve()
+    queue.submit("a", 1)
+    assert queue.is_full()
+    assert queue.stats()["reserved"] == 1
+
+    with pytest.raises(QueueFullError):
+        queue.submit("b", 2)
+    with pytest.raises(QueueFullError):
+        queue.reserve()
+
+    queue.submit("a", 3, reserved=True)
+    assert queue.stats()["reserved"] == 0
+    assert queue.stats()["depth"] == 2
+
+    release.set()
+    await queue.stop(timeout=1.0)
+    assert queue.stats()["processed"] == 2
@@ -0,0 +1,28 @@
+from prometheus_client import CollectorRegistry
+from metrics import StatsCollector
+
+
+def test_stats_collector_exposes_gauges():
+    """Test that each stats() value becomes a gauge"""
+    registry = CollectorRegistry()
+    registry.register(
+        StatsCollector("test", {"message_queue": lambda: {"depth": 3, "rejected": 1}})
+    )
+
+    assert registry.get_sample_value("test_message_queue_depth") == 3
+    assert registry.get_sample_value("test_message_queue_rejected") == 1
+
+
+def test_stats_collector_skips_unavailable_components():
+    """Test that components not created yet are left out instead of failing"""
+
+    def missing():
+        raise AttributeError("message_queue")
+
+    registry = CollectorRegistry()
+    registry.register(
+        StatsCollector("test", {"message_queue": missing, "other": lambda: {"size": 2}})
+    )
+
+    assert registry.get_sample_value("test_message_queue_depth") is None
+    assert registry.get_sample_value("test_other_size") == 2
@@ -0,0 +1,52 @@
+import pytest
+from handlers.webhook_handler import WebhookHandler
+
+
+@pytest.fixture
+def handler():
+    return WebhookHandler()
+
+
+def text_message(message_id="m1"):
+    return {"id": message_id, "from": "51999", "type": "text", "text": {"body": "hola"}}
+
+
+def test_should_process_new_message(handler):
+    """Test that unseen text messages are processed"""
+    assert handler.should_process_message(text_message()) is True
+
+
+def test_skips_non_text_message(handler):
+    """Test that non-text messages are ignored"""
+    assert handler.should_process_message({"id": "m1", "type": "image"}) is False
+
+
+def test_skips_accepted_message(handler):
+    """Test that a queued message is not queued again"""
+    handler.mark_message_accepted("m1")
+    assert handler.should_process_message(text_message()) is False
+
+
+def test_failed_message_is_replayed(handler):
+    """Test that a failed send can be retried with the stored response"""
+    handler.mark_message_failed("m1", "respuesta")
+    assert handler.should_process_message(text_message()) is True
+
+    handler.mark_message_accepted("m1")
+    assert handler.should_process_message(text_message()) is False
+    assert handler.get_cached_response("m1") == "respuesta"
+
+
+def test_processed_response_is_kept(handler):
+    """Test that the sent response is remembered"""
+    handler.mark_message_processed("m1", "respuesta")
+    assert handler.get_cached_response("m1") == "respuesta"
+    assert handler.cache_stats()["entries"] == 1
+
+
+def test_request_ids(handler):
+    """Test request-level deduplication"""
+    assert handler.is_request_processed("r1") is False
+    handler.mark_request_processed("r1")
+    assert handler.is_request_processed("r1") is True
+    assert handler.is_request_processed("") is False
@@ -0,0 +1,150 @@
+import asyncio
+import httpx
+import pytest
+import pytest_asyncio
+from services.whatsapp_sender import TokenBucket, WhatsAppSender
+
+
+class FakeGraphAPI:
+    """Answers each request with the next scripted response, then 200"""
+
+    def __init__(self, *responses):
+        self.responses = list(responses)
+        self.requests = []
+
+    def __call__(self, request):
+        self.requests.append(request)
+        if self.responses:
+            response = self.responses.pop(0)
+            if isinstance(response, Exception):
+                raise response
+            return response
+        return httpx.Response(200, json={"messages": [{"id": "wamid.1"}]})
+
+
+@pytest_asyncio.fixture
+async def make_sender():
+    senders = []
+
+    def factory(api, **kwargs):
+        client = httpx.AsyncClient(transport=httpx.MockTransport(api))
+        options = dict(base_delay=0.001, max_delay=0.05, rate_per_second=1000, burst=1000)
+        options.update(kwargs)
+        sender = WhatsAppSender(
+            client=client,
+            token="test-token",
+            url_for=lambda number_id: f"http://graph.test/v17.0/{number_id}/messages",
+            default_number_id="123",
+            **options,
+        )
+        senders.append(sender)
+        return sender
+
+    yield factory
+    for sender in senders:
+        await sender.close()
+        await sender.client.aclose()
+
+
+BODY = {"messaging_product": "whatsapp", "to": "51999", "type": "text", "text": {"body": "hola"}}
+
+
+@pytest.mark.asyncio
+async def test_send_success(make_sender):
+    """Test a message is posted to the number's endpoint with auth"""
+    api = FakeGraphAPI()
+    sender = make_sender(api)
+
+    assert await sender.send(BODY) is True
+    request = api.requests[0]
+    assert request.url.path == "/v17.0/123/messages"
+    assert request.headers["Authorization"] == "Bearer test-token"
+    assert sender.stats()["sent"] == 1
+
+
+@pytest.mark.asyncio
+async def test_retries_server_errors(make_sender):
+    """Test that 5xx and network errors are retried"""
+    api = FakeGraphAPI(
+        httpx.Response(503),
+        httpx.ConnectError("connection reset"),
+    )
+    sender = make_sender(api)
+
+    assert await sender.send(BODY) is True
+    assert len(api.requests) == 3
+    assert sender.stats()["retries"] == 2
+
+
+@pytest.mark.asyncio
+async def test_honors_retry_after(make_sender):
+    """Test that a 429 waits for Retry-After before trying again"""
+    api = FakeGraphAPI(httpx.Response(429, headers={"Retry-After": "0.05"}))
+    sender = make_sender(api)
+
+    start = asyncio.get_running_loop().time()
+    assert await sender.send(BODY) is True
+    assert asyncio.get_running_loop().time() - start >= 0.05
+    assert sender.stats()["throttled"] == 1
+
+
+@pytest.mark.asyncio
+async def test_client_errors_not_retried(make_sender):
+    """Test that a 400 fails immediately"""
+    api = FakeGraphAPI(httpx.Response(400, json={"error": "bad"}))
+    sender = make_sender(api)
+
+    assert await sender.send(BODY) is False
+    assert len(api.requests) == 1
+    assert sender.stats()["failed"] == 1
+
+
+@pytest.mark.asyncio
+async def test_gives_up_after_max_retries(make_sender):
+    """Test that persistent failures eventually return False"""
+    api = FakeGraphAPI(*[httpx.Response(500) for _ in range(10)])
+    sender = make_sender(api, max_retries=2)
+
+    assert await sender.send(BODY) is False
+    assert len(api.requests) == 3
+
+
+@pytest.mark.asyncio
+async def test_pacing_limits_throughput(make_sender):
+    """Test that the token bucket spaces out sends beyond the burst"""
+    api = FakeGraphAPI()
+    sender = make_sender(api, rate_per_second=100, burst=1)
+
+    start = asyncio.get_running_loop().time()
+    results = await asyncio.gather(*[sender.send(BODY) for _ in range(6)])
+    elapsed = asyncio.get_running_loop().time() - start
+
+    assert all(results)
+    assert elapsed >= 0.045  # 5 sends beyond the burst at 100/s
+
+
+@pytest.mark.asyncio
+async def test_latency_stats(make_sender):
+    """Test that delivery latency percentiles are reported"""
+    sender = make_sender(FakeGraphAPI())
+    await sender.send(BODY)
+
+    stats = sender.stats()
+    assert stats["latency_p50"] > 0
+    assert stats["depth"] == 0
+
+
+def test_token_bucket_reserve():
+    """Test token bucket waits grow once the burst is used"""
+    now = [0.0]
+    bucket = TokenBucket(rate=10, capacity=2, clock=lambda: now[0])
+
+    assert bucket.reserve() == 0
+    assert bucket.reserve() == 0
+    assert bucket.reserve() == pytest.approx(0.1)
+
+    now[0] = 1.0
+    assert bucket.reserve() == 0
+
+    bucket.pause(5)
+    assert bucket.reserve() == pytest.approx(5)